@@ -26,6 +26,8 @@ INSTALLED_APPS = [
 
 MIDDLEWARE = [
     "django.middleware.security.SecurityMiddleware",
+    "library.metrics.MetricsMiddleware",
+    "library.routers.ReplicaRoutingMiddleware",
     "django.contrib.sessions.middleware.SessionMiddleware",
     "django.middleware.common.CommonMiddleware",
     "django.middleware.csrf.CsrfViewMiddleware",
@@ -63,6 +65,56 @@ DATABASES = {
     }
 }
 
+# Read replicas: one alias per host in DB_REPLICA_HOSTS ("host[:port],..."),
+# with the primary's credentials. Safe-method requests read from them (see
+# library.routers); a client that writes reads from the primary for
+# LIBRARY_REPLICA_STICKY_SECONDS.
+LIBRARY_REPLICAS = []
+for _i, _host in enumerate(h.strip() for h in os.getenv("DB_REPLICA_HOSTS", "").split(",") if h.strip()):
+    _name, _, _port = _host.partition(":")
+    DATABASES[f"replica_{_i + 1}"] = {
+        **DATABASES["default"],
+        "HOST": _name,
+        "PORT": _port or DATABASES["default"]["PORT"],
+        "TEST": {"MIRROR": "default"},
+    }
+    LIBRARY_REPLICAS.append(f"replica_{_i + 1}")
+DATABASE_ROUTERS = ["library.routers.ReplicaRouter"]
+LIBRARY_REPLICA_STICKY_SECONDS = int(os.getenv("REPLICA_STICKY_SECONDS", "5"))
+
+# Availability lookups are cached; use a shared backend (e.g. Redis or
+# Memcached) when running more than one process so invalidations reach all.
+CACHES = {
+    "default": {
+        "BACKEND": os.getenv("CACHE_BACKEND", "django.core.cache.backends.locmem.LocMemCache"),
+        "LOCATION": os.getenv("CACHE_LOCATION", ""),
+    }
+}
+
+LIBRARY_AVAILABILITY_CACHE_TIMEOUT = int(os.getenv("AVAILABILITY_CACHE_TIMEOUT", "300"))
+
+# Late fees accrued per overdue day, capped per loan (see compute_overdue).
+LIBRARY_LATE_FEE_PER_DAY = os.getenv("LATE_FEE_PER_DAY", "0.25")
+LIBRARY_LATE_FEE_CAP = os.getenv("LATE_FEE_CAP", "20.00")
+
+# Rows each statistics scope is spread over, so concurrent loans rarely wait
+# on the same counter row (see library.stats).
+LIBRARY_STATS_SLOTS = int(os.getenv("STATS_SLOTS", "16"))
+
+# "locking" borrows/returns under SELECT ... FOR UPDATE; "optimistic" decides
+# with a conditional UPDATE and holds the Book row lock only until commit.
+LIBRARY_BORROW_STRATEGY = os.getenv("BORROW_STRATEGY", "locking")
+
+# Idempotency-Key responses are kept this long (purge_idempotency_keys deletes
+# them); duplicates of a running request wait up to WAIT seconds for its
+# response, and a request unfinished after LEASE seconds is presumed dead.
+LIBRARY_IDEMPOTENCY_TTL = int(os.getenv("IDEMPOTENCY_TTL", str(24 * 60 * 60)))
+LIBRARY_IDEMPOTENCY_WAIT = float(os.getenv("IDEMPOTENCY_WAIT", "5"))
+LIBRARY_IDEMPOTENCY_LEASE = int(os.getenv("IDEMPOTENCY_LEASE", "60"))
+
+# A request running one SQL shape this many times is reported as a likely N+1.
+LIBRARY_N_PLUS_ONE_THRESHOLD = int(os.getenv("N_PLUS_ONE_THRESHOLD", "10"))
+
 STATIC_URL = "static/"
 
 DEFAULT_AUTO_FIELD = "django.db.models.BigAutoField"
@@ -73,7 +125,13 @@ REST_FRAMEWORK = {
         "django_filters.rest_framework.DjangoFilterBackend",
         "rest_framework.filters.SearchFilter",
         "rest_framework.filters.OrderingFilter",
-    ]
+    ],
+    "DEFAULT_PAGINATION_CLASS": "library.pagination.KeysetPagination",
+    "DEFAULT_RENDERER_CLASSES": [
+        "library.renderers.FastJSONRenderer",
+        "rest_framework.renderers.BrowsableAPIRenderer",
+    ],
+    "PAGE_SIZE": 50,
 }
 
 SPECTACULAR_SETTINGS = {
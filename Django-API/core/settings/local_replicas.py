@@ -0,0 +1,25 @@
+"""
+Primary and replica as two SQLite files, to try the read routing locally.
+
+    python manage.py migrate --settings=core.settings.local_replicas
+    cp primary.sqlite3 replica.sqlite3
+
+The copy is a replica that stopped replicating: later writes reach only the
+primary, so which database served a read shows in the response.
+"""
+from .base import *
+
+ROOT_URLCONF = "core.urls"
+
+DATABASES = {
+    "default": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "primary.sqlite3",
+    },
+    "replica": {
+        "ENGINE": "django.db.backends.sqlite3",
+        "NAME": BASE_DIR / "replica.sqlite3",
+        "TEST": {"MIRROR": "default"},
+    },
+}
+LIBRARY_REPLICAS = ["replica"]
@@ -0,0 +1,106 @@
+"""
+Async read endpoints for ASGI deployments, mounted under ``api/async/``.
+
+Book search, availability, member borrowing history and statistics, with the
+same payloads and errors as their DRF counterparts (member history without
+``?ordering=``). They are plain async Django views reading through Django's
+async ORM and cache APIs, so under ASGI a request waiting on the database or
+the cache holds no worker thread.
+
+Independent queries (the search count and page) are awaited together with
+``asyncio.gather``. Django currently runs one request's ORM calls one after
+another on that request's thread, so for now they only overlap with other
+requests, not with each other.
+
+Conditional GET is not offered here: ``versions.conditional`` reads the
+table versions synchronously.
+"""
+import functools
+
+from django.http import HttpResponse
+from django.views.decorators.http import require_GET
+from rest_framework.exceptions import APIException, NotFound
+from rest_framework.request import Request
+
+from . import availability, search, stats
+from .models import Book, Borrowing
+from .pagination import KeysetPagination, SearchPagination
+from .renderers import FastJSONRenderer
+from .serializers import BookSerializer, BorrowingSerializer
+
+_renderer = FastJSONRenderer()
+
+
+def _json(data, status=200):
+    return HttpResponse(_renderer.render(data), status=status, content_type="application/json")
+
+
+def api_view(view):
+    """GET only, DRF query parameters, and DRF-style error bodies."""
+    @require_GET
+    @functools.wraps(view)
+    async def wrapper(request, *args, **kwargs):
+        try:
+            return await view(Request(request), *args, **kwargs)
+        except APIException as exc:
+            return _json({"detail": exc.detail}, status=exc.status_code)
+    return wrapper
+
+
+@api_view
+async def book_search(request):
+    query = (request.query_params.get("q") or "").strip()
+    paginator = SearchPagination()
+    page = await paginator.apaginate_queryset(search.search_books(query), request)
+    books = {
+        book.pk: book
+        async for book in Book.objects.select_related("category", "library").filter(
+            pk__in=[row["book_id"] for row in page]
+        )
+    }
+    results = []
+    for row in page:
+        book = books.get(row["book_id"])
+        if book is None:
+            continue
+        data = BookSerializer(book).data
+        data["score"] = row["score"]
+        results.append(data)
+    return _json(paginator.get_paginated_response(results).data)
+
+
+@api_view
+async def book_availability(request, book_id):
+    available_copies = (await availability.aget_available_copies([book_id])).get(book_id)
+    if available_copies is None:
+        raise NotFound("No Book matches the given query.")
+    return _json({"available": available_copies > 0, "available_copies": available_copies})
+
+
+@api_view
+async def book_availability_batch(request):
+    try:
+        book_ids = availability.parse_batch_ids(request.query_params.get("ids"))
+    except availability.BatchError as e:
+        return _json({"error": str(e)}, status=400)
+    return _json(availability.batch_result(book_ids, await availability.aget_available_copies(book_ids)))
+
+
+@api_view
+async def member_borrowing_history(request, member_id):
+    paginator = KeysetPagination()
+    page = await paginator.apaginate_queryset(
+        Borrowing.objects.select_related("book", "member")
+        .filter(member_id=member_id)
+        .order_by("-borrow_date", "-borrowing_id"),
+        request,
+    )
+    return _json(paginator.get_paginated_response(BorrowingSerializer(page, many=True).data).data)
+
+
+@api_view
+async def statistics(request):
+    library_id = request.query_params.get("library")
+    if library_id is not None and not library_id.isdigit():
+        return _json({"error": "library must be an integer"}, status=400)
+    return _json(await stats.aget_counters(int(library_id) if library_id else None))
@@ -0,0 +1,165 @@
+"""
+Read-through cache of ``Book.available_copies``.
+
+Lookups go to the cache first and fetch every miss with a single query. Writes
+never update cached values in place: once the writing transaction commits they
+bump the book's generation, a cache counter that is part of the key the count
+is stored under. A reader that missed, read the database and lost a race with
+a borrow writes its count under the generation it started with, which nobody
+reads any more, and a rolled-back borrow bumps nothing. Misses are loaded from
+the primary: a count read from a lagging replica would be cached after the bump
+meant to hide it. Hit and miss counters are per process.
+
+Generations never expire. One evicted by the cache backend is recreated from
+the clock, so counts stored under an older generation are not picked up again.
+"""
+import threading
+import time
+
+from django.conf import settings
+from django.core.cache import cache
+from django.db import router, transaction
+
+from .models import Book
+
+KEY_PREFIX = "library:availability:"
+GENERATION_PREFIX = "library:availability-gen:"
+
+# Most ids one batch request may ask about.
+MAX_BATCH_IDS = 500
+
+_counters = {"hits": 0, "misses": 0}
+_counters_lock = threading.Lock()
+
+
+def _key(book_id, generation):
+    return f"{KEY_PREFIX}{book_id}:{generation}"
+
+
+def _generation_key(book_id):
+    return f"{GENERATION_PREFIX}{book_id}"
+
+
+def _count(hits, misses):
+    with _counters_lock:
+        _counters["hits"] += hits
+        _counters["misses"] += misses
+
+
+def _generations(book_ids):
+    keys = {_generation_key(book_id): book_id for book_id in book_ids}
+    found = cache.get_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            cache.add(key, time.time_ns(), timeout=None)
+        found.update(cache.get_many(missing))
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+async def _agenerations(book_ids):
+    keys = {_generation_key(book_id): book_id for book_id in book_ids}
+    found = await cache.aget_many(keys)
+    missing = [key for key in keys if key not in found]
+    if missing:
+        for key in missing:
+            await cache.aadd(key, time.time_ns(), timeout=None)
+        found.update(await cache.aget_many(missing))
+    return {keys[key]: generation for key, generation in found.items()}
+
+
+def _load(missing):
+    return Book.objects.using(router.db_for_write(Book)).filter(pk__in=missing).values_list(
+        "book_id", "available_copies"
+    )
+
+
+def _hits(keys, cached):
+    """Split a ``get_many`` result into ``({book_id: copies}, [missed book_id])`` and count both."""
+    result = {keys[key]: copies for key, copies in cached.items()}
+    missing = [book_id for key, book_id in keys.items() if key not in cached]
+    _count(len(result), len(missing))
+    return result, missing
+
+
+def _misses(generations, rows):
+    """The counts loaded for the misses, and the cache entries to store them under."""
+    loaded = {book_id: max(copies or 0, 0) for book_id, copies in rows}
+    return loaded, {_key(book_id, generations.get(book_id)): copies for book_id, copies in loaded.items()}
+
+
+def get_available_copies(book_ids):
+    """Return ``{book_id: available_copies}``; unknown books are left out."""
+    generations = _generations(book_ids)
+    keys = {_key(book_id, generations.get(book_id)): book_id for book_id in book_ids}
+    result, missing = _hits(keys, cache.get_many(keys))
+    if missing:
+        loaded, entries = _misses(generations, _load(missing))
+        cache.set_many(entries, timeout=settings.LIBRARY_AVAILABILITY_CACHE_TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+async def aget_available_copies(book_ids):
+    """``get_available_copies`` for async views."""
+    generations = await _agenerations(book_ids)
+    keys = {_key(book_id, generations.get(book_id)): book_id for book_id in book_ids}
+    result, missing = _hits(keys, await cache.aget_many(keys))
+    if missing:
+        loaded, entries = _misses(generations, [row async for row in _load(missing)])
+        await cache.aset_many(entries, timeout=settings.LIBRARY_AVAILABILITY_CACHE_TIMEOUT)
+        result.update(loaded)
+    return result
+
+
+class BatchError(Exception):
+    """A malformed batch ``ids`` parameter; the message is user-facing."""
+
+
+def parse_batch_ids(value):
+    """
+    Parse the comma-separated ``ids`` of a batch request into distinct book ids
+    in request order. Raises ``BatchError`` if one is not a number, none are
+    given, or there are more than ``MAX_BATCH_IDS``.
+    """
+    raw = [part.strip() for part in (value or "").split(",") if part.strip()]
+    if not raw or not all(part.isdigit() for part in raw):
+        raise BatchError("ids must be a comma-separated list of book IDs")
+    book_ids = list(dict.fromkeys(int(part) for part in raw))
+    if len(book_ids) > MAX_BATCH_IDS:
+        raise BatchError(f"At most {MAX_BATCH_IDS} ids per request")
+    return book_ids
+
+
+def batch_result(book_ids, copies):
+    """The batch response body for ``book_ids`` given their ``copies``; unknown ids are listed as missing."""
+    return {
+        "results": {
+            str(book_id): {"available": copies[book_id] > 0, "available_copies": copies[book_id]}
+            for book_id in book_ids if book_id in copies
+        },
+        "missing": [book_id for book_id in book_ids if book_id not in copies],
+    }
+
+
+def _bump(keys):
+    for key in keys:
+        try:
+            cache.incr(key)
+        except ValueError:
+            # Evicted: the next reader starts a fresh generation.
+            pass
+
+
+def invalidate(book_ids):
+    """Retire cached counts for ``book_ids`` after the current transaction commits."""
+    keys = [_generation_key(book_id) for book_id in sorted(set(book_ids))]
+    if keys:
+        transaction.on_commit(lambda: _bump(keys))
+
+
+def counters():
+    with _counters_lock:
+        hits, misses = _counters["hits"], _counters["misses"]
+    total = hits + misses
+    return {"hits": hits, "misses": misses, "hit_ratio": round(hits / total, 4) if total else 0.0}
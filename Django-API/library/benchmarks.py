@@ -0,0 +1,160 @@
+"""Shared helpers for the ``bench_*`` management commands."""
+import random
+import statistics
+import time
+from contextlib import contextmanager
+
+from django.db import transaction
+
+from . import stats
+from .models import Author, Book, BookAuthor, Borrowing, Category, Library, Member, OverdueSummary, Review
+
+WORDS = (
+    "river night garden shadow empire ocean silent winter machine history "
+    "secret light stone forest city code data theory modern ancient journey "
+    "song fire glass iron paper star world mind water north"
+).split()
+
+SYLLABLES = (
+    "ka ri mo ta le shi no ven dor ath el mi sa ru qua bel tor wyn fa lo"
+).split()
+
+
+def build_vocabulary(rng, size=5000):
+    """Synthetic words, so posting lists look like a real catalog's rather than 30 words'."""
+    vocabulary = set(WORDS)
+    while len(vocabulary) < size:
+        vocabulary.add("".join(rng.choice(SYLLABLES) for _ in range(rng.randint(2, 4))))
+    return sorted(vocabulary)
+
+
+class Rollback(Exception):
+    """Raised to discard benchmark data at the end of a ``scratch_data`` block."""
+
+
+@contextmanager
+def scratch_data():
+    """Run the block in a transaction that is always rolled back."""
+    try:
+        with transaction.atomic():
+            yield
+            raise Rollback
+    except Rollback:
+        pass
+
+
+def percentile(samples, pct):
+    if not samples:
+        return 0.0
+    ordered = sorted(samples)
+    index = min(len(ordered) - 1, max(0, round(pct / 100 * len(ordered)) - 1))
+    return ordered[index]
+
+
+def summarize(samples_ms):
+    return {
+        "n": len(samples_ms),
+        "mean_ms": statistics.fmean(samples_ms) if samples_ms else 0.0,
+        "p50_ms": percentile(samples_ms, 50),
+        "p95_ms": percentile(samples_ms, 95),
+        "p99_ms": percentile(samples_ms, 99),
+    }
+
+
+def timed(func, *args, **kwargs):
+    """Call ``func`` and return (result, elapsed milliseconds)."""
+    started = time.perf_counter()
+    result = func(*args, **kwargs)
+    return result, (time.perf_counter() - started) * 1000
+
+
+def random_title(rng, words=3, vocabulary=WORDS):
+    # 1/rank weights give the long-tailed word frequencies of real titles.
+    weights = [1 / (rank + 1) for rank in range(len(vocabulary))]
+    return " ".join(rng.choices(vocabulary, weights, k=words)).title()
+
+
+def _bulk_create(model, rows, **lookup):
+    """bulk_create, then re-read the rows: MySQL does not hand back new keys."""
+    model.objects.bulk_create(rows, batch_size=1000)
+    return list(model.objects.filter(**lookup).order_by("pk"))
+
+
+def seed_catalog(books, members=0, seed=42, authors_per_book=2):
+    """
+    Bulk-create a synthetic catalog. Signals do not fire for bulk inserts, so
+    callers rebuild whatever derived data they need afterwards.
+    """
+    rng = random.Random(seed)
+    tag = f"bench{seed}"
+    libraries = _bulk_create(
+        Library, [Library(name=f"{tag} Library {i}") for i in range(5)],
+        name__startswith=f"{tag} Library",
+    )
+    categories = _bulk_create(
+        Category, [Category(name=f"{tag} {word.title()}") for word in WORDS[:12]],
+        name__startswith=f"{tag} ",
+    )
+    authors = _bulk_create(
+        Author,
+        [Author(name=f"{rng.choice(WORDS).title()} {rng.choice(WORDS).title()}son", bio=tag)
+         for _ in range(max(10, books // 5))],
+        bio=tag,
+    )
+    vocabulary = build_vocabulary(rng)
+    isbn_base = 9790000000000 + rng.randrange(10 ** 6) * 10 ** 5
+    book_rows = []
+    for i in range(books):
+        total = rng.randint(1, 6)
+        book_rows.append(Book(
+            title=random_title(rng, rng.randint(2, 5), vocabulary),
+            isbn=str(isbn_base + i),
+            published_year=str(rng.randint(1900, 2024)),
+            total_copies=total,
+            available_copies=total,
+            category=rng.choice(categories),
+            library=rng.choice(libraries),
+        ))
+    book_rows = _bulk_create(
+        Book, book_rows, isbn__gte=str(isbn_base), isbn__lt=str(isbn_base + books),
+    )
+    links = {
+        (book.pk, rng.choice(authors).pk)
+        for book in book_rows
+        for _ in range(authors_per_book)
+    }
+    BookAuthor.objects.bulk_create(
+        [BookAuthor(book_id=b, author_id=a) for b, a in links], batch_size=1000
+    )
+    _bulk_create(
+        Member,
+        [Member(name=f"Bench Member {i}", email=f"{tag}-{i}@example.com",
+                member_type=rng.choice(["Student", "Faculty"]))
+         for i in range(members)],
+        email__startswith=f"{tag}-",
+    )
+    return rng, vocabulary
+
+
+def delete_catalog(seed=42):
+    """
+    Delete what ``seed_catalog(seed=seed)`` created, with the loans and reviews
+    written against it, and reconcile the statistics counters.
+    """
+    tag = f"bench{seed}"
+    # Loans and reviews reference books and members with DO_NOTHING: delete them
+    # first. Author links go before their books, whose search terms they would
+    # otherwise rebuild.
+    with transaction.atomic():
+        members = Member.objects.filter(email__startswith=f"{tag}-")
+        books = Book.objects.filter(library__name__startswith=f"{tag} ")
+        Borrowing.objects.filter(member__in=members).delete()
+        Review.objects.filter(member__in=members).delete()
+        OverdueSummary.objects.filter(member__in=members).delete()
+        BookAuthor.objects.filter(book__in=books).delete()
+        books.delete()
+        members.delete()
+        Library.objects.filter(name__startswith=f"{tag} Library").delete()
+        Category.objects.filter(name__startswith=f"{tag} ").delete()
+        Author.objects.filter(bio=tag).delete()
+        stats.reconcile(fix=True)
@@ -0,0 +1,76 @@
+"""
+Model-free list serialization.
+
+``ValuesListMixin`` makes a viewset's ``list`` read ``queryset.values()`` and
+turn each row dict into the serializer's output directly: no model
+instances, and no per-row ``get_attribute`` / bound-field walk. The
+conversion uses the serializer's own field objects (``to_representation``
+per value, ``None`` passed through), so the JSON is identical to what the
+serializer produces.
+
+Only serializers whose readable fields all map onto one concrete column
+qualify (plain model fields and ``PrimaryKeyRelatedField``); anything else,
+such as method fields, nested serializers or dotted sources, falls back to
+the normal path. A view whose serializer adds data in ``to_representation``
+must return False from ``use_values_list()`` when that applies.
+"""
+from rest_framework.relations import PrimaryKeyRelatedField
+from rest_framework.response import Response
+
+
+def values_plan(serializer):
+    """``[(name, column, to_representation or None)]``, or None if a field needs the instance."""
+    model = serializer.Meta.model
+    columns = {field.name for field in model._meta.concrete_fields}
+    plan = []
+    for name, field in serializer.fields.items():
+        if field.write_only:
+            continue
+        if len(field.source_attrs) != 1 or field.source_attrs[0] not in columns:
+            return None
+        column = field.source_attrs[0]
+        if isinstance(field, PrimaryKeyRelatedField):
+            if field.pk_field is not None:
+                return None
+            # values() already yields the foreign key id.
+            plan.append((name, column, None))
+        else:
+            plan.append((name, column, field.to_representation))
+    return plan
+
+
+def values_data(plan, rows):
+    """Serializer-shaped dicts for ``values()`` rows."""
+    data = []
+    for row in rows:
+        item = {}
+        for name, column, to_representation in plan:
+            value = row[column]
+            item[name] = value if value is None or to_representation is None else to_representation(value)
+        data.append(item)
+    return data
+
+
+class ValuesListMixin:
+    """``list`` through ``values()`` rows when the serializer allows it."""
+
+    def use_values_list(self):
+        return True
+
+    def values_columns(self, plan):
+        """The plan's columns plus any the ordering (and so the keyset cursor) reads."""
+        columns = dict.fromkeys(column for _, column, _ in plan)
+        ordering = getattr(self, "ordering", None) or []
+        for name in [*getattr(self, "ordering_fields", []), *([ordering] if isinstance(ordering, str) else ordering)]:
+            columns.setdefault(name.lstrip("-"))
+        return list(columns)
+
+    def list(self, request, *args, **kwargs):
+        plan = values_plan(self.get_serializer()) if self.use_values_list() else None
+        if plan is None:
+            return super().list(request, *args, **kwargs)
+        queryset = self.filter_queryset(self.get_queryset()).values(*self.values_columns(plan))
+        page = self.paginate_queryset(queryset)
+        if page is not None:
+            return self.get_paginated_response(values_data(plan, page))
+        return Response(values_data(plan, queryset))
@@ -0,0 +1,141 @@
+"""
+Holds queue.
+
+Members queue for a book that has no copies left. A hold's ``position`` only
+ever grows within a book, so the queue is ``ORDER BY position`` over the
+``(book, position)`` unique index. When a copy is returned it goes to the
+earliest waiting hold, which becomes ``ready`` and keeps the copy reserved:
+``available_copies`` is not incremented and only that member can borrow it.
+Collected, cancelled and expired holds are deleted, so the table only holds
+live queues and a queue position is one count over a short index range.
+
+Every function here expects the caller to hold the Book row lock
+(``select_for_update``) inside a transaction, like the borrow/return paths.
+"""
+from datetime import timedelta
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Max, OuterRef, Subquery, Value, When
+from django.db.models.functions import Coalesce
+from django.utils import timezone
+
+from . import availability, versions
+from .models import Book, Borrowing, Hold
+
+PICKUP_PERIOD = timedelta(days=3)
+
+
+class HoldError(Exception):
+    """A hold request that cannot be honoured; the message is user-facing."""
+
+
+def place_hold(book, member):
+    if (book.available_copies or 0) > 0:
+        raise HoldError("Book is available; borrow it instead.")
+    if Borrowing.objects.filter(book=book, member=member, return_date__isnull=True).exists():
+        raise HoldError("This member already borrowed this book and has not returned it.")
+    if Hold.objects.filter(book=book, member=member).exists():
+        raise HoldError("This member already has a hold on this book.")
+    last = Hold.objects.filter(book=book).aggregate(last=Max("position"))["last"] or 0
+    return Hold.objects.create(book=book, member=member, position=last + 1)
+
+
+def ready_hold(book, member):
+    """The member's hold on ``book`` if a copy is waiting for them."""
+    return Hold.objects.filter(book=book, member=member, status=Hold.READY).first()
+
+
+def queue_position(hold):
+    """1 for the next member in line, 0 once a copy is waiting for them."""
+    if hold.status == Hold.READY:
+        return 0
+    return Hold.objects.filter(
+        book_id=hold.book_id, status=Hold.WAITING, position__lte=hold.position
+    ).count()
+
+
+def member_holds(member_id):
+    """The member's holds, each annotated with ``queue_position``, in one query."""
+    ahead = (
+        Hold.objects.filter(book_id=OuterRef("book_id"), status=Hold.WAITING, position__lte=OuterRef("position"))
+        .order_by()
+        .values("book_id")
+        .annotate(n=Count("pk"))
+        .values("n")
+    )
+    return (
+        Hold.objects.filter(member_id=member_id)
+        .select_related("book")
+        .annotate(queue_position=Case(
+            When(status=Hold.READY, then=Value(0)),
+            default=Coalesce(Subquery(ahead, output_field=IntegerField()), Value(0)),
+        ))
+        .order_by("created_at", "hold_id")
+    )
+
+
+def assign_copies(copies):
+    """
+    Hand ``{book_id: copies}`` to the earliest waiting holds and return the
+    copies nobody was waiting for, ``{book_id: leftover}``. Costs one read of
+    the freed books' queues and one UPDATE, however many books were freed.
+    """
+    wanted = sorted(book_id for book_id, count in copies.items() if count > 0)
+    queues = {}
+    if wanted:
+        # One query for every book's queue, however many books were freed.
+        for pk, book_id in (
+            Hold.objects.filter(book_id__in=wanted, status=Hold.WAITING)
+            .order_by("book_id", "position")
+            .values_list("pk", "book_id")
+        ):
+            queues.setdefault(book_id, []).append(pk)
+    ready, leftover = [], {}
+    for book_id in sorted(copies):
+        count = copies[book_id]
+        ids = queues.get(book_id, [])[:max(count, 0)]
+        ready.extend(ids)
+        leftover[book_id] = count - len(ids)
+    if ready:
+        Hold.objects.filter(pk__in=ready).update(status=Hold.READY, ready_at=timezone.now())
+    return leftover
+
+
+def _release(copies):
+    """Pass freed copies to the next holders and shelve the rest."""
+    for book_id, count in assign_copies(copies).items():
+        if count:
+            availability.invalidate([book_id])
+            versions.bump("book")
+            Book.objects.filter(pk=book_id).update(available_copies=F("available_copies") + count)
+
+
+def cancel_hold(hold):
+    was_ready = hold.status == Hold.READY
+    hold.delete()
+    if was_ready:
+        _release({hold.book_id: 1})
+
+
+@transaction.atomic
+def expire_ready_holds(now=None):
+    """Cancel ready holds not collected within ``PICKUP_PERIOD``; returns how many."""
+    cutoff = (now or timezone.now()) - PICKUP_PERIOD
+    expired = list(
+        Hold.objects.filter(status=Hold.READY, ready_at__lt=cutoff).values_list("pk", "book_id")
+    )
+    if not expired:
+        return 0
+    book_ids = sorted({book_id for _, book_id in expired})
+    list(Book.objects.select_for_update().filter(pk__in=book_ids).order_by("book_id").values_list("pk"))
+    # Re-check under the lock: a hold may have been collected meanwhile.
+    expired = list(
+        Hold.objects.filter(pk__in=[pk for pk, _ in expired], status=Hold.READY, ready_at__lt=cutoff)
+        .values_list("pk", "book_id")
+    )
+    Hold.objects.filter(pk__in=[pk for pk, _ in expired]).delete()
+    copies = {}
+    for _, book_id in expired:
+        copies[book_id] = copies.get(book_id, 0) + 1
+    _release(copies)
+    return len(expired)
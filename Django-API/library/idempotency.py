@@ -0,0 +1,176 @@
+"""
+``Idempotency-Key`` support for the borrow and return POSTs.
+
+A client that may retry (a kiosk on a flaky network) sends the same key with
+every attempt. The first attempt inserts an ``IdempotencyRecord`` for
+(key, path) in its own short transaction, runs the view and stores the
+response. A retry is answered from that row by a primary-key-sized index
+lookup: the view, its ``SELECT ... FOR UPDATE`` and its writes do not run
+again. Replays carry ``Idempotent-Replayed: true``.
+
+Concurrent attempts are collapsed by the unique index: the one whose insert
+wins executes; the others poll its row for up to ``LIBRARY_IDEMPOTENCY_WAIT``
+seconds and replay its response, or get a 409 if it is still running. A row
+left unfinished for ``LIBRARY_IDEMPOTENCY_LEASE`` seconds (a crashed worker)
+is taken over by the next attempt.
+
+Responses below 500 are stored, including 400s and 404s the view raises
+(``APIException``, ``Http404`` and ``PermissionDenied``, rendered by the
+configured exception handler): the same request would fail the same way. On
+a 5xx or any other exception the row is deleted so the client can retry.
+Reusing a key with a different body is a 422. Rows expire after
+``LIBRARY_IDEMPOTENCY_TTL`` seconds: an expired row is never replayed, the
+next attempt takes it over, and ``purge_idempotency_keys`` deletes the rest.
+"""
+import functools
+import hashlib
+import json
+import time
+from datetime import timedelta
+
+from django.conf import settings
+from django.core.exceptions import PermissionDenied
+from django.db import IntegrityError, transaction
+from django.http import Http404
+from django.utils import timezone
+from rest_framework import status
+from rest_framework.exceptions import APIException
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+
+from .models import IdempotencyRecord
+
+HEADER = "Idempotency-Key"
+MAX_KEY_LENGTH = 255
+POLL_INTERVAL = 0.05
+
+
+def ttl():
+    return timedelta(seconds=getattr(settings, "LIBRARY_IDEMPOTENCY_TTL", 24 * 60 * 60))
+
+
+def request_hash(method, data):
+    body = json.dumps(data, sort_keys=True, separators=(",", ":"), default=str)
+    return hashlib.sha256(f"{method} {body}".encode()).hexdigest()
+
+
+def _lookup(key, path):
+    return IdempotencyRecord.objects.filter(key=key, path=path).first()
+
+
+def _claim(key, path, digest, stale=None):
+    """
+    Insert the in-flight row, or take over ``stale``: an unfinished row past
+    its lease or an expired one. Returns True if this request is the one to
+    execute.
+    """
+    now = timezone.now()
+    if stale is not None:
+        # Matching status_code and created_at means no other attempt got there first.
+        return bool(
+            IdempotencyRecord.objects.filter(pk=stale.pk, status_code=stale.status_code, created_at=stale.created_at)
+            .update(request_hash=digest, status_code=None, response_body=None, created_at=now,
+                    expires_at=now + ttl())
+        )
+    try:
+        with transaction.atomic():
+            IdempotencyRecord.objects.create(
+                key=key, path=path, request_hash=digest, created_at=now, expires_at=now + ttl(),
+            )
+        return True
+    except IntegrityError:
+        return False
+
+
+def _wait(key, path):
+    """The finished record for (key, path), or None if it is still running or was abandoned."""
+    deadline = time.monotonic() + getattr(settings, "LIBRARY_IDEMPOTENCY_WAIT", 5)
+    while True:
+        record = _lookup(key, path)
+        if record is None or record.status_code is not None or time.monotonic() >= deadline:
+            return record
+        time.sleep(POLL_INTERVAL)
+
+
+def _replay(record, digest):
+    if record.request_hash != digest:
+        return Response(
+            {"error": f"{HEADER} was already used with a different request"},
+            status=status.HTTP_422_UNPROCESSABLE_ENTITY,
+        )
+    if record.status_code is None:
+        return Response(
+            {"error": f"A request with this {HEADER} is still in progress"},
+            status=status.HTTP_409_CONFLICT,
+        )
+    response = Response(json.loads(record.response_body), status=record.status_code)
+    response["Idempotent-Replayed"] = "true"
+    return response
+
+
+def _execute(view, request, args, kwargs, key, path):
+    unfinished = IdempotencyRecord.objects.filter(key=key, path=path, status_code__isnull=True)
+    try:
+        try:
+            response = view(request, *args, **kwargs)
+        except (APIException, Http404, PermissionDenied) as exc:
+            # Rendered here rather than by the view so that the response can be stored.
+            context = dict(getattr(request, "parser_context", None) or {}, request=request)
+            response = api_settings.EXCEPTION_HANDLER(exc, context)
+            if response is None:
+                raise
+    except BaseException:
+        unfinished.delete()
+        raise
+    if response.status_code >= 500:
+        unfinished.delete()
+    else:
+        unfinished.update(status_code=response.status_code, response_body=json.dumps(response.data, default=str))
+    return response
+
+
+def idempotent(view):
+    """Decorate an ``APIView.post`` to honour the ``Idempotency-Key`` header."""
+    @functools.wraps(view)
+    def wrapper(request, *args, **kwargs):
+        key = request.headers.get(HEADER)
+        if key is None:
+            return view(request, *args, **kwargs)
+        if not key or len(key) > MAX_KEY_LENGTH:
+            return Response(
+                {"error": f"{HEADER} must be 1 to {MAX_KEY_LENGTH} characters"},
+                status=status.HTTP_400_BAD_REQUEST,
+            )
+        path, digest = request.path, request_hash(request.method, request.data)
+        lease = timedelta(seconds=getattr(settings, "LIBRARY_IDEMPOTENCY_LEASE", 60))
+
+        # A retry of a finished request costs this one indexed read.
+        record, now = _lookup(key, path), timezone.now()
+        if record is not None and (
+            record.expires_at < now or (record.status_code is None and record.created_at < now - lease)
+        ):
+            stale = record
+        else:
+            stale = None
+        if record is None or stale is not None:
+            if _claim(key, path, digest, stale):
+                return _execute(view, request, args, kwargs, key, path)
+            record = None
+        if record is None or record.status_code is None:
+            record = _wait(key, path)
+        if record is None:
+            # The attempt we waited for failed and released the key: run again.
+            return wrapper(request, *args, **kwargs)
+        return _replay(record, digest)
+    return wrapper
+
+
+def purge_expired(batch_size=1000):
+    """Delete expired records in primary-key batches. Returns the number deleted."""
+    deleted = 0
+    now = timezone.now()
+    while True:
+        ids = list(IdempotencyRecord.objects.filter(expires_at__lt=now).values_list("pk", flat=True)[:batch_size])
+        if not ids:
+            return deleted
+        deleted += IdempotencyRecord.objects.filter(pk__in=ids).delete()[0]
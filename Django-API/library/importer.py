@@ -0,0 +1,220 @@
+"""
+Bulk catalog import.
+
+Each input row describes one book: ``title``, ``isbn``, ``published_year``,
+``total_copies``, ``available_copies``, ``category`` and ``library`` (names)
+and ``authors`` (a list, or names separated by ``;`` in CSV). Rows are
+validated with the same rules as ``BookSerializer``; bad rows are reported and
+skipped. Category, Library and Author names are resolved through in-memory
+maps, creating missing ones, and each batch costs a fixed number of queries:
+books are inserted with ``bulk_create(ignore_conflicts=True)`` against the
+unique ISBN, author links against ``uq_book_author``. Books whose ISBN already
+exists are left as they are but still get any new author links.
+
+``bulk_create`` sends no signals, so the search index, the statistics
+counters and the table versions are updated here explicitly.
+"""
+import csv
+import json
+from collections import Counter
+
+from django.db import transaction
+from rest_framework import serializers
+
+from . import search, stats, versions
+from .models import Author, Book, BookAuthor, Category, Library
+from .serializers import check_copies, clean_isbn, clean_published_year
+
+TITLE_MAX_LENGTH = Book._meta.get_field("title").max_length
+NAME_MAX_LENGTH = 100
+
+
+def read_rows(path, fmt=None):
+    """Yield ``(line number, dict)`` from a CSV or JSONL file (format from the extension by default)."""
+    fmt = fmt or ("jsonl" if path.endswith((".jsonl", ".ndjson")) else "csv")
+    with open(path, newline="", encoding="utf-8") as f:
+        if fmt == "csv":
+            reader = csv.DictReader(f)
+            for row in reader:
+                yield reader.line_num, row
+        else:
+            for number, line in enumerate(f, start=1):
+                if not line.strip():
+                    continue
+                try:
+                    yield number, json.loads(line)
+                except ValueError:
+                    yield number, None
+
+
+def _int_or_none(value, field):
+    if value in (None, ""):
+        return None
+    try:
+        return int(value)
+    except (TypeError, ValueError):
+        raise serializers.ValidationError({field: "Must be an integer."})
+
+
+def _name(value, field):
+    name = (value or "").strip()
+    if len(name) > NAME_MAX_LENGTH:
+        raise serializers.ValidationError({field: f"Must be at most {NAME_MAX_LENGTH} characters."})
+    return name or None
+
+
+def clean_row(row):
+    """Return a normalized row or raise ``ValidationError``."""
+    if not isinstance(row, dict):
+        raise serializers.ValidationError("Not a JSON object.")
+    title = (row.get("title") or "").strip()
+    if not title:
+        raise serializers.ValidationError({"title": "This field is required."})
+    if len(title) > TITLE_MAX_LENGTH:
+        raise serializers.ValidationError({"title": f"Must be at most {TITLE_MAX_LENGTH} characters."})
+
+    total = _int_or_none(row.get("total_copies"), "total_copies")
+    available = _int_or_none(row.get("available_copies"), "available_copies")
+    if available is None:
+        available = total
+    check_copies(total, available)
+
+    authors = row.get("authors") or []
+    if isinstance(authors, str):
+        authors = authors.split(";")
+    authors = list(dict.fromkeys(filter(None, (_name(a, "authors") for a in authors))))
+
+    year = row.get("published_year")
+    return {
+        "title": title,
+        "isbn": clean_isbn(str(row.get("isbn") or "")),
+        "published_year": clean_published_year(None if year in (None, "") else year),
+        "total_copies": total,
+        "available_copies": available,
+        "category": _name(row.get("category"), "category"),
+        "library": _name(row.get("library"), "library"),
+        "authors": authors,
+    }
+
+
+def _error_text(error):
+    detail = error.detail
+    if isinstance(detail, dict):
+        return "; ".join(f"{field}: {' '.join(map(str, msgs if isinstance(msgs, list) else [msgs]))}"
+                         for field, msgs in detail.items())
+    return " ".join(map(str, detail if isinstance(detail, list) else [detail]))
+
+
+class CatalogImporter:
+    """
+    Feed rows with ``add(line, row)``; every ``batch_size`` valid rows are
+    written in one transaction. Call ``finish()`` at the end.
+    """
+
+    def __init__(self, batch_size=1000, dry_run=False):
+        self.batch_size = batch_size
+        self.dry_run = dry_run
+        self.maps = {Category: {}, Library: {}, Author: {}}
+        self.pending = []
+        self.seen_isbns = set()
+        self.errors = []
+        self.counts = Counter()
+
+    def add(self, line, row):
+        self.counts["rows"] += 1
+        try:
+            cleaned = clean_row(row)
+        except serializers.ValidationError as e:
+            self.skip(line, _error_text(e))
+            return
+        if cleaned["isbn"] in self.seen_isbns:
+            self.skip(line, f"isbn: {cleaned['isbn']} appears earlier in the input.")
+            return
+        self.seen_isbns.add(cleaned["isbn"])
+        self.pending.append(cleaned)
+        if len(self.pending) >= self.batch_size:
+            self.flush()
+
+    def skip(self, line, reason):
+        self.counts["skipped"] += 1
+        self.errors.append((line, reason))
+
+    def finish(self):
+        self.flush()
+        return self.counts
+
+    def _resolve(self, model, names):
+        """Map every name to a primary key, creating the missing rows."""
+        known = self.maps[model]
+        missing = {name for name in names if name and name not in known}
+        if not missing:
+            return known
+        for pk, name in model.objects.filter(name__in=missing).order_by("pk").values_list("pk", "name"):
+            known.setdefault(name, pk)
+        to_create = sorted(missing - known.keys())
+        if to_create:
+            model.objects.bulk_create([model(name=name) for name in to_create])
+            # Refetch rather than trust bulk_create: MySQL returns no keys.
+            for pk, name in model.objects.filter(name__in=to_create).order_by("pk").values_list("pk", "name"):
+                known.setdefault(name, pk)
+            self.counts[f"{model._meta.db_table}_created"] += len(to_create)
+        return known
+
+    def flush(self):
+        rows, self.pending = self.pending, []
+        if not rows:
+            return
+        with transaction.atomic():
+            self._write(rows)
+            if self.dry_run:
+                transaction.set_rollback(True)
+        if self.dry_run:
+            # Names created in the rolled-back batch no longer exist.
+            self.maps = {model: {} for model in self.maps}
+
+    def _write(self, rows):
+        categories = self._resolve(Category, {row["category"] for row in rows})
+        libraries = self._resolve(Library, {row["library"] for row in rows})
+        authors = self._resolve(Author, {name for row in rows for name in row["authors"]})
+
+        isbns = [row["isbn"] for row in rows]
+        existing = set(Book.objects.filter(isbn__in=isbns).values_list("isbn", flat=True))
+        Book.objects.bulk_create(
+            [
+                Book(
+                    title=row["title"],
+                    isbn=row["isbn"],
+                    published_year=row["published_year"],
+                    total_copies=row["total_copies"],
+                    available_copies=row["available_copies"],
+                    category_id=categories.get(row["category"]),
+                    library_id=libraries.get(row["library"]),
+                )
+                for row in rows if row["isbn"] not in existing
+            ],
+            ignore_conflicts=True,
+        )
+        book_ids = dict(Book.objects.filter(isbn__in=isbns).values_list("isbn", "book_id"))
+
+        linked = set(
+            BookAuthor.objects.filter(book_id__in=book_ids.values()).values_list("book_id", "author_id")
+        )
+        links = {
+            (book_ids[row["isbn"]], authors[name])
+            for row in rows if row["isbn"] in book_ids
+            for name in row["authors"]
+        } - linked
+        BookAuthor.objects.bulk_create(
+            [BookAuthor(book_id=book_id, author_id=author_id) for book_id, author_id in sorted(links)],
+            ignore_conflicts=True,
+        )
+
+        created = [row for row in rows if row["isbn"] not in existing and row["isbn"] in book_ids]
+        search.reindex_books({book_ids[row["isbn"]] for row in created} | {book_id for book_id, _ in links})
+        per_library = Counter(libraries.get(row["library"]) for row in created)
+        stats.apply_deltas({library_id: {"total_books": n} for library_id, n in per_library.items()})
+        versions.bump("author", "book", "book_author", "category", "library")
+
+        self.counts["books_created"] += len(created)
+        self.counts["books_existing"] += len(rows) - len(created)
+        self.counts["author_links_created"] += len(links)
@@ -0,0 +1,273 @@
+"""
+Batch borrow and return, and the optimistic single-loan paths.
+
+Both batch operations lock every affected Book row in one ``SELECT ... FOR
+UPDATE`` ordered by ``book_id`` so concurrent batches always acquire locks in
+the same order, then settle all items with a fixed number of statements
+regardless of how many items the batch holds.
+
+``borrow_optimistic`` / ``return_optimistic`` serve ``/api/borrow/`` and
+``/api/return/`` when ``LIBRARY_BORROW_STRATEGY`` is ``"optimistic"``: each
+decides with a conditional UPDATE and its affected-row count instead of
+locking and re-reading the row first.
+"""
+from collections import Counter
+from datetime import timedelta
+
+from django.db import IntegrityError, transaction
+from django.db.models import Case, F, IntegerField, When
+from django.utils import timezone
+
+from . import availability, holds, stats, versions
+from .models import Book, Borrowing, Hold, Member
+from .serializers import BorrowingSerializer
+
+LOAN_PERIOD = timedelta(days=14)
+
+
+def _locked_books(book_ids):
+    return {
+        book.pk: book
+        for book in Book.objects.select_for_update()
+        .filter(pk__in=sorted(set(book_ids)))
+        .order_by("book_id")
+        .only("book_id", "available_copies", "total_copies", "library_id")
+    }
+
+
+def _adjust_copies(deltas):
+    """Apply ``{book_id: delta}`` to available_copies in a single UPDATE."""
+    deltas = {book_id: delta for book_id, delta in deltas.items() if delta}
+    if not deltas:
+        return
+    availability.invalidate(deltas)
+    versions.bump("book")
+    Book.objects.filter(pk__in=deltas).update(
+        available_copies=Case(
+            *[When(pk=book_id, then=F("available_copies") + delta) for book_id, delta in deltas.items()],
+            output_field=IntegerField(),
+        )
+    )
+
+
+def _error(index, book_id, member_id, message):
+    return {"index": index, "book_id": book_id, "member_id": member_id, "ok": False, "error": message}
+
+
+@transaction.atomic
+def bulk_borrow(items):
+    """
+    Borrow every ``(book_id, member_id)`` pair that can be satisfied.
+
+    Returns one result dict per item, in input order. Items that fail (unknown
+    book or member, no copies left, already on loan) do not affect the others.
+    A member whose hold on the book is ready collects the copy set aside for
+    them, as ``/api/borrow/`` does, without touching ``available_copies``.
+    """
+    books = _locked_books(book_id for book_id, _ in items)
+    member_ids = {member_id for _, member_id in items}
+    members = set(Member.objects.filter(pk__in=member_ids).values_list("pk", flat=True))
+    active = set(
+        Borrowing.objects.filter(
+            book_id__in=books, member_id__in=member_ids, return_date__isnull=True
+        ).values_list("book_id", "member_id")
+    )
+    ready = {
+        (book_id, member_id): pk
+        for pk, book_id, member_id in Hold.objects.filter(
+            book_id__in=books, member_id__in=member_ids, status=Hold.READY
+        ).values_list("pk", "book_id", "member_id")
+    }
+
+    borrow_date = timezone.localdate()
+    due_date = borrow_date + LOAN_PERIOD
+    remaining = {pk: max(book.available_copies or 0, 0) for pk, book in books.items()}
+    results = [None] * len(items)
+    created, collected = [], []
+    for index, (book_id, member_id) in enumerate(items):
+        if book_id not in books:
+            results[index] = _error(index, book_id, member_id, "Book not found")
+        elif member_id not in members:
+            results[index] = _error(index, book_id, member_id, "Member not found")
+        elif (book_id, member_id) in active:
+            results[index] = _error(
+                index, book_id, member_id,
+                "This member already borrowed this book and has not returned it.",
+            )
+        elif (book_id, member_id) not in ready and remaining[book_id] <= 0:
+            results[index] = _error(index, book_id, member_id, "Book not available")
+        else:
+            if (book_id, member_id) in ready:
+                collected.append(ready[book_id, member_id])
+            else:
+                remaining[book_id] -= 1
+            active.add((book_id, member_id))
+            created.append((index, Borrowing(
+                book=books[book_id], member_id=member_id,
+                borrow_date=borrow_date, due_date=due_date,
+            )))
+
+    if created:
+        borrowings = Borrowing.objects.bulk_create([borrowing for _, borrowing in created])
+        versions.bump("borrowing")
+        if borrowings[0].pk is None:
+            # MySQL does not return generated keys from a multi-row INSERT.
+            keys = dict(
+                ((book_id, member_id), pk)
+                for pk, book_id, member_id in Borrowing.objects.filter(
+                    book_id__in={b.book_id for b in borrowings},
+                    member_id__in={b.member_id for b in borrowings},
+                    return_date__isnull=True,
+                ).values_list("pk", "book_id", "member_id")
+            )
+            for borrowing in borrowings:
+                borrowing.pk = keys[(borrowing.book_id, borrowing.member_id)]
+        if collected:
+            Hold.objects.filter(pk__in=collected).delete()
+        _adjust_copies({pk: remaining[pk] - max(book.available_copies or 0, 0) for pk, book in books.items()})
+        stats.record_borrowings([stats.borrowing_state(b) for b in borrowings])
+
+    for index, borrowing in created:
+        results[index] = {
+            "index": index,
+            "book_id": borrowing.book_id,
+            "member_id": borrowing.member_id,
+            "ok": True,
+            "borrowing": BorrowingSerializer(borrowing).data,
+            "available_copies": remaining[borrowing.book_id],
+        }
+    return results
+
+
+@transaction.atomic
+def bulk_return(items):
+    """
+    Return the active loan behind every ``(book_id, member_id)`` pair. Returned
+    copies are handed to waiting holds before going back on the shelf.
+    """
+    books = _locked_books(book_id for book_id, _ in items)
+    member_ids = {member_id for _, member_id in items}
+    loans = {}
+    for borrowing in (
+        Borrowing.objects.select_for_update()
+        .filter(book_id__in=books, member_id__in=member_ids, return_date__isnull=True)
+        .order_by("borrowing_id")
+    ):
+        loans.setdefault((borrowing.book_id, borrowing.member_id), borrowing)
+
+    return_date = timezone.localdate()
+    available = {pk: book.available_copies or 0 for pk, book in books.items()}
+    results = [None] * len(items)
+    returned = []
+    for index, (book_id, member_id) in enumerate(items):
+        borrowing = loans.pop((book_id, member_id), None)
+        if borrowing is None:
+            results[index] = _error(index, book_id, member_id, "No active borrowing found")
+            continue
+        borrowing.book = books[book_id]
+        before = stats.borrowing_state(borrowing)
+        borrowing.return_date = return_date
+        returned.append((index, borrowing, before))
+
+    if returned:
+        Borrowing.objects.filter(pk__in=[b.pk for _, b, _ in returned]).update(return_date=return_date)
+        versions.bump("borrowing")
+        # Copies go to waiting holds first; only the rest return to the shelf.
+        shelved = holds.assign_copies(Counter(b.book_id for _, b, _ in returned))
+        _adjust_copies(shelved)
+        for book_id, count in shelved.items():
+            available[book_id] += count
+        stats.record_borrowing_changes(
+            [(before, stats.borrowing_state(b)) for _, b, before in returned]
+        )
+
+    for index, borrowing, _ in returned:
+        late_days = 0
+        if stats.is_late(borrowing):
+            late_days = (borrowing.return_date - borrowing.due_date).days
+        results[index] = {
+            "index": index,
+            "book_id": borrowing.book_id,
+            "member_id": borrowing.member_id,
+            "ok": True,
+            "borrowing": BorrowingSerializer(borrowing).data,
+            "late_days": late_days,
+            "available_copies": available[borrowing.book_id],
+        }
+    return results
+
+
+class LoanError(Exception):
+    """A single borrow or return that cannot be done; the message is user-facing."""
+
+
+def borrow_optimistic(book, member_id):
+    """
+    Borrow one copy of ``book`` without ``SELECT ... FOR UPDATE``.
+
+    The copy is taken with ``UPDATE ... SET available_copies = available_copies - 1
+    WHERE book_id = %s AND available_copies > 0``; an affected-row count of 0
+    means no copy was free. A second open loan of the same book by the same
+    member is rejected by ``uq_borrowing_active_loan``, not by a pre-check. The
+    Book row is locked only from that UPDATE to the commit. Returns
+    ``(borrowing, available_copies)``, or None when no copy was free, in which
+    case the caller falls back to the locking path: it also serves a member
+    whose hold has a copy set aside.
+    """
+    borrow_date = timezone.localdate()
+    try:
+        with transaction.atomic():
+            taken = Book.objects.filter(pk=book.pk, available_copies__gt=0).update(
+                available_copies=F("available_copies") - 1
+            )
+            if not taken:
+                return None
+            # Under the row lock now, like every holds function expects.
+            claimed, _ = Hold.objects.filter(book_id=book.pk, member_id=member_id, status=Hold.READY).delete()
+            if claimed:
+                # The member collects the copy set aside for them instead.
+                Book.objects.filter(pk=book.pk).update(available_copies=F("available_copies") + 1)
+            borrowing = Borrowing.objects.create(
+                book=book, member_id=member_id, borrow_date=borrow_date, due_date=borrow_date + LOAN_PERIOD
+            )
+            availability.invalidate([book.pk])
+            versions.bump("book")
+    except IntegrityError:
+        raise LoanError("This member already borrowed this book and has not returned it.")
+    available = Book.objects.filter(pk=book.pk).values_list("available_copies", flat=True).first()
+    return borrowing, available
+
+
+def return_optimistic(borrowing_id):
+    """
+    Return an open loan without ``SELECT ... FOR UPDATE``.
+
+    The loan is closed with ``UPDATE ... WHERE borrowing_id = %s AND return_date
+    IS NULL``, so of two concurrent returns exactly one succeeds. Returns
+    ``(borrowing, available_copies, reserved_for_hold)``.
+    """
+    borrowing = (
+        Borrowing.objects.select_related("book")
+        .filter(pk=borrowing_id, return_date__isnull=True)
+        .first()
+    )
+    if borrowing is None:
+        raise LoanError("No active borrowing found")
+    before = stats.borrowing_state(borrowing)
+    return_date = timezone.localdate()
+    with transaction.atomic():
+        if not Borrowing.objects.filter(pk=borrowing_id, return_date__isnull=True).update(return_date=return_date):
+            raise LoanError("No active borrowing found")
+        versions.bump("borrowing")
+        borrowing.return_date = return_date
+        stats.record_borrowing_change(before, stats.borrowing_state(borrowing))
+        # The increment locks the Book row before the holds queue is read.
+        book_id = borrowing.book_id
+        Book.objects.filter(pk=book_id).update(available_copies=F("available_copies") + 1)
+        reserved = not holds.assign_copies({book_id: 1})[book_id]
+        if reserved:
+            Book.objects.filter(pk=book_id).update(available_copies=F("available_copies") - 1)
+        availability.invalidate([book_id])
+        versions.bump("book")
+    available = Book.objects.filter(pk=book_id).values_list("available_copies", flat=True).first()
+    return borrowing, available, reserved
@@ -0,0 +1,254 @@
+import json
+import logging
+import time
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import Client
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+
+from library import benchmarks, ratings, search, stats
+from library.models import Book, Borrowing, Member, Review
+
+DEFAULT_MIX = "borrow=3,return=3,search=4,stats=1,books=2,borrowings=1,reviews=1,members=1"
+LIST_URLS = {
+    "books": "/books/",
+    "borrowings": "/borrowings/",
+    "reviews": "/reviews/",
+    "members": "/members/",
+}
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in ("borrow", "return", "search", "stats", *LIST_URLS):
+            raise CommandError(f"Unknown workload {name!r}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight for {name!r}")
+    return mix
+
+
+class Workload:
+    """Builds the next request for each endpoint from the seeded data."""
+
+    def __init__(self, rng, vocabulary, book_ids, member_ids):
+        self.rng = rng
+        self.vocabulary = vocabulary
+        self.book_ids = book_ids
+        self.member_ids = member_ids
+        self.active = list(
+            Borrowing.objects.filter(book_id__in=book_ids, return_date__isnull=True)
+            .order_by("pk").values_list("pk", flat=True)
+        )
+
+    def request(self, name):
+        """Return (method, path, payload)."""
+        rng = self.rng
+        if name == "borrow":
+            book_id = rng.choice(self.book_ids)
+            member_id = rng.choice([pk for pk in rng.sample(self.member_ids, 2) if pk != book_id])
+            return "post", "/api/borrow/", {"book_id": book_id, "member_id": member_id}
+        if name == "return":
+            if not self.active:
+                return self.request("borrow")
+            borrowing_id = self.active.pop(rng.randrange(len(self.active)))
+            return "post", "/api/return/", {"borrowing_id": borrowing_id}
+        if name == "search":
+            query = benchmarks.random_title(rng, rng.randint(1, 2), self.vocabulary)
+            return "get", "/api/books/search/", {"q": query}
+        if name == "stats":
+            return "get", "/api/stats/", None
+        return "get", LIST_URLS[name], None
+
+    def observe(self, response):
+        # A "return" with nothing left to return is sent as a borrow, so go by the status.
+        if response.status_code == 201:
+            self.active.append(response.json()["borrowing"]["borrowing_id"])
+
+
+class Command(BaseCommand):
+    help = (
+        "Drive a mixed borrow/return/search/stats/list workload through the full request stack "
+        "and report throughput, p50/p95/p99 latency and SQL queries per request. Seeds committed "
+        "synthetic data, so commit hooks and the replica router run as in production, and deletes "
+        "it afterwards. Save a run with --save-baseline and compare later runs with --baseline."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=5000)
+        parser.add_argument("--members", type=int, default=1000)
+        parser.add_argument("--loans", type=int, default=10000, help="Historical loans to seed (10%% left active).")
+        parser.add_argument("--reviews", type=int, default=5000)
+        parser.add_argument("--requests", type=int, default=2000)
+        parser.add_argument("--warmup", type=int, default=100)
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma-separated name=weight pairs.")
+        parser.add_argument("--seed", type=int, default=42)
+        parser.add_argument("--save-baseline", metavar="PATH")
+        parser.add_argument("--baseline", metavar="PATH", help="Compare against a saved run.")
+        parser.add_argument("--threshold", type=float, default=20.0,
+                            help="Percent p95 slowdown (or any rise in queries) counted as a regression.")
+        parser.add_argument("--fail-on-regression", action="store_true")
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        baseline = None
+        if options["baseline"]:
+            try:
+                with open(options["baseline"]) as f:
+                    baseline = json.load(f)
+            except (OSError, ValueError) as e:
+                raise CommandError(f"Cannot read baseline: {e}")
+
+        tag = f"bench{options['seed']}"
+        if Member.objects.filter(email__startswith=f"{tag}-").exists():
+            raise CommandError(f"Data tagged {tag} already exists; pick another --seed")
+        try:
+            workload = self.seed(options)
+            report = self.run(workload, mix, options)
+        finally:
+            benchmarks.delete_catalog(options["seed"])
+
+        report["config"] = {
+            key: options[key] for key in ("books", "members", "loans", "reviews", "requests", "mix", "seed")
+        }
+        report["config"]["vendor"] = connection.vendor
+        self.print_report(report, baseline)
+        if options["save_baseline"]:
+            with open(options["save_baseline"], "w") as f:
+                json.dump(report, f, indent=2)
+            self.stdout.write(f"Saved baseline to {options['save_baseline']}")
+        if baseline:
+            regressions = self.compare(report, baseline, options["threshold"])
+            if regressions and options["fail_on_regression"]:
+                raise CommandError(f"{len(regressions)} regression(s): {', '.join(regressions)}")
+
+    def seed(self, options):
+        if options["members"] < 2:
+            raise CommandError("--members must be at least 2")
+        tag = f"bench{options['seed']}"
+        rng, vocabulary = benchmarks.seed_catalog(options["books"], members=options["members"], seed=options["seed"])
+        books = list(
+            Book.objects.filter(library__name__startswith=f"{tag} ").order_by("pk").values_list("pk", flat=True)
+        )
+        members = list(Member.objects.filter(email__startswith=f"{tag}-").order_by("pk").values_list("pk", flat=True))
+        today = timezone.localdate()
+        loans, reviews, open_loans = [], [], set()
+        for i in range(options["loans"]):
+            borrow_date = today - timedelta(days=rng.randint(0, 365))
+            book_id, member_id = rng.choice(books), rng.choice(members)
+            # At most one open loan per (book, member): uq_borrowing_active_loan.
+            active = i % 10 == 0 and (book_id, member_id) not in open_loans
+            if active:
+                open_loans.add((book_id, member_id))
+            loans.append(Borrowing(
+                book_id=book_id, member_id=member_id,
+                borrow_date=borrow_date, due_date=borrow_date + timedelta(days=14),
+                return_date=None if active else borrow_date + timedelta(days=rng.randint(1, 30)),
+            ))
+        for _ in range(options["reviews"]):
+            reviews.append(Review(
+                book_id=rng.choice(books), member_id=rng.choice(members), rating=rng.randint(1, 5),
+                review_date=timezone.now() - timedelta(minutes=rng.randint(0, 10 ** 6)),
+            ))
+        Borrowing.objects.bulk_create(loans, batch_size=1000)
+        Review.objects.bulk_create(reviews, batch_size=1000)
+        # Derived data the endpoints read; bulk inserts fire no signals.
+        search.rebuild_index()
+        stats.reconcile(fix=True)
+        ratings.rebuild()
+        return Workload(rng, vocabulary, books, members)
+
+    def run(self, workload, mix, options):
+        rng = workload.rng
+        client = Client()
+        names, weights = list(mix), list(mix.values())
+        samples = {name: {"latency": [], "queries": [], "errors": 0} for name in names}
+
+        def send(name):
+            method, path, payload = workload.request(name)
+            with CaptureQueriesContext(connection) as queries:
+                if method == "post":
+                    response, elapsed = benchmarks.timed(client.post, path, payload, content_type="application/json")
+                else:
+                    response, elapsed = benchmarks.timed(client.get, path, payload)
+            workload.observe(response)
+            return response, elapsed, len(queries)
+
+        # 4xx answers ("Book not available", ...) are part of the mix: count them, don't log them.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            for _ in range(options["warmup"]):
+                send(rng.choices(names, weights)[0])
+            started = time.perf_counter()
+            for _ in range(options["requests"]):
+                name = rng.choices(names, weights)[0]
+                response, elapsed, queries = send(name)
+                sample = samples[name]
+                sample["latency"].append(elapsed)
+                sample["queries"].append(queries)
+                if response.status_code >= 500:
+                    raise CommandError(f"{name}: HTTP {response.status_code}")
+                if response.status_code >= 400:
+                    sample["errors"] += 1
+            wall = time.perf_counter() - started
+        finally:
+            request_logger.setLevel(level)
+
+        endpoints = {}
+        for name, sample in samples.items():
+            if not sample["latency"]:
+                continue
+            summary = benchmarks.summarize(sample["latency"])
+            summary["queries"] = sum(sample["queries"]) / len(sample["queries"])
+            summary["errors"] = sample["errors"]
+            # This endpoint's share of the run's throughput, not 1 / mean latency.
+            summary["rps"] = len(sample["latency"]) / wall
+            endpoints[name] = summary
+        everything = [ms for sample in samples.values() for ms in sample["latency"]]
+        overall = benchmarks.summarize(everything)
+        overall["queries"] = sum(sum(s["queries"]) for s in samples.values()) / len(everything)
+        overall["errors"] = sum(s["errors"] for s in samples.values())
+        overall["rps"] = len(everything) / wall
+        return {"endpoints": endpoints, "overall": overall}
+
+    def print_report(self, report, baseline):
+        self.stdout.write(
+            f"{'endpoint':<12} {'n':>6} {'err':>5} {'req/s':>8} {'p50 ms':>8} {'p95 ms':>8} "
+            f"{'p99 ms':>8} {'queries':>8}"
+        )
+        rows = list(report["endpoints"].items()) + [("overall", report["overall"])]
+        for name, s in rows:
+            self.stdout.write(
+                f"{name:<12} {s['n']:>6} {s['errors']:>5} {s['rps']:>8.1f} {s['p50_ms']:>8.2f} "
+                f"{s['p95_ms']:>8.2f} {s['p99_ms']:>8.2f} {s['queries']:>8.1f}"
+            )
+
+    def compare(self, report, baseline, threshold):
+        """Print deltas against ``baseline`` and return the names of regressed endpoints."""
+        self.stdout.write(f"\nAgainst baseline ({baseline.get('config', {}).get('vendor', '?')}):")
+        regressions = []
+        current = dict(report["endpoints"], overall=report["overall"])
+        previous = dict(baseline.get("endpoints", {}), overall=baseline.get("overall"))
+        for name, s in current.items():
+            before = previous.get(name)
+            if not before:
+                self.stdout.write(f"{name:<12} (not in baseline)")
+                continue
+            p50 = (s["p50_ms"] / before["p50_ms"] - 1) * 100 if before["p50_ms"] else 0.0
+            p95 = (s["p95_ms"] / before["p95_ms"] - 1) * 100 if before["p95_ms"] else 0.0
+            queries = s["queries"] - before["queries"]
+            regressed = p95 > threshold or queries > 0.05
+            if regressed:
+                regressions.append(name)
+            line = f"{name:<12} p50 {p50:+7.1f}%  p95 {p95:+7.1f}%  queries {queries:+6.2f}"
+            self.stdout.write(self.style.ERROR(line + "  REGRESSION") if regressed else line)
+        return regressions
@@ -0,0 +1,167 @@
+import asyncio
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.test import AsyncClient, Client
+
+from library import benchmarks, search, stats
+from library.models import Book, Borrowing, LibraryStatistics
+
+DEFAULT_MIX = "search=4,availability=4,batch=1,history=2,stats=1"
+
+
+class Workload:
+    """Read-only requests against the existing data, as sync (``/api/...``) paths."""
+
+    NAMES = ("search", "availability", "batch", "history", "stats")
+
+    def __init__(self, rng, sample=1000):
+        self.rng = rng
+        self.book_ids = list(Book.objects.order_by("?").values_list("pk", flat=True)[:sample])
+        self.member_ids = list(
+            Borrowing.objects.order_by().values_list("member_id", flat=True).distinct()[:sample]
+        )
+        titles = Book.objects.filter(pk__in=self.book_ids).values_list("title", flat=True)
+        self.words = sorted({word for title in titles for word in search.tokenize(title) if len(word) > 2})
+        self.library_ids = sorted({
+            int(stats.scope_of(key).split(":")[1])
+            for key in LibraryStatistics.objects.filter(pk__startswith="library:").values_list("pk", flat=True)
+        })
+
+    def path(self, name):
+        rng = self.rng
+        if name == "search":
+            return f"/api/books/search/?q={'+'.join(rng.sample(self.words, min(len(self.words), rng.randint(1, 2))))}"
+        if name == "availability":
+            return f"/api/books/{rng.choice(self.book_ids)}/availability/"
+        if name == "batch":
+            return f"/api/books/availability/?ids={','.join(map(str, rng.sample(self.book_ids, min(len(self.book_ids), 20))))}"
+        if name == "history":
+            return f"/api/members/{rng.choice(self.member_ids)}/borrowings/"
+        if self.library_ids and rng.random() < 0.5:
+            return f"/api/stats/?library={rng.choice(self.library_ids)}"
+        return "/api/stats/"
+
+
+def parse_mix(value):
+    mix = {}
+    for part in value.split(","):
+        name, _, weight = part.partition("=")
+        name = name.strip()
+        if name not in Workload.NAMES:
+            raise CommandError(f"Unknown workload {name!r}")
+        try:
+            mix[name] = float(weight or 1)
+        except ValueError:
+            raise CommandError(f"Bad weight for {name!r}")
+    return mix
+
+
+def run_wsgi(paths, concurrency):
+    """``concurrency`` threads, one request in flight each, like a threaded WSGI worker."""
+    latencies, statuses = [], []
+    queue = iter(paths)
+    lock = threading.Lock()
+
+    def worker():
+        client = Client()
+        try:
+            while True:
+                with lock:
+                    path = next(queue, None)
+                if path is None:
+                    return
+                response, elapsed = benchmarks.timed(client.get, path)
+                with lock:
+                    latencies.append(elapsed)
+                    statuses.append(response.status_code)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker) for _ in range(concurrency)]:
+            future.result()
+    return latencies, statuses, time.perf_counter() - started
+
+
+def run_asgi(paths, concurrency):
+    """``concurrency`` tasks on one event loop, like a single ASGI worker."""
+    latencies, statuses = [], []
+
+    async def main():
+        client = AsyncClient()
+        queue = iter(path.replace("/api/", "/api/async/", 1) for path in paths)
+
+        async def worker():
+            for path in queue:
+                started = time.perf_counter()
+                response = await client.get(path)
+                latencies.append((time.perf_counter() - started) * 1000)
+                statuses.append(response.status_code)
+
+        await asyncio.gather(*[worker() for _ in range(concurrency)])
+
+    started = time.perf_counter()
+    asyncio.run(main())
+    return latencies, statuses, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Compare concurrent-client throughput of the read endpoints under WSGI (sync views, one "
+        "thread per in-flight request) and ASGI (the api/async/ views on one event loop). Both "
+        "stacks are driven in-process through Django's handlers, so no server is needed. Reads "
+        "the existing data: load a catalog first."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts.")
+        parser.add_argument("--requests", type=int, default=1000, help="Requests per run.")
+        parser.add_argument("--warmup", type=int, default=50)
+        parser.add_argument("--mix", default=DEFAULT_MIX, help="Comma-separated name=weight pairs.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        mix = parse_mix(options["mix"])
+        levels = [int(n) for n in options["concurrency"].split(",") if n.strip()]
+        if not levels or min(levels) < 1:
+            raise CommandError("--concurrency must list positive integers")
+        rng = random.Random(options["seed"])
+        workload = Workload(rng)
+        if not workload.book_ids or not workload.words:
+            raise CommandError("No books to query; import a catalog first")
+        if not workload.member_ids:
+            mix.pop("history", None)
+        names, weights = list(mix), list(mix.values())
+        paths = [workload.path(rng.choices(names, weights)[0]) for _ in range(options["requests"])]
+        warmup = paths[:options["warmup"]]
+
+        # 404s for deleted ids are part of the mix: count them, don't log them.
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.ERROR)
+        try:
+            self.stdout.write(
+                f"{'clients':>7} {'stack':<5} {'req/s':>9} {'p50 ms':>8} {'p95 ms':>8} {'p99 ms':>8} {'4xx':>5}"
+            )
+            for concurrency in levels:
+                for stack, run in (("wsgi", run_wsgi), ("asgi", run_asgi)):
+                    run(warmup, concurrency)
+                    latencies, statuses, wall = run(paths, concurrency)
+                    errors = [status for status in statuses if status >= 500]
+                    if errors:
+                        raise CommandError(f"{stack}: {len(errors)} responses with HTTP {errors[0]}")
+                    summary = benchmarks.summarize(latencies)
+                    self.stdout.write(
+                        f"{concurrency:>7} {stack:<5} {len(latencies) / wall:>9.1f} {summary['p50_ms']:>8.2f} "
+                        f"{summary['p95_ms']:>8.2f} {summary['p99_ms']:>8.2f} "
+                        f"{sum(status >= 400 for status in statuses):>5}"
+                    )
+        finally:
+            request_logger.setLevel(level)
@@ -0,0 +1,129 @@
+import logging
+import random
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+from django.core.management.base import BaseCommand, CommandError
+from django.db import connection
+from django.db.models import F
+from django.test import Client, override_settings
+
+from library import benchmarks
+from library.models import Book, Borrowing, Member
+
+STRATEGIES = ("locking", "optimistic")
+
+
+def run(book_ids, member_ids, concurrency, operations, seed):
+    """
+    ``concurrency`` threads, each with its own client and connection, borrowing
+    a random hot book and returning it straight away. Each thread borrows for
+    its own members, so a 400 on borrow means no copy was free.
+    """
+    counts = {"borrowed": 0, "unavailable": 0, "errors": 0}
+    latencies = []
+    lock = threading.Lock()
+    remaining = iter(range(operations))
+
+    def worker(index):
+        rng = random.Random(seed + index)
+        members = member_ids[index::concurrency]
+        client = Client(raise_request_exception=False)
+        try:
+            while True:
+                with lock:
+                    if next(remaining, None) is None:
+                        return
+                body = {"book_id": rng.choice(book_ids), "member_id": rng.choice(members)}
+                response, elapsed = benchmarks.timed(
+                    client.post, "/api/borrow/", body, content_type="application/json"
+                )
+                outcome = "errors" if response.status_code >= 500 else "unavailable"
+                if response.status_code == 201:
+                    borrowing_id = response.json()["borrowing"]["borrowing_id"]
+                    returned, returned_ms = benchmarks.timed(
+                        client.post, "/api/return/", {"borrowing_id": borrowing_id}, content_type="application/json"
+                    )
+                    elapsed += returned_ms
+                    outcome = "borrowed" if returned.status_code == 200 else "errors"
+                with lock:
+                    counts[outcome] += 1
+                    latencies.append(elapsed)
+        finally:
+            connection.close()
+
+    started = time.perf_counter()
+    with ThreadPoolExecutor(concurrency) as pool:
+        for future in [pool.submit(worker, index) for index in range(concurrency)]:
+            future.result()
+    return counts, latencies, time.perf_counter() - started
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure borrow+return throughput on a few contended books with the locking "
+        "(SELECT ... FOR UPDATE) and the optimistic (conditional UPDATE) strategies. Seeds "
+        "committed data, since the client threads use their own connections, and deletes it "
+        "afterwards. SQLite serializes writers, so run it against MySQL to see the difference."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--books", type=int, default=5, help="Contended books.")
+        parser.add_argument("--copies", type=int, default=3, help="Copies of each book.")
+        parser.add_argument("--members", type=int, default=200)
+        parser.add_argument("--concurrency", default="1,8,32", help="Comma-separated client counts.")
+        parser.add_argument("--operations", type=int, default=500, help="Borrow attempts per run.")
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        levels = [int(n) for n in options["concurrency"].split(",") if n.strip()]
+        if not levels or min(levels) < 1:
+            raise CommandError("--concurrency must list positive integers")
+        if options["books"] < 1 or options["copies"] < 1 or options["members"] < max(levels):
+            raise CommandError("--books and --copies must be positive and --members at least the concurrency")
+        tag = f"bench{options['seed']}"
+        if Member.objects.filter(email__startswith=f"{tag}-").exists():
+            raise CommandError(f"Data tagged {tag} already exists; pick another --seed")
+
+        # Contention, not the catalog, is what is measured: keep the rest small.
+        benchmarks.seed_catalog(options["books"], members=options["members"], seed=options["seed"])
+        books = Book.objects.filter(library__name__startswith=f"{tag} ")
+        books.update(total_copies=options["copies"], available_copies=options["copies"])
+        book_ids = list(books.values_list("pk", flat=True))
+        # BorrowRequestSerializer rejects a member id equal to the book id.
+        member_ids = list(
+            Member.objects.filter(email__startswith=f"{tag}-").exclude(pk__in=book_ids).values_list("pk", flat=True)
+        )
+
+        request_logger = logging.getLogger("django.request")
+        level = request_logger.level
+        request_logger.setLevel(logging.CRITICAL)
+        try:
+            self.stdout.write(
+                f"{'clients':>7} {'strategy':<10} {'ops/s':>9} {'p50 ms':>8} {'p95 ms':>8} "
+                f"{'borrowed':>8} {'no copy':>8} {'errors':>6}"
+            )
+            for concurrency in levels:
+                for strategy in STRATEGIES:
+                    # Start every run with all copies on the shelf, whatever the last one left.
+                    Borrowing.objects.filter(book_id__in=book_ids).delete()
+                    books.update(available_copies=options["copies"])
+                    with override_settings(LIBRARY_BORROW_STRATEGY=strategy):
+                        counts, latencies, wall = run(
+                            book_ids, member_ids, concurrency, options["operations"], options["seed"]
+                        )
+                    summary = benchmarks.summarize(latencies)
+                    self.stdout.write(
+                        f"{concurrency:>7} {strategy:<10} {len(latencies) / wall:>9.1f} "
+                        f"{summary['p50_ms']:>8.2f} {summary['p95_ms']:>8.2f} {counts['borrowed']:>8} "
+                        f"{counts['unavailable']:>8} {counts['errors']:>6}"
+                    )
+                    drifted = books.exclude(available_copies=F("total_copies")).count()
+                    if drifted:
+                        self.stdout.write(self.style.WARNING(
+                            f"{drifted} book(s) do not have every copy back after the run"
+                        ))
+        finally:
+            request_logger.setLevel(level)
+            benchmarks.delete_catalog(options["seed"])
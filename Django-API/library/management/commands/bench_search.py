@@ -0,0 +1,60 @@
+from django.core.management.base import BaseCommand
+from django.db.models import Q
+
+from library import benchmarks, search
+from library.models import Book
+
+
+def legacy_search(query):
+    """The pre-index BookSearchView query (unpaginated), kept for comparison."""
+    return list(
+        Book.objects.select_related("category", "library")
+        .filter(
+            Q(title__icontains=query)
+            | Q(isbn__icontains=query)
+            | Q(bookauthor__author__name__icontains=query)
+            | Q(category__name=query)
+        )
+        .distinct()
+        .order_by("book_id")
+    )
+
+
+def indexed_search(query):
+    """What BookSearchView now runs for the first page: count, ranked page, rows."""
+    ranked = search.search_books(query)
+    ranked.count()
+    page = list(ranked[:20])
+    return Book.objects.select_related("category", "library").in_bulk([r["book_id"] for r in page])
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure search latency against catalog size, legacy icontains query vs the "
+        "inverted index. Seeds synthetic data inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--sizes", default="1000,5000,20000",
+                            help="Comma-separated catalog sizes to seed.")
+        parser.add_argument("--queries", type=int, default=50)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        sizes = [int(s) for s in options["sizes"].split(",") if s.strip()]
+        self.stdout.write(f"{'books':>8} {'engine':>8} {'p50 ms':>9} {'p95 ms':>9} {'p99 ms':>9}")
+        for size in sizes:
+            with benchmarks.scratch_data():
+                rng, vocabulary = benchmarks.seed_catalog(size, seed=options["seed"])
+                search.rebuild_index()
+                queries = [
+                    benchmarks.random_title(rng, rng.randint(1, 2), vocabulary)
+                    for _ in range(options["queries"])
+                ]
+                for name, func in (("legacy", legacy_search), ("index", indexed_search)):
+                    samples = [benchmarks.timed(func, q)[1] for q in queries]
+                    stats = benchmarks.summarize(samples)
+                    self.stdout.write(
+                        f"{size:>8} {name:>8} {stats['p50_ms']:>9.2f} "
+                        f"{stats['p95_ms']:>9.2f} {stats['p99_ms']:>9.2f}"
+                    )
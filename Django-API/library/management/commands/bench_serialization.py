@@ -0,0 +1,92 @@
+import statistics
+from datetime import timedelta
+
+from django.core.management.base import BaseCommand, CommandError
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from library import benchmarks, fastlist
+from library.models import Book, Borrowing, Member
+from library.renderers import FastJSONRenderer, orjson
+from library.serializers import BookSerializer, BorrowingSerializer
+
+TARGETS = {
+    "book": (Book, BookSerializer),
+    "borrowing": (Borrowing, BorrowingSerializer),
+}
+
+
+def model_path(queryset, serializer_class, renderer):
+    """What the list endpoints did before: model instances through the serializer."""
+    return renderer.render(serializer_class(list(queryset), many=True).data)
+
+
+def values_path(queryset, serializer_class, renderer):
+    """``ValuesListMixin``: ``values()`` rows mapped with the serializer's fields."""
+    plan = fastlist.values_plan(serializer_class())
+    rows = list(queryset.values(*dict.fromkeys(column for _, column, _ in plan)))
+    return renderer.render(fastlist.values_data(plan, rows))
+
+
+class Command(BaseCommand):
+    help = (
+        "Measure list serialization throughput (rows/s) for books and borrowings: model "
+        "instances through the serializer and the stdlib JSON renderer, against values() rows "
+        "with the stdlib and the orjson renderer. Checks that all three produce the same bytes. "
+        "Seeds synthetic data inside a transaction that is rolled back."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--rows", type=int, default=5000, help="Rows serialized per run.")
+        parser.add_argument("--repeat", type=int, default=5)
+        parser.add_argument("--seed", type=int, default=42)
+
+    def handle(self, *args, **options):
+        if options["rows"] < 1 or options["repeat"] < 1:
+            raise CommandError("--rows and --repeat must be positive")
+        variants = [
+            ("serializer+json", model_path, JSONRenderer()),
+            ("values+json", values_path, JSONRenderer()),
+            ("values+orjson" if orjson else "values+fast (no orjson)", values_path, FastJSONRenderer()),
+        ]
+        self.stdout.write(f"{'table':<10} {'path':<24} {'rows/s':>10} {'ms/run':>9} {'speedup':>8}")
+        with benchmarks.scratch_data():
+            self.seed(options)
+            for table, (model, serializer_class) in TARGETS.items():
+                queryset = model.objects.order_by("pk")[:options["rows"]]
+                rows = queryset.count()
+                outputs, baseline = set(), None
+                for name, func, renderer in variants:
+                    samples = []
+                    for _ in range(options["repeat"]):
+                        output, elapsed = benchmarks.timed(func, queryset, serializer_class, renderer)
+                        samples.append(elapsed)
+                    outputs.add(output)
+                    ms = statistics.median(samples)
+                    baseline = baseline or ms
+                    self.stdout.write(
+                        f"{table:<10} {name:<24} {rows / ms * 1000:>10.0f} {ms:>9.2f} {baseline / ms:>7.2f}x"
+                    )
+                if len(outputs) != 1:
+                    raise CommandError(f"{table}: serialization paths produced different output")
+
+    def seed(self, options):
+        rows = options["rows"]
+        rng, _ = benchmarks.seed_catalog(rows, members=max(rows // 10, 1), seed=options["seed"])
+        tag = f"bench{options['seed']}"
+        books = list(Book.objects.filter(library__name__startswith=f"{tag} ").values_list("pk", flat=True))
+        members = list(Member.objects.filter(email__startswith=f"{tag}-").values_list("pk", flat=True))
+        today = timezone.localdate()
+        loans, open_loans = [], set()
+        for i in range(rows):
+            borrow_date = today - timedelta(days=rng.randint(0, 365))
+            book_id, member_id = rng.choice(books), rng.choice(members)
+            active = i % 10 == 0 and (book_id, member_id) not in open_loans
+            if active:
+                open_loans.add((book_id, member_id))
+            loans.append(Borrowing(
+                book_id=book_id, member_id=member_id,
+                borrow_date=borrow_date, due_date=borrow_date + timedelta(days=14),
+                return_date=None if active else borrow_date + timedelta(days=rng.randint(1, 30)),
+            ))
+        Borrowing.objects.bulk_create(loans, batch_size=1000)
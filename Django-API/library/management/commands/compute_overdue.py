@@ -0,0 +1,31 @@
+import resource
+import time
+from datetime import date
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import overdue
+
+
+class Command(BaseCommand):
+    help = "Compute overdue loans and accrued late fees per member and library into overdue_summary."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--as-of", help="Date to compute for (YYYY-MM-DD); defaults to today.")
+        parser.add_argument("--chunk-size", type=int, default=2000, help="Loans read per query.")
+        parser.add_argument("--batch-size", type=int, default=500, help="Summary rows per INSERT.")
+
+    def handle(self, *args, **options):
+        try:
+            as_of = date.fromisoformat(options["as_of"]) if options["as_of"] else None
+        except ValueError:
+            raise CommandError("--as-of must be YYYY-MM-DD")
+
+        started = time.perf_counter()
+        totals = overdue.compute_overdue(as_of, options["chunk_size"], options["batch_size"])
+        elapsed = time.perf_counter() - started
+        peak_mb = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+        self.stdout.write(self.style.SUCCESS(
+            f"{totals['as_of']}: {totals['loans']} overdue loans -> {totals['rows']} summary rows, "
+            f"{totals['fees']} in fees ({elapsed:.2f}s, peak RSS {peak_mb:.0f} MB)"
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library import holds
+
+
+class Command(BaseCommand):
+    help = (
+        f"Cancel ready holds not collected within {holds.PICKUP_PERIOD.days} days and pass "
+        "their copies to the next member in the queue."
+    )
+
+    def handle(self, *args, **options):
+        expired = holds.expire_ready_holds()
+        self.stdout.write(self.style.SUCCESS(f"Expired {expired} uncollected holds."))
@@ -0,0 +1,46 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library.importer import CatalogImporter, read_rows
+
+
+class Command(BaseCommand):
+    help = (
+        "Import books, authors, categories, libraries and book-author links from CSV or JSONL files. "
+        "Invalid rows are reported and skipped; existing ISBNs are left unchanged."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("paths", nargs="+", help="CSV or JSONL files")
+        parser.add_argument("--format", choices=["csv", "jsonl"], help="Input format (default: from the file extension)")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rows written per transaction.")
+        parser.add_argument("--dry-run", action="store_true", help="Validate and write, then roll every batch back.")
+        parser.add_argument("--max-errors", type=int, default=20, help="How many skipped rows to list.")
+
+    def handle(self, *args, **options):
+        importer = CatalogImporter(batch_size=options["batch_size"], dry_run=options["dry_run"])
+        started = time.perf_counter()
+        for path in options["paths"]:
+            try:
+                for line, row in read_rows(path, options["format"]):
+                    importer.add(f"{path}:{line}", row)
+            except OSError as e:
+                raise CommandError(f"Cannot read {path}: {e}")
+        counts = importer.finish()
+        elapsed = time.perf_counter() - started
+
+        for line, reason in importer.errors[:options["max_errors"]]:
+            self.stderr.write(f"skipped {line}: {reason}")
+        if len(importer.errors) > options["max_errors"]:
+            self.stderr.write(f"... and {len(importer.errors) - options['max_errors']} more skipped rows")
+
+        rate = counts["rows"] / elapsed if elapsed else 0.0
+        prefix = "[dry run] " if options["dry_run"] else ""
+        self.stdout.write(self.style.SUCCESS(
+            f"{prefix}Read {counts['rows']} rows in {elapsed:.2f}s ({rate:.0f} rows/s): "
+            f"{counts['books_created']} books created, {counts['books_existing']} already present, "
+            f"{counts['author_links_created']} author links, {counts['author_created']} new authors, "
+            f"{counts['category_created']} new categories, {counts['library_created']} new libraries, "
+            f"{counts['skipped']} skipped."
+        ))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library import idempotency
+
+
+class Command(BaseCommand):
+    help = "Delete stored Idempotency-Key responses older than LIBRARY_IDEMPOTENCY_TTL."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        deleted = idempotency.purge_expired(options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Purged {deleted} expired idempotency keys."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library import ratings
+
+
+class Command(BaseCommand):
+    help = "Recompute every book's rating count, sum and average from the review table."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=1000)
+
+    def handle(self, *args, **options):
+        books, rated = ratings.rebuild(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Recomputed ratings for {books} books ({rated} with ratings)."))
@@ -0,0 +1,14 @@
+from django.core.management.base import BaseCommand
+
+from library import search
+
+
+class Command(BaseCommand):
+    help = "Rebuild the book search index from the Book, Author, BookAuthor and Category tables."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--batch-size", type=int, default=500)
+
+    def handle(self, *args, **options):
+        books, terms = search.rebuild_index(batch_size=options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(f"Indexed {books} books ({terms} terms)."))
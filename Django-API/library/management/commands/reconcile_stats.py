@@ -0,0 +1,21 @@
+from django.core.management.base import BaseCommand
+
+from library import stats
+
+
+class Command(BaseCommand):
+    help = "Recompute the statistics counters from the base tables and report any drift."
+
+    def add_arguments(self, parser):
+        parser.add_argument("--dry-run", action="store_true",
+                            help="Only report drift; leave the stored counters untouched.")
+
+    def handle(self, *args, **options):
+        drift = stats.reconcile(fix=not options["dry_run"])
+        if not drift:
+            self.stdout.write(self.style.SUCCESS("Counters are consistent."))
+            return
+        for scope, counter, stored, actual in drift:
+            self.stdout.write(f"{scope:<20} {counter:<20} stored={stored:<10} actual={actual:<10} drift={stored - actual:+d}")
+        action = "Reported" if options["dry_run"] else "Repaired"
+        self.stdout.write(self.style.WARNING(f"{action} {len(drift)} drifted counters."))
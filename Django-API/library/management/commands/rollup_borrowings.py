@@ -0,0 +1,28 @@
+import time
+
+from django.core.management.base import BaseCommand, CommandError
+
+from library import rollups
+
+
+class Command(BaseCommand):
+    help = (
+        "Bring borrowing_daily_rollup up to date: rebuild the days from --lookback days before "
+        "the watermark through today, then move the watermark to today."
+    )
+
+    def add_arguments(self, parser):
+        parser.add_argument("--lookback", type=int, default=2,
+                            help="Days before the watermark to recompute, for late-recorded loans.")
+        parser.add_argument("--rebuild", action="store_true", help="Recompute every day from the first loan.")
+        parser.add_argument("--batch-size", type=int, default=1000, help="Rollup rows per INSERT.")
+
+    def handle(self, *args, **options):
+        if options["lookback"] < 0:
+            raise CommandError("--lookback must not be negative")
+        started = time.perf_counter()
+        result = rollups.catch_up(options["lookback"], options["rebuild"], options["batch_size"])
+        self.stdout.write(self.style.SUCCESS(
+            f"Rolled up {result['start']}..{result['end']} into {result['rows']} rows "
+            f"({time.perf_counter() - started:.2f}s)."
+        ))
@@ -0,0 +1,222 @@
+"""
+Request and SQL instrumentation, exported in the Prometheus text format.
+
+``MetricsMiddleware`` times every request and installs a
+``connection.execute_wrapper`` on each database alias for its duration,
+counting queries and SQL time per resolved route. When one SQL shape (the
+statement with ``IN (...)`` lists collapsed) runs ``LIBRARY_N_PLUS_ONE_THRESHOLD``
+times or more in a single request, the request is counted as a likely N+1 and
+the first occurrence per route and shape is logged.
+
+Per query the wrapper only reads the clock and bumps a counter; shapes are
+normalized once per request and the shared registry is locked once per
+request. Metrics are per process, like ``availability.counters()``: scrape
+every worker. Queries run while a streaming response is being consumed
+happen after the middleware returns and are not counted. Under ASGI views run
+on worker threads whose connections the middleware cannot wrap, so requests
+are timed but their queries are not counted.
+"""
+import logging
+import re
+import threading
+import time
+from collections import Counter, defaultdict
+from contextlib import ExitStack
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import connections
+from django.http import HttpResponse
+
+logger = logging.getLogger(__name__)
+
+BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+_IN_LIST = re.compile(r"\(\s*%s(?:\s*,\s*%s)+\s*\)")
+_VALUES_LIST = re.compile(r"(\((?:%s, )*%s\))(?:, \((?:%s, )*%s\))+")
+
+
+def sql_shape(sql):
+    """The statement with variable-length placeholder lists collapsed."""
+    return _IN_LIST.sub("(%s, ...)", _VALUES_LIST.sub(r"\1, ...", sql))
+
+
+class QueryRecorder:
+    """``execute_wrapper`` callable counting one alias's queries for one request."""
+
+    __slots__ = ("alias", "count", "seconds", "statements")
+
+    def __init__(self, alias):
+        self.alias = alias
+        self.count = 0
+        self.seconds = 0.0
+        self.statements = Counter()
+
+    def __call__(self, execute, sql, params, many, context):
+        started = time.perf_counter()
+        try:
+            return execute(sql, params, many, context)
+        finally:
+            self.seconds += time.perf_counter() - started
+            self.count += 1
+            self.statements[sql] += 1
+
+    def repeated_shapes(self, threshold):
+        shapes = Counter()
+        for sql, n in self.statements.items():
+            shapes[sql_shape(sql)] += n
+        return {shape: n for shape, n in shapes.items() if n >= threshold}
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace('"', '\\"').replace("\n", "\\n")
+
+
+def _labels(**labels):
+    return "{" + ",".join(f'{name}="{_escape(value)}"' for name, value in labels.items()) + "}"
+
+
+class Registry:
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.reset()
+
+    def reset(self):
+        self.requests = defaultdict(int)                          # (route, method, status)
+        self.latency = defaultdict(lambda: [0] * (len(BUCKETS) + 2))  # (route, method) -> buckets, +Inf, sum
+        self.sql = defaultdict(lambda: [0, 0.0])                  # (route, method, alias) -> queries, seconds
+        self.n_plus_one = defaultdict(int)                        # route
+        self._reported = set()
+
+    def observe(self, route, method, status, seconds, recorders, threshold):
+        repeated, new = {}, []
+        for recorder in recorders:
+            if recorder.count >= threshold:
+                repeated.update(recorder.repeated_shapes(threshold))
+        with self._lock:
+            self.requests[route, method, status] += 1
+            latency = self.latency[route, method]
+            for i, bound in enumerate(BUCKETS):
+                if seconds <= bound:
+                    latency[i] += 1
+                    break
+            else:
+                latency[len(BUCKETS)] += 1
+            latency[-1] += seconds
+            for recorder in recorders:
+                if recorder.count:
+                    sql = self.sql[route, method, recorder.alias]
+                    sql[0] += recorder.count
+                    sql[1] += recorder.seconds
+            if repeated:
+                self.n_plus_one[route] += 1
+                new = [(shape, n) for shape, n in repeated.items() if (route, shape) not in self._reported]
+                self._reported.update((route, shape) for shape, _ in new)
+        for shape, n in new:
+            logger.warning("Possible N+1 on %s: %d x %s", route, n, shape[:300])
+
+    def render(self):
+        with self._lock:
+            requests = dict(self.requests)
+            latency = {key: list(values) for key, values in self.latency.items()}
+            sql = {key: list(values) for key, values in self.sql.items()}
+            n_plus_one = dict(self.n_plus_one)
+
+        lines = [
+            "# HELP library_http_requests_total Requests by route, method and status.",
+            "# TYPE library_http_requests_total counter",
+        ]
+        for (route, method, status), n in sorted(requests.items()):
+            lines.append(f"library_http_requests_total{_labels(route=route, method=method, status=status)} {n}")
+
+        lines += [
+            "# HELP library_http_request_duration_seconds Request latency by route.",
+            "# TYPE library_http_request_duration_seconds histogram",
+        ]
+        for (route, method), values in sorted(latency.items()):
+            cumulative = 0
+            for bound, n in zip(BUCKETS + ("+Inf",), values):
+                cumulative += n
+                lines.append(
+                    f"library_http_request_duration_seconds_bucket{_labels(route=route, method=method, le=bound)} "
+                    f"{cumulative}"
+                )
+            labels = _labels(route=route, method=method)
+            lines.append(f"library_http_request_duration_seconds_sum{labels} {values[-1]:.6f}")
+            lines.append(f"library_http_request_duration_seconds_count{labels} {cumulative}")
+
+        lines += [
+            "# HELP library_sql_queries_total SQL statements executed, by route and database alias.",
+            "# TYPE library_sql_queries_total counter",
+        ]
+        for (route, method, alias), (count, _) in sorted(sql.items()):
+            lines.append(f"library_sql_queries_total{_labels(route=route, method=method, alias=alias)} {count}")
+        lines += [
+            "# HELP library_sql_duration_seconds_total Time spent executing SQL, by route and database alias.",
+            "# TYPE library_sql_duration_seconds_total counter",
+        ]
+        for (route, method, alias), (_, seconds) in sorted(sql.items()):
+            lines.append(
+                f"library_sql_duration_seconds_total{_labels(route=route, method=method, alias=alias)} {seconds:.6f}"
+            )
+
+        lines += [
+            "# HELP library_n_plus_one_requests_total Requests that repeated one SQL shape at least "
+            "LIBRARY_N_PLUS_ONE_THRESHOLD times.",
+            "# TYPE library_n_plus_one_requests_total counter",
+        ]
+        for route, n in sorted(n_plus_one.items()):
+            lines.append(f"library_n_plus_one_requests_total{_labels(route=route)} {n}")
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+
+def route_for(request):
+    match = getattr(request, "resolver_match", None)
+    if match is None:
+        # Keep label cardinality bounded: never use the raw path.
+        return "<unmatched>"
+    return match.route or match.view_name
+
+
+class MetricsMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.threshold = getattr(settings, "LIBRARY_N_PLUS_ONE_THRESHOLD", 10)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        recorders = []
+        started = time.perf_counter()
+        with ExitStack() as stack:
+            for connection in connections.all():
+                recorder = QueryRecorder(connection.alias)
+                recorders.append(recorder)
+                stack.enter_context(connection.execute_wrapper(recorder))
+            response = self.get_response(request)
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe(
+            route_for(request), request.method, response.status_code, elapsed, recorders, self.threshold
+        )
+        return response
+
+    async def __acall__(self, request):
+        # Queries run on worker threads with their own connections: time only.
+        started = time.perf_counter()
+        response = await self.get_response(request)
+        elapsed = time.perf_counter() - started
+        REGISTRY.observe(route_for(request), request.method, response.status_code, elapsed, [], self.threshold)
+        return response
+
+
+def metrics_view(request):
+    return HttpResponse(REGISTRY.render(), content_type=CONTENT_TYPE)
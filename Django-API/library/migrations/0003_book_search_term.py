@@ -0,0 +1,45 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:37
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0002_alter_bookauthor_author_alter_bookauthor_book_and_more'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BookSearchTerm',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('term', models.CharField(max_length=64)),
+                ('field', models.CharField(max_length=8)),
+                ('weight', models.IntegerField(default=1)),
+            ],
+            options={
+                'db_table': 'book_search_term',
+                'managed': True,
+            },
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='authors',
+            field=models.ManyToManyField(related_name='books', through='library.BookAuthor', to='library.author'),
+        ),
+        migrations.AddConstraint(
+            model_name='bookauthor',
+            constraint=models.UniqueConstraint(fields=('book', 'author'), name='uq_book_author'),
+        ),
+        migrations.AddField(
+            model_name='booksearchterm',
+            name='book',
+            field=models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='search_terms', to='library.book'),
+        ),
+        migrations.AddIndex(
+            model_name='booksearchterm',
+            index=models.Index(fields=['term', 'book'], name='ix_search_term_book'),
+        ),
+    ]
@@ -0,0 +1,66 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:41
+
+from django.db import migrations, models
+from django.db.models import Count, F, Q
+
+
+def seed_counters(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Borrowing = apps.get_model('library', 'Borrowing')
+    Member = apps.get_model('library', 'Member')
+    LibraryStatistics = apps.get_model('library', 'LibraryStatistics')
+
+    counters = {}
+
+    def row(library_id):
+        scope = 'all' if library_id is None else f'library:{library_id}'
+        return counters.setdefault(scope, {
+            'total_books': 0, 'total_members': 0, 'total_borrowings': 0,
+            'currently_borrowed': 0, 'late_returns': 0,
+        })
+
+    row(None)['total_members'] = Member.objects.count()
+    for library_id, books in Book.objects.order_by().values_list('library_id').annotate(n=Count('pk')):
+        for target in {id(row(None)): row(None), id(row(library_id)): row(library_id)}.values():
+            target['total_books'] += books
+    for library_id, total, active, late in (
+        Borrowing.objects.order_by().values_list('book__library_id').annotate(
+            total=Count('pk'),
+            active=Count('pk', filter=Q(return_date__isnull=True)),
+            late=Count('pk', filter=Q(return_date__gt=F('due_date'))),
+        )
+    ):
+        for target in {id(row(None)): row(None), id(row(library_id)): row(library_id)}.values():
+            target['total_borrowings'] += total
+            target['currently_borrowed'] += active
+            target['late_returns'] += late
+
+    LibraryStatistics.objects.bulk_create(
+        [LibraryStatistics(scope=scope, **values) for scope, values in counters.items()]
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0003_book_search_term'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='LibraryStatistics',
+            fields=[
+                ('scope', models.CharField(max_length=32, primary_key=True, serialize=False)),
+                ('total_books', models.BigIntegerField(default=0)),
+                ('total_members', models.BigIntegerField(default=0)),
+                ('total_borrowings', models.BigIntegerField(default=0)),
+                ('currently_borrowed', models.BigIntegerField(default=0)),
+                ('late_returns', models.BigIntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'library_statistics',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(seed_counters, migrations.RunPython.noop),
+    ]
@@ -0,0 +1,29 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:48
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0004_library_statistics'),
+    ]
+
+    operations = [
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['member', 'borrow_date'], name='ix_borrowing_member_date'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['book', 'member', 'return_date'], name='ix_borrowing_active_loan'),
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['return_date', 'due_date'], name='ix_borrowing_return_due'),
+        ),
+        migrations.AddIndex(
+            model_name='review',
+            index=models.Index(fields=['review_date', 'review_id'], name='ix_review_date'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:49
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0005_borrowing_review_indexes'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='OverdueSummary',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('as_of', models.DateField()),
+                ('overdue_loans', models.IntegerField(default=0)),
+                ('late_days', models.IntegerField(default=0)),
+                ('max_late_days', models.IntegerField(default=0)),
+                ('accrued_fee', models.DecimalField(decimal_places=2, default=0, max_digits=10)),
+                ('library', models.ForeignKey(blank=True, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='library.library')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.DO_NOTHING, to='library.member')),
+            ],
+            options={
+                'db_table': 'overdue_summary',
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('as_of', 'member', 'library'), name='uq_overdue_summary')],
+            },
+        ),
+    ]
@@ -0,0 +1,57 @@
+# Generated by Django 5.2.5 on 2026-10-18 18:56
+
+from django.db import migrations, models
+from django.db.models import Count, DecimalField, F, FloatField, IntegerField, OuterRef, Subquery, Sum
+from django.db.models.functions import Cast, Coalesce
+
+
+def seed_ratings(apps, schema_editor):
+    Book = apps.get_model('library', 'Book')
+    Review = apps.get_model('library', 'Review')
+    reviews = Review.objects.filter(book_id=OuterRef('pk'), rating__isnull=False).order_by().values('book_id')
+    Book.objects.update(
+        rating_count=Coalesce(Subquery(reviews.annotate(n=Count('pk')).values('n'), output_field=IntegerField()), 0),
+        rating_sum=Coalesce(Subquery(reviews.annotate(n=Sum('rating')).values('n'), output_field=IntegerField()), 0),
+    )
+    Book.objects.filter(rating_count__gt=0).update(
+        rating_avg=Cast(Cast(F('rating_sum'), FloatField()) / F('rating_count'),
+                        DecimalField(max_digits=3, decimal_places=2))
+    )
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0006_overdue_summary'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='book',
+            name='rating_avg',
+            field=models.DecimalField(blank=True, decimal_places=2, max_digits=3, null=True),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_count',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddField(
+            model_name='book',
+            name='rating_sum',
+            field=models.IntegerField(default=0),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['rating_avg', 'rating_count'], name='ix_book_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['category', 'rating_avg', 'rating_count'], name='ix_book_category_rating'),
+        ),
+        migrations.AddIndex(
+            model_name='book',
+            index=models.Index(fields=['library', 'rating_avg', 'rating_count'], name='ix_book_library_rating'),
+        ),
+        migrations.RunPython(seed_ratings, migrations.RunPython.noop),
+    ]
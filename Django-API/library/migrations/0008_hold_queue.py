@@ -0,0 +1,31 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:01
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0007_book_rating_aggregates'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='Hold',
+            fields=[
+                ('hold_id', models.AutoField(primary_key=True, serialize=False)),
+                ('position', models.BigIntegerField()),
+                ('status', models.CharField(choices=[('waiting', 'Waiting'), ('ready', 'Ready for pickup')], default='waiting', max_length=7)),
+                ('created_at', models.DateTimeField(auto_now_add=True)),
+                ('ready_at', models.DateTimeField(blank=True, null=True)),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='library.book')),
+                ('member', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='holds', to='library.member')),
+            ],
+            options={
+                'db_table': 'hold',
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('book', 'position'), name='uq_hold_book_position'), models.UniqueConstraint(fields=('book', 'member'), name='uq_hold_book_member')],
+            },
+        ),
+    ]
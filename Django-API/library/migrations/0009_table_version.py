@@ -0,0 +1,36 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:03
+
+from django.db import migrations, models
+from django.utils import timezone
+
+
+def seed_versions(apps, schema_editor):
+    TableVersion = apps.get_model('library', 'TableVersion')
+    now = timezone.now()
+    TableVersion.objects.bulk_create([
+        TableVersion(table=table, version=1, updated_at=now)
+        for table in ('author', 'book', 'book_author', 'borrowing', 'category', 'library', 'member', 'review')
+    ])
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0008_hold_queue'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='TableVersion',
+            fields=[
+                ('table', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('version', models.BigIntegerField(default=0)),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'table_version',
+                'managed': True,
+            },
+        ),
+        migrations.RunPython(seed_versions, migrations.RunPython.noop),
+    ]
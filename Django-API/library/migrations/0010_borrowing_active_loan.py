@@ -0,0 +1,49 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:15
+
+from django.db import migrations, models
+from django.db.models import Count, F, Max
+from django.utils import timezone
+
+
+def close_duplicate_open_loans(apps, schema_editor):
+    """
+    uq_borrowing_active_loan allows one open loan per book and member, and
+    /borrowings/ used to accept more. Keep the newest open loan of each pair,
+    return the others today and put their copies back. The statistics
+    counters are not touched: run ``manage.py reconcile_stats`` afterwards.
+    """
+    Book = apps.get_model('library', 'Book')
+    Borrowing = apps.get_model('library', 'Borrowing')
+    today = timezone.localdate()
+    duplicates = (
+        Borrowing.objects.filter(return_date__isnull=True, book__isnull=False, member__isnull=False)
+        .values('book_id', 'member_id')
+        .annotate(n=Count('pk'), newest=Max('pk'))
+        .filter(n__gt=1)
+        .order_by()
+    )
+    for pair in duplicates:
+        closed = Borrowing.objects.filter(
+            book_id=pair['book_id'], member_id=pair['member_id'], return_date__isnull=True,
+        ).exclude(pk=pair['newest']).update(return_date=today)
+        Book.objects.filter(pk=pair['book_id']).update(available_copies=F('available_copies') + closed)
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0009_table_version'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='borrowing',
+            name='active_loan',
+            field=models.GeneratedField(db_persist=False, expression=models.Case(models.When(return_date__isnull=True, then=models.Value(1)), default=None), output_field=models.SmallIntegerField(null=True)),
+        ),
+        migrations.RunPython(close_duplicate_open_loans, migrations.RunPython.noop),
+        migrations.AddConstraint(
+            model_name='borrowing',
+            constraint=models.UniqueConstraint(fields=('book', 'member', 'active_loan'), name='uq_borrowing_active_loan'),
+        ),
+    ]
@@ -0,0 +1,32 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:20
+
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0010_borrowing_active_loan'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='IdempotencyRecord',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('key', models.CharField(max_length=255)),
+                ('path', models.CharField(max_length=255)),
+                ('request_hash', models.CharField(max_length=64)),
+                ('status_code', models.SmallIntegerField(blank=True, null=True)),
+                ('response_body', models.TextField(blank=True, null=True)),
+                ('created_at', models.DateTimeField()),
+                ('expires_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'idempotency_record',
+                'managed': True,
+                'indexes': [models.Index(fields=['expires_at'], name='ix_idempotency_expires')],
+                'constraints': [models.UniqueConstraint(fields=('key', 'path'), name='uq_idempotency_key_path')],
+            },
+        ),
+    ]
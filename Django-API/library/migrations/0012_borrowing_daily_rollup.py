@@ -0,0 +1,58 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:21
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0011_idempotency_record'),
+    ]
+
+    operations = [
+        migrations.CreateModel(
+            name='BorrowingDailyRollup',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('borrowed', models.IntegerField(default=0)),
+                ('returned', models.IntegerField(default=0)),
+                ('late_returns', models.IntegerField(default=0)),
+            ],
+            options={
+                'db_table': 'borrowing_daily_rollup',
+                'managed': True,
+            },
+        ),
+        migrations.CreateModel(
+            name='RollupWatermark',
+            fields=[
+                ('name', models.CharField(max_length=64, primary_key=True, serialize=False)),
+                ('day', models.DateField()),
+                ('updated_at', models.DateTimeField()),
+            ],
+            options={
+                'db_table': 'rollup_watermark',
+                'managed': True,
+            },
+        ),
+        migrations.AddIndex(
+            model_name='borrowing',
+            index=models.Index(fields=['borrow_date'], name='ix_borrowing_borrow_date'),
+        ),
+        migrations.AddField(
+            model_name='borrowingdailyrollup',
+            name='category',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='library.category'),
+        ),
+        migrations.AddField(
+            model_name='borrowingdailyrollup',
+            name='library',
+            field=models.ForeignKey(blank=True, db_constraint=False, null=True, on_delete=django.db.models.deletion.DO_NOTHING, to='library.library'),
+        ),
+        migrations.AddConstraint(
+            model_name='borrowingdailyrollup',
+            constraint=models.UniqueConstraint(fields=('day', 'library', 'category'), name='uq_borrowing_rollup'),
+        ),
+    ]
@@ -0,0 +1,40 @@
+# Generated by Django 5.2.5 on 2026-10-18 19:23
+
+import django.db.models.deletion
+from django.db import migrations, models
+
+
+class Migration(migrations.Migration):
+
+    dependencies = [
+        ('library', '0012_borrowing_daily_rollup'),
+    ]
+
+    operations = [
+        migrations.AddField(
+            model_name='rollupwatermark',
+            name='last_id',
+            field=models.BigIntegerField(default=0),
+        ),
+        migrations.AlterField(
+            model_name='rollupwatermark',
+            name='day',
+            field=models.DateField(blank=True, null=True),
+        ),
+        migrations.CreateModel(
+            name='BookRecommendation',
+            fields=[
+                ('id', models.BigAutoField(primary_key=True, serialize=False)),
+                ('rank', models.SmallIntegerField()),
+                ('co_borrowers', models.IntegerField()),
+                ('score', models.FloatField()),
+                ('book', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='recommendations', to='library.book')),
+                ('recommended', models.ForeignKey(on_delete=django.db.models.deletion.CASCADE, related_name='+', to='library.book')),
+            ],
+            options={
+                'db_table': 'book_recommendation',
+                'managed': True,
+                'constraints': [models.UniqueConstraint(fields=('book', 'rank'), name='uq_book_recommendation_rank')],
+            },
+        ),
+    ]
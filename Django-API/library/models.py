@@ -24,10 +24,19 @@ class Book(models.Model):
     category = models.ForeignKey('Category', models.DO_NOTHING, blank=True, null=True)
     library = models.ForeignKey('Library', models.DO_NOTHING, blank=True, null=True)
     authors = models.ManyToManyField('Author', through='BookAuthor', related_name='books')
+    # Maintained by library.ratings from Review writes.
+    rating_count = models.IntegerField(default=0)
+    rating_sum = models.IntegerField(default=0)
+    rating_avg = models.DecimalField(max_digits=3, decimal_places=2, blank=True, null=True)
 
     class Meta:
         managed = True
         db_table = 'book'
+        indexes = [
+            models.Index(fields=['rating_avg', 'rating_count'], name='ix_book_rating'),
+            models.Index(fields=['category', 'rating_avg', 'rating_count'], name='ix_book_category_rating'),
+            models.Index(fields=['library', 'rating_avg', 'rating_count'], name='ix_book_library_rating'),
+        ]
 
     def __str__(self):
         return self.title
@@ -56,10 +65,31 @@ class Borrowing(models.Model):
     borrow_date = models.DateField(blank=True, null=True)
     due_date = models.DateField(blank=True, null=True)
     return_date = models.DateField(blank=True, null=True)
+    # 1 while the loan is open, NULL once returned. NULLs never collide in a
+    # unique index, so uq_borrowing_active_loan allows one open loan per book
+    # and member and any number of returned ones (MySQL has no partial indexes).
+    active_loan = models.GeneratedField(
+        expression=models.Case(models.When(return_date__isnull=True, then=models.Value(1)), default=None),
+        output_field=models.SmallIntegerField(null=True),
+        db_persist=False,
+    )
 
     class Meta:
         managed = True
         db_table = 'borrowing'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'member', 'active_loan'], name='uq_borrowing_active_loan'),
+        ]
+        indexes = [
+            # Member history, newest first.
+            models.Index(fields=['member', 'borrow_date'], name='ix_borrowing_member_date'),
+            # "Does this member already have this book?" check on borrow.
+            models.Index(fields=['book', 'member', 'return_date'], name='ix_borrowing_active_loan'),
+            # Active loans (return_date IS NULL), overdue and late-return scans.
+            models.Index(fields=['return_date', 'due_date'], name='ix_borrowing_return_due'),
+            # Day-range scans of library.rollups.
+            models.Index(fields=['borrow_date'], name='ix_borrowing_borrow_date'),
+        ]
 
     def __str__(self):
         return self.book
@@ -118,7 +148,204 @@ class Review(models.Model):
     class Meta:
         managed = True
         db_table = 'review'
+        indexes = [
+            models.Index(fields=['review_date', 'review_id'], name='ix_review_date'),
+        ]
 
     def __str__(self):
         return self.book
 
+
+
+class BookSearchTerm(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    term = models.CharField(max_length=64)
+    book = models.ForeignKey(Book, on_delete=models.CASCADE, related_name='search_terms')
+    field = models.CharField(max_length=8)
+    weight = models.IntegerField(default=1)
+
+    class Meta:
+        managed = True
+        db_table = 'book_search_term'
+        indexes = [
+            models.Index(fields=['term', 'book'], name='ix_search_term_book'),
+        ]
+
+    def __str__(self):
+        return f"{self.term} -> {self.book_id}"
+
+
+class LibraryStatistics(models.Model):
+    # "all" for the whole system, "library:<id>" for a per-library breakdown.
+    scope = models.CharField(primary_key=True, max_length=32)
+    total_books = models.BigIntegerField(default=0)
+    total_members = models.BigIntegerField(default=0)
+    total_borrowings = models.BigIntegerField(default=0)
+    currently_borrowed = models.BigIntegerField(default=0)
+    late_returns = models.BigIntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'library_statistics'
+
+    def __str__(self):
+        return self.scope
+
+
+class OverdueSummary(models.Model):
+    id = models.BigAutoField(primary_key=True)
+    as_of = models.DateField()
+    member = models.ForeignKey(Member, models.DO_NOTHING)
+    library = models.ForeignKey(Library, models.DO_NOTHING, blank=True, null=True)
+    overdue_loans = models.IntegerField(default=0)
+    late_days = models.IntegerField(default=0)
+    max_late_days = models.IntegerField(default=0)
+    accrued_fee = models.DecimalField(max_digits=10, decimal_places=2, default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'overdue_summary'
+        constraints = [
+            models.UniqueConstraint(fields=['as_of', 'member', 'library'], name='uq_overdue_summary')
+        ]
+
+    def __str__(self):
+        return f"{self.as_of} {self.member_id} {self.library_id}"
+
+
+class Hold(models.Model):
+    """
+    One member waiting for a book. Rows only live while queued: they are
+    deleted when the copy is collected or the hold is cancelled.
+    """
+    WAITING = 'waiting'
+    READY = 'ready'
+    STATUS_CHOICES = [(WAITING, 'Waiting'), (READY, 'Ready for pickup')]
+
+    hold_id = models.AutoField(primary_key=True)
+    book = models.ForeignKey(Book, models.CASCADE, related_name='holds')
+    member = models.ForeignKey(Member, models.CASCADE, related_name='holds')
+    position = models.BigIntegerField()
+    status = models.CharField(max_length=7, choices=STATUS_CHOICES, default=WAITING)
+    created_at = models.DateTimeField(auto_now_add=True)
+    ready_at = models.DateTimeField(blank=True, null=True)
+
+    class Meta:
+        managed = True
+        db_table = 'hold'
+        constraints = [
+            models.UniqueConstraint(fields=['book', 'position'], name='uq_hold_book_position'),
+            models.UniqueConstraint(fields=['book', 'member'], name='uq_hold_book_member'),
+        ]
+
+    def __str__(self):
+        return f"{self.member_id} -> {self.book_id} #{self.position}"
+
+
+class TableVersion(models.Model):
+    """Write counter per table, bumped after every committed change (see library.versions)."""
+    table = models.CharField(primary_key=True, max_length=64)
+    version = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'table_version'
+
+    def __str__(self):
+        return f"{self.table}@{self.version}"
+
+
+class IdempotencyRecord(models.Model):
+    """
+    The first response to a POST sent with an ``Idempotency-Key`` header (see
+    library.idempotency). ``status_code`` is NULL while that request runs.
+    """
+    id = models.BigAutoField(primary_key=True)
+    key = models.CharField(max_length=255)
+    path = models.CharField(max_length=255)
+    request_hash = models.CharField(max_length=64)
+    status_code = models.SmallIntegerField(blank=True, null=True)
+    response_body = models.TextField(blank=True, null=True)
+    created_at = models.DateTimeField()
+    expires_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'idempotency_record'
+        constraints = [
+            models.UniqueConstraint(fields=['key', 'path'], name='uq_idempotency_key_path'),
+        ]
+        indexes = [
+            # purge_idempotency_keys.
+            models.Index(fields=['expires_at'], name='ix_idempotency_expires'),
+        ]
+
+    def __str__(self):
+        return f"{self.path} {self.key}"
+
+
+class BorrowingDailyRollup(models.Model):
+    """Loans started and ended per day, library and category (see library.rollups)."""
+    id = models.BigAutoField(primary_key=True)
+    day = models.DateField()
+    library = models.ForeignKey(Library, models.DO_NOTHING, blank=True, null=True, db_constraint=False)
+    category = models.ForeignKey(Category, models.DO_NOTHING, blank=True, null=True, db_constraint=False)
+    borrowed = models.IntegerField(default=0)
+    returned = models.IntegerField(default=0)
+    late_returns = models.IntegerField(default=0)
+
+    class Meta:
+        managed = True
+        db_table = 'borrowing_daily_rollup'
+        constraints = [
+            models.UniqueConstraint(fields=['day', 'library', 'category'], name='uq_borrowing_rollup'),
+        ]
+
+    def __str__(self):
+        return f"{self.day} {self.library_id} {self.category_id}"
+
+
+class RollupWatermark(models.Model):
+    """
+    How far a derived table has read its source: the first day a rollup has
+    not finalised yet (library.rollups), or the last primary key folded in
+    (library.recommendations).
+    """
+    name = models.CharField(primary_key=True, max_length=64)
+    day = models.DateField(blank=True, null=True)
+    last_id = models.BigIntegerField(default=0)
+    updated_at = models.DateTimeField()
+
+    class Meta:
+        managed = True
+        db_table = 'rollup_watermark'
+
+    def __str__(self):
+        return f"{self.name}@{self.day}"
+
+
+class BookRecommendation(models.Model):
+    """
+    "Members who borrowed this also borrowed": the top-k books per book by
+    co-borrowing, rebuilt offline by library.recommendations.
+    """
+    id = models.BigAutoField(primary_key=True)
+    book = models.ForeignKey(Book, models.CASCADE, related_name='recommendations')
+    recommended = models.ForeignKey(Book, models.CASCADE, related_name='+')
+    rank = models.SmallIntegerField()
+    # Members who borrowed both books, and that count over the geometric
+    # mean of the two books' borrower counts (cosine similarity).
+    co_borrowers = models.IntegerField()
+    score = models.FloatField()
+
+    class Meta:
+        managed = True
+        db_table = 'book_recommendation'
+        constraints = [
+            # Also the index the recommendations endpoint reads.
+            models.UniqueConstraint(fields=['book', 'rank'], name='uq_book_recommendation_rank'),
+        ]
+
+    def __str__(self):
+        return f"{self.book_id} -> {self.recommended_id} #{self.rank}"
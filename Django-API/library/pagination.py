@@ -0,0 +1,279 @@
+import asyncio
+import base64
+import json
+
+from django.core.exceptions import ValidationError as DjangoValidationError
+from django.core.paginator import InvalidPage, Page
+from django.db import connections
+from django.db.models import F, Q
+from rest_framework.exceptions import NotFound
+from rest_framework.filters import OrderingFilter
+from rest_framework.pagination import BasePagination, PageNumberPagination
+from rest_framework.response import Response
+from rest_framework.settings import api_settings
+from rest_framework.utils.urls import replace_query_param
+
+
+def _encode_value(value):
+    # Full-precision ISO strings: DjangoJSONEncoder drops microseconds, which
+    # would make the seek predicate skip or repeat rows.
+    if hasattr(value, "isoformat"):
+        return value.isoformat()
+    return str(value)
+
+
+class SearchPagination(PageNumberPagination):
+    page_size = 20
+    page_size_query_param = "page_size"
+    max_page_size = 100
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """
+        ``paginate_queryset`` for async views. The count and the page are
+        independent queries and are awaited together, except for ``page=last``.
+        """
+        self.request = request
+        page_size = self.get_page_size(request)
+        paginator = self.django_paginator_class(queryset, page_size)
+        # Not get_page_number(): it resolves "last" by counting synchronously.
+        page_number = request.query_params.get(self.page_query_param) or 1
+
+        async def read(number):
+            offset = (number - 1) * page_size
+            return [row async for row in queryset[offset:offset + page_size]]
+
+        try:
+            if page_number in self.last_page_strings:
+                paginator.count = await queryset.acount()
+                number = paginator.num_pages
+                rows = await read(number)
+            else:
+                if not str(page_number).isdigit() or int(page_number) < 1:
+                    # Rejects what the count cannot make valid, without reading it.
+                    paginator.validate_number(page_number)
+                number = int(page_number)
+                paginator.count, rows = await asyncio.gather(queryset.acount(), read(number))
+                paginator.validate_number(number)
+        except InvalidPage as exc:
+            raise NotFound(self.invalid_page_message.format(page_number=page_number, message=str(exc)))
+        self.page = Page(rows, number, paginator)
+        return rows
+
+
+class KeysetPagination(BasePagination):
+    """
+    Keyset ("seek") pagination over the view's ordering.
+
+    The ordering comes from the view's OrderingFilter (so ``?ordering=`` keeps
+    working) or its ``ordering`` attribute, with the primary key appended as a
+    tie-breaker. The cursor stores the ordering values of the last row seen and
+    the next page is fetched with ``WHERE (a, b, pk) > (...) LIMIT n``, so deep
+    pages cost the same as the first: there is no OFFSET.
+
+    NULLs sort first in ascending and last in descending order (MySQL's and
+    SQLite's native order, forced explicitly elsewhere) and are handled in the
+    seek predicate.
+    """
+    page_size = api_settings.PAGE_SIZE or 50
+    page_size_query_param = "page_size"
+    max_page_size = 500
+    cursor_query_param = "cursor"
+    invalid_cursor_message = "Invalid cursor"
+
+    def paginate_queryset(self, queryset, request, view=None):
+        page, reverse, cursor = self._page_queryset(queryset, request, view)
+        return self._finish_page(list(page), reverse, cursor)
+
+    async def apaginate_queryset(self, queryset, request, view=None):
+        """``paginate_queryset`` for async views, reading the page with the async ORM."""
+        page, reverse, cursor = self._page_queryset(queryset, request, view)
+        return self._finish_page([row async for row in page], reverse, cursor)
+
+    def _page_queryset(self, queryset, request, view):
+        self.request = request
+        self.base_url = request.build_absolute_uri()
+        self.page_size = self.get_page_size(request)
+        self.keys = self.get_keys(request, queryset, view)
+        self.model = queryset.model
+        # MySQL and SQLite already sort NULLs first ascending / last descending.
+        self.nulls_sort_low = connections[queryset.db].vendor in ("mysql", "sqlite")
+
+        cursor = self.decode_cursor(request)
+        reverse = bool(cursor and cursor["r"])
+        keys = [(name, not desc) for name, desc in self.keys] if reverse else self.keys
+
+        queryset = queryset.order_by(*[self._order_expression(name, desc) for name, desc in keys])
+        if cursor:
+            queryset = queryset.filter(self._seek(keys, cursor["v"]))
+        return queryset[:self.page_size + 1], reverse, cursor
+
+    def _finish_page(self, rows, reverse, cursor):
+        has_more = len(rows) > self.page_size
+        rows = rows[:self.page_size]
+        if reverse:
+            rows.reverse()
+
+        self.next_values = self.previous_values = None
+        if rows:
+            if has_more or reverse:
+                self.next_values = self._row_values(rows[-1])
+            if (has_more and reverse) or (cursor and not reverse):
+                self.previous_values = self._row_values(rows[0])
+        return rows
+
+    def get_page_size(self, request):
+        try:
+            size = int(request.query_params[self.page_size_query_param])
+        except (KeyError, ValueError):
+            return self.page_size
+        return min(max(size, 1), self.max_page_size)
+
+    def get_keys(self, request, queryset, view):
+        """Return the ordering as ``[(field, descending), ...]`` ending with the pk."""
+        ordering = None
+        for backend in getattr(view, "filter_backends", []):
+            if isinstance(backend, type) and issubclass(backend, OrderingFilter):
+                ordering = backend().get_ordering(request, queryset, view)
+        if not ordering:
+            ordering = getattr(view, "ordering", None) or queryset.query.order_by
+        if isinstance(ordering, str):
+            ordering = [ordering]
+
+        pk_name = queryset.model._meta.pk.name
+        keys = []
+        for name in ordering or []:
+            if not isinstance(name, str):
+                continue
+            desc = name.startswith("-")
+            name = name.lstrip("-")
+            if name == "pk":
+                name = pk_name
+            if name not in [key for key, _ in keys]:
+                keys.append((name, desc))
+        if pk_name not in [key for key, _ in keys]:
+            keys.append((pk_name, keys[0][1] if keys else False))
+        return keys
+
+    def get_paginated_response(self, data):
+        return Response({
+            "next": self.get_next_link(),
+            "previous": self.get_previous_link(),
+            "results": data,
+        })
+
+    def get_paginated_response_schema(self, schema):
+        return {
+            "type": "object",
+            "required": ["results"],
+            "properties": {
+                "next": {"type": "string", "nullable": True, "format": "uri"},
+                "previous": {"type": "string", "nullable": True, "format": "uri"},
+                "results": schema,
+            },
+        }
+
+    def get_schema_operation_parameters(self, view):
+        return [
+            {
+                "name": self.cursor_query_param,
+                "required": False,
+                "in": "query",
+                "description": "The pagination cursor value.",
+                "schema": {"type": "string"},
+            },
+            {
+                "name": self.page_size_query_param,
+                "required": False,
+                "in": "query",
+                "description": "Number of results to return per page.",
+                "schema": {"type": "integer"},
+            },
+        ]
+
+    def get_next_link(self):
+        if self.next_values is None:
+            return None
+        return self.encode_cursor(self.next_values, reverse=False)
+
+    def get_previous_link(self):
+        if self.previous_values is None:
+            return None
+        return self.encode_cursor(self.previous_values, reverse=True)
+
+    def encode_cursor(self, values, reverse):
+        payload = json.dumps({"v": values, "r": int(reverse)}, default=_encode_value, separators=(",", ":"))
+        token = base64.urlsafe_b64encode(payload.encode()).decode().rstrip("=")
+        return replace_query_param(self.base_url, self.cursor_query_param, token)
+
+    def decode_cursor(self, request):
+        token = request.query_params.get(self.cursor_query_param)
+        if not token:
+            return None
+        try:
+            payload = json.loads(base64.urlsafe_b64decode(token + "=" * (-len(token) % 4)))
+            values, payload["r"] = payload["v"], bool(payload["r"])
+            if len(values) != len(self.keys):
+                raise ValueError
+            payload["v"] = [
+                None if value is None else self._field(name).to_python(value)
+                for (name, _), value in zip(self.keys, values)
+            ]
+        except (TypeError, ValueError, KeyError, DjangoValidationError):
+            raise NotFound(self.invalid_cursor_message)
+        return payload
+
+    def _field(self, name):
+        model = self.model
+        field = None
+        for part in name.split("__"):
+            field = model._meta.get_field(part)
+            model = field.related_model or model
+        return field.target_field if field.is_relation else field
+
+    def _order_expression(self, name, desc):
+        if not self._field(name).null or self.nulls_sort_low:
+            # Plain ORDER BY so an index can serve it; MySQL emulates NULLS
+            # FIRST/LAST with an ISNULL() sort key that no index matches.
+            return F(name).desc() if desc else F(name).asc()
+        return F(name).desc(nulls_last=True) if desc else F(name).asc(nulls_first=True)
+
+    def _after(self, name, desc, value):
+        """Rows strictly after ``value`` on one key, or None when nothing can be."""
+        nullable = self._field(name).null
+        if desc:
+            if value is None:
+                return None
+            after = Q(**{f"{name}__lt": value})
+            return after | Q(**{f"{name}__isnull": True}) if nullable else after
+        if value is None:
+            return Q(**{f"{name}__isnull": False})
+        return Q(**{f"{name}__gt": value})
+
+    def _seek(self, keys, values):
+        """(k1 > v1) OR (k1 = v1 AND k2 > v2) OR ... in the page's sort order."""
+        condition = Q(pk__in=[])
+        equal = Q()
+        for (name, desc), value in zip(keys, values):
+            after = self._after(name, desc, value)
+            if after is not None:
+                condition |= equal & after
+            equal &= Q(**{f"{name}__isnull": True}) if value is None else Q(**{name: value})
+        return condition
+
+    def _row_values(self, row):
+        values = []
+        for name, _ in self.keys:
+            if isinstance(row, dict):
+                values.append(row.get(name))
+                continue
+            value = row
+            parts = name.split("__")
+            for i, part in enumerate(parts):
+                field = value._meta.get_field(part)
+                last = i == len(parts) - 1
+                # Read the FK column itself rather than loading the related row.
+                value = getattr(value, field.attname if last and field.many_to_one else part)
+                if value is None:
+                    break
+            values.append(value)
+        return values
@@ -0,0 +1,88 @@
+"""
+Per-book rating aggregates.
+
+``Book.rating_count`` / ``rating_sum`` are adjusted with ``F()`` updates in the
+caller's transaction whenever a review is written through the API, and
+``rating_avg`` is then recomputed from the stored columns in a second
+statement, so a book costs two UPDATEs per review write. Reviews without a
+book or a rating do not count. ``rebuild()`` recomputes everything from the
+review table.
+"""
+from collections import defaultdict
+
+from django.db import transaction
+from django.db.models import (
+    Case, Count, DecimalField, F, FloatField, IntegerField, OuterRef, Subquery, Sum, When,
+)
+from django.db.models.functions import Cast, Coalesce
+
+from . import versions
+from .models import Book, Review
+
+
+def _average():
+    return Case(
+        When(
+            rating_count__gt=0,
+            then=Cast(Cast(F("rating_sum"), FloatField()) / F("rating_count"),
+                      DecimalField(max_digits=3, decimal_places=2)),
+        ),
+        default=None,
+    )
+
+
+def review_state(review):
+    """``(book_id, rating)`` for a review that counts, else ``None``."""
+    if review is None or review.book_id is None or review.rating is None:
+        return None
+    return review.book_id, review.rating
+
+
+def apply_deltas(deltas):
+    """Apply ``{book_id: (count_delta, sum_delta)}``, touching books in id order."""
+    deltas = {book_id: delta for book_id, delta in deltas.items() if any(delta)}
+    for book_id in sorted(deltas):
+        count, total = deltas[book_id]
+        Book.objects.filter(pk=book_id).update(
+            rating_count=F("rating_count") + count, rating_sum=F("rating_sum") + total
+        )
+    if deltas:
+        Book.objects.filter(pk__in=deltas).update(rating_avg=_average())
+        versions.bump("book")
+
+
+def record_review_change(before, after):
+    """Move a review's contribution from state ``before`` to ``after`` (either may be ``None``)."""
+    deltas = defaultdict(lambda: (0, 0))
+    if before:
+        count, total = deltas[before[0]]
+        deltas[before[0]] = (count - 1, total - before[1])
+    if after:
+        count, total = deltas[after[0]]
+        deltas[after[0]] = (count + 1, total + after[1])
+    apply_deltas(deltas)
+
+
+def rebuild(batch_size=1000):
+    """Recompute the aggregates of every book from ``review``. Returns (books, rated books)."""
+    reviews = Review.objects.filter(book_id=OuterRef("pk"), rating__isnull=False).order_by().values("book_id")
+    count = Subquery(reviews.annotate(n=Count("pk")).values("n"), output_field=IntegerField())
+    total = Subquery(reviews.annotate(n=Sum("rating")).values("n"), output_field=IntegerField())
+
+    books = rated = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Book.objects.filter(book_id__gt=last_id).order_by("book_id").values_list("book_id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        batch = Book.objects.filter(book_id__gt=last_id, book_id__lte=ids[-1])
+        with transaction.atomic():
+            batch.update(rating_count=Coalesce(count, 0), rating_sum=Coalesce(total, 0))
+            batch.update(rating_avg=_average())
+            versions.bump("book")
+        rated += batch.filter(rating_count__gt=0).count()
+        books += len(ids)
+        last_id = ids[-1]
+    return books, rated
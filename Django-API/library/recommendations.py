@@ -0,0 +1,197 @@
+"""
+"Members who borrowed this also borrowed" recommendations.
+
+Two books are related by the members who borrowed both. Counting that live is
+a self-join of ``borrowing`` on member, so ``build`` does it offline: it
+streams ``(member, book)`` pairs in ``borrowing_id`` keyset pages into
+per-member histories, counts co-borrowers for every book and keeps the
+``top_k`` books per book in ``book_recommendation``, ranked by cosine
+similarity (co-borrowers over the geometric mean of the two books' borrower
+counts, so bestsellers do not top every list). Pairs seen fewer than
+``min_support`` times are dropped.
+
+With scipy installed the counting is a sparse product of the member x book
+matrix with itself, a block of books at a time; without it, the same counts
+come from plain dictionaries.
+
+The ``recommendations`` watermark holds the last ``borrowing_id`` folded in.
+``build(full=False)`` reads only loans after it, and recomputes the rows of
+the books those members have borrowed: every count those loans changed.
+Scores in other rows divide by borrower counts that have since grown until
+the next full build. Deleted loans are only dropped by a full build.
+"""
+import math
+from collections import Counter, defaultdict
+
+from django.db import transaction
+from django.db.models import Count, Max
+from django.utils import timezone
+
+from .models import BookRecommendation, Borrowing, RollupWatermark
+
+try:
+    import numpy as np
+    from scipy import sparse
+except ImportError:  # optional: dictionary counting
+    np = sparse = None
+
+WATERMARK = "recommendations"
+IN_CHUNK = 1000
+
+
+def _chunks(values, size=IN_CHUNK):
+    values = sorted(values)
+    for start in range(0, len(values), size):
+        yield values[start:start + size]
+
+
+def iter_pairs(loans, chunk_size=5000):
+    """Yield ``(member_id, book_id)`` for ``loans`` in ``borrowing_id`` keyset pages."""
+    loans = loans.filter(member_id__isnull=False, book_id__isnull=False)
+    last_id = 0
+    while True:
+        page = list(
+            loans.filter(borrowing_id__gt=last_id)
+            .order_by("borrowing_id")
+            .values_list("borrowing_id", "member_id", "book_id")[:chunk_size]
+        )
+        for last_id, member_id, book_id in page:
+            yield member_id, book_id
+        if len(page) < chunk_size:
+            return
+
+
+def load_histories(loans, chunk_size=5000):
+    """``{member_id: {book_id, ...}}`` for ``loans``."""
+    histories = defaultdict(set)
+    for member_id, book_id in iter_pairs(loans, chunk_size):
+        histories[member_id].add(book_id)
+    return histories
+
+
+def borrower_counts(book_ids):
+    """Distinct borrowers per book, from the base table."""
+    counts = {}
+    for chunk in _chunks(book_ids):
+        counts.update(
+            Borrowing.objects.filter(book_id__in=chunk, member_id__isnull=False)
+            .values_list("book_id")
+            .annotate(n=Count("member_id", distinct=True))
+            .order_by()
+        )
+    return counts
+
+
+def _rank(book_id, co_counts, borrowers, top_k, min_support):
+    """``[(recommended_id, co_borrowers, score)]``, best first."""
+    ranked = []
+    for other, count in co_counts.items():
+        if other == book_id or count < min_support:
+            continue
+        ranked.append((other, count, count / math.sqrt(borrowers[book_id] * borrowers[other])))
+    ranked.sort(key=lambda row: (-row[2], -row[1], row[0]))
+    return ranked[:top_k]
+
+
+def _co_counts_dict(histories, targets):
+    """Yield ``(book_id, Counter of co-borrowed books)`` for each target."""
+    borrowed_by = defaultdict(list)
+    for member_id, books in histories.items():
+        for book_id in books:
+            if book_id in targets:
+                borrowed_by[book_id].append(member_id)
+    for book_id in sorted(targets):
+        counts = Counter()
+        for member_id in borrowed_by[book_id]:
+            counts.update(histories[member_id])
+        yield book_id, counts
+
+
+def _co_counts_sparse(histories, targets, block=512):
+    """As ``_co_counts_dict``, with one sparse product per ``block`` target books."""
+    members = list(histories)
+    books = sorted({book_id for history in histories.values() for book_id in history})
+    column = {book_id: i for i, book_id in enumerate(books)}
+    rows, cols = [], []
+    for row, member_id in enumerate(members):
+        for book_id in histories[member_id]:
+            rows.append(row)
+            cols.append(column[book_id])
+    matrix = sparse.csc_matrix(
+        (np.ones(len(rows), dtype=np.int32), (rows, cols)), shape=(len(members), len(books))
+    )
+    books = np.asarray(books)
+    target_columns = sorted(column[book_id] for book_id in targets if book_id in column)
+    for start in range(0, len(target_columns), block):
+        block_columns = target_columns[start:start + block]
+        product = (matrix[:, block_columns].T @ matrix).tocsr()
+        for i, col in enumerate(block_columns):
+            cells = slice(product.indptr[i], product.indptr[i + 1])
+            yield int(books[col]), dict(zip(books[product.indices[cells]].tolist(), product.data[cells].tolist()))
+
+
+def co_counts(histories, targets):
+    counter = _co_counts_sparse if sparse is not None else _co_counts_dict
+    return counter(histories, set(targets))
+
+
+@transaction.atomic
+def build(full=True, top_k=20, min_support=2, chunk_size=5000, batch_size=1000):
+    """
+    Rebuild ``book_recommendation`` (``full``) or refresh it for the loans
+    after the watermark. Returns ``{"members", "books", "rows"}``: members
+    read, books whose recommendations were rewritten, rows written.
+    """
+    mark = RollupWatermark.objects.select_for_update().filter(pk=WATERMARK).first()
+    after = 0 if full or mark is None else mark.last_id
+    last_id = Borrowing.objects.aggregate(last=Max("borrowing_id"))["last"] or 0
+    new_loans = Borrowing.objects.filter(borrowing_id__gt=after, borrowing_id__lte=last_id)
+
+    if after == 0:
+        histories = load_histories(new_loans, chunk_size)
+        targets = {book_id for history in histories.values() for book_id in history}
+        members = len(histories)
+    else:
+        new_members = set(new_loans.filter(member_id__isnull=False).values_list("member_id", flat=True))
+        members = len(new_members)
+        # Every book those members borrowed has new co-borrowers; its row is
+        # recomputed from the histories of everyone who borrowed it.
+        targets = set()
+        for chunk in _chunks(new_members):
+            targets.update(
+                Borrowing.objects.filter(member_id__in=chunk, book_id__isnull=False)
+                .values_list("book_id", flat=True).distinct()
+            )
+        histories = defaultdict(set)
+        for chunk in _chunks(targets):
+            readers = Borrowing.objects.filter(book_id__in=chunk).values("member_id")
+            loans = Borrowing.objects.filter(member_id__in=readers, borrowing_id__lte=last_id)
+            for member_id, history in load_histories(loans, chunk_size).items():
+                histories[member_id] |= history
+
+    counted = [
+        (book_id, {other: count for other, count in counts.items() if count >= min_support})
+        for book_id, counts in co_counts(histories, targets)
+    ]
+    if after == 0:
+        borrowers = Counter(book_id for history in histories.values() for book_id in history)
+    else:
+        # Only these members' histories are loaded: count borrowers in the table.
+        borrowers = borrower_counts({other for _, counts in counted for other in counts})
+    rows = [
+        BookRecommendation(book_id=book_id, recommended_id=other, rank=rank, co_borrowers=count, score=score)
+        for book_id, counts in counted
+        for rank, (other, count, score) in enumerate(_rank(book_id, counts, borrowers, top_k, min_support), 1)
+    ]
+
+    stale = BookRecommendation.objects.all()
+    if after:
+        for chunk in _chunks(targets):
+            stale.filter(book_id__in=chunk).delete()
+    else:
+        stale.delete()
+    BookRecommendation.objects.bulk_create(rows, batch_size=batch_size)
+    RollupWatermark.objects.update_or_create(
+        pk=WATERMARK, defaults={"last_id": last_id, "updated_at": timezone.now()}
+    )
+    return {"members": members, "books": len(targets), "rows": len(rows)}
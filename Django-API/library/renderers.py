@@ -0,0 +1,40 @@
+"""
+JSON rendering through ``orjson`` when it is installed.
+
+``FastJSONRenderer`` produces the same bytes as DRF's ``JSONRenderer`` with
+its default settings (compact, UTF-8, U+2028/U+2029 escaped). Dates, times,
+decimals and anything else orjson would format differently are handed to
+DRF's encoder. Indented output, a custom encoder, and data orjson rejects
+(integers above 64 bits, for example) go through ``JSONRenderer`` itself.
+Only floats in exponent form are spelled differently (``1e16`` for
+``1e+16``); they parse to the same value.
+"""
+from rest_framework.renderers import JSONRenderer
+from rest_framework.utils.encoders import JSONEncoder
+
+try:
+    import orjson
+except ImportError:  # optional: plain JSONRenderer output
+    orjson = None
+
+if orjson is not None:
+    OPTIONS = orjson.OPT_PASSTHROUGH_DATETIME | orjson.OPT_PASSTHROUGH_DATACLASS | orjson.OPT_NON_STR_KEYS
+
+
+class FastJSONRenderer(JSONRenderer):
+    def render(self, data, accepted_media_type=None, renderer_context=None):
+        if (
+            orjson is None
+            or data is None
+            or self.encoder_class is not JSONEncoder
+            or not self.compact
+            or self.ensure_ascii
+            or self.get_indent(accepted_media_type, renderer_context or {})
+        ):
+            return super().render(data, accepted_media_type, renderer_context)
+        try:
+            ret = orjson.dumps(data, default=JSONEncoder().default, option=OPTIONS)
+        except TypeError:
+            return super().render(data, accepted_media_type, renderer_context)
+        # Same escaping as JSONRenderer: both are valid JSON but not valid JavaScript.
+        return ret.replace(b"\xe2\x80\xa8", b"\\u2028").replace(b"\xe2\x80\xa9", b"\\u2029")
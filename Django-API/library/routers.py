@@ -0,0 +1,95 @@
+"""
+Primary / read-replica routing.
+
+``ReplicaRouter`` sends every write to ``default`` (the primary). A read goes
+to one of ``LIBRARY_REPLICAS`` only while replica reads are enabled for the
+current context, and never inside a transaction on the primary: borrow,
+return and the other ``atomic`` paths read the rows they lock and write. Code
+outside a request (management commands, signal handlers run from them) reads
+from the primary.
+
+``ReplicaRoutingMiddleware`` enables replica reads for GET / HEAD / OPTIONS
+requests. A client that sent any other method gets a cookie that keeps its
+reads on the primary for ``LIBRARY_REPLICA_STICKY_SECONDS``, so it sees its
+own writes despite replication lag. The switch is a context variable, so it
+follows a request into ``sync_to_async`` threads under ASGI. Streaming
+responses (exports) are read after the middleware returns, from the primary.
+
+Queries per alias are exported by ``metrics.MetricsMiddleware``
+(``library_sql_queries_total{alias=...}``).
+"""
+import random
+from contextlib import contextmanager
+from contextvars import ContextVar
+
+from asgiref.sync import iscoroutinefunction, markcoroutinefunction
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS, connections
+
+STICKY_COOKIE = "library_primary"
+SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+_replica_reads = ContextVar("library_replica_reads", default=False)
+
+
+def replicas():
+    return getattr(settings, "LIBRARY_REPLICAS", [])
+
+
+@contextmanager
+def replica_reads(enabled=True):
+    """Allow (or forbid) replica reads for the block."""
+    token = _replica_reads.set(enabled)
+    try:
+        yield
+    finally:
+        _replica_reads.reset(token)
+
+
+class ReplicaRouter:
+    def db_for_read(self, model, **hints):
+        aliases = replicas()
+        if not aliases or not _replica_reads.get() or connections[DEFAULT_DB_ALIAS].in_atomic_block:
+            return DEFAULT_DB_ALIAS
+        return random.choice(aliases)
+
+    def db_for_write(self, model, **hints):
+        return DEFAULT_DB_ALIAS
+
+    def allow_relation(self, obj1, obj2, **hints):
+        # Replicas hold the primary's rows, so objects may be related across them.
+        aliases = {DEFAULT_DB_ALIAS, *replicas()}
+        if obj1._state.db in aliases and obj2._state.db in aliases:
+            return True
+        return None
+
+
+class ReplicaRoutingMiddleware:
+    sync_capable = True
+    async_capable = True
+
+    def __init__(self, get_response):
+        self.get_response = get_response
+        self.sticky_seconds = getattr(settings, "LIBRARY_REPLICA_STICKY_SECONDS", 5)
+        if iscoroutinefunction(get_response):
+            markcoroutinefunction(self)
+
+    def use_replicas(self, request):
+        return request.method in SAFE_METHODS and STICKY_COOKIE not in request.COOKIES
+
+    def stick(self, request, response):
+        if request.method not in SAFE_METHODS and replicas():
+            response.set_cookie(STICKY_COOKIE, "1", max_age=self.sticky_seconds, httponly=True, samesite="Lax")
+        return response
+
+    def __call__(self, request):
+        if iscoroutinefunction(self):
+            return self.__acall__(request)
+        with replica_reads(self.use_replicas(request)):
+            response = self.get_response(request)
+        return self.stick(request, response)
+
+    async def __acall__(self, request):
+        with replica_reads(self.use_replicas(request)):
+            response = await self.get_response(request)
+        return self.stick(request, response)
@@ -0,0 +1,151 @@
+import re
+
+from django.db import transaction
+from django.db.models import Case, Count, F, IntegerField, Q, Sum, Value, When
+
+from .models import Book, BookAuthor, BookSearchTerm
+
+# Relative importance of each indexed field when ranking results.
+FIELD_WEIGHTS = {
+    "isbn": 5,
+    "title": 3,
+    "author": 2,
+    "category": 1,
+}
+
+MAX_TERM_LENGTH = 64
+MAX_QUERY_TERMS = 8
+
+# Sorts after every real character, so [token, token + PREFIX_END) is exactly the
+# set of terms starting with token. Unlike LIKE 'token%' the range can always use
+# the index (SQLite never does for LIKE ... ESCAPE).
+PREFIX_END = "\U0010ffff"
+
+_TOKEN_RE = re.compile(r"\w+", re.UNICODE)
+
+
+def tokenize(text):
+    """Split text into lowercase index terms, dropping duplicates but keeping order."""
+    if not text:
+        return []
+    seen = []
+    for token in _TOKEN_RE.findall(str(text).lower()):
+        token = token[:MAX_TERM_LENGTH]
+        if token not in seen:
+            seen.append(token)
+    return seen
+
+
+def terms_for_book(book, author_names):
+    """Return the set of (term, field, weight) rows describing one book."""
+    sources = [
+        ("isbn", [book.isbn]),
+        ("title", [book.title]),
+        ("author", author_names),
+        ("category", [book.category.name] if book.category_id else []),
+    ]
+    rows = {}
+    for field, values in sources:
+        weight = FIELD_WEIGHTS[field]
+        for value in values:
+            for term in tokenize(value):
+                # Keep the heaviest field a term appears in.
+                if rows.get(term, (None, 0))[1] < weight:
+                    rows[term] = (field, weight)
+    return {(term, field, weight) for term, (field, weight) in rows.items()}
+
+
+@transaction.atomic
+def reindex_books(book_ids):
+    """Rebuild the index rows for the given books in a fixed number of queries."""
+    book_ids = sorted({pk for pk in book_ids if pk is not None})
+    if not book_ids:
+        return 0
+
+    books = Book.objects.select_related("category").filter(pk__in=book_ids)
+    author_names = {}
+    for book_id, name in (
+        BookAuthor.objects.filter(book_id__in=book_ids)
+        .order_by("book_id", "author_id")
+        .values_list("book_id", "author__name")
+    ):
+        author_names.setdefault(book_id, []).append(name)
+
+    rows = [
+        BookSearchTerm(book_id=book.pk, term=term, field=field, weight=weight)
+        for book in books
+        for term, field, weight in terms_for_book(book, author_names.get(book.pk, []))
+    ]
+    BookSearchTerm.objects.filter(book_id__in=book_ids).delete()
+    BookSearchTerm.objects.bulk_create(rows, batch_size=1000)
+    return len(rows)
+
+
+def reindex_author(author_id):
+    reindex_books(BookAuthor.objects.filter(author_id=author_id).values_list("book_id", flat=True))
+
+
+def reindex_category(category_id):
+    reindex_books(Book.objects.filter(category_id=category_id).values_list("book_id", flat=True))
+
+
+def rebuild_index(batch_size=500):
+    """
+    Rebuild the whole index, batch by batch. Returns (books, terms).
+
+    Each batch replaces only its own books' rows, so searches keep finding the
+    rest of the catalog while the rebuild runs. Rows of deleted books go with
+    them through the foreign key.
+    """
+    books = terms = 0
+    last_id = 0
+    while True:
+        ids = list(
+            Book.objects.filter(book_id__gt=last_id)
+            .order_by("book_id")
+            .values_list("book_id", flat=True)[:batch_size]
+        )
+        if not ids:
+            break
+        terms += reindex_books(ids)
+        books += len(ids)
+        last_id = ids[-1]
+    return books, terms
+
+
+def search_books(query):
+    """
+    Rank books matching every term of ``query``.
+
+    Every term must match exactly except the last, which matches by prefix so
+    partial words and ISBN prefixes work as the user types. Both forms are
+    served by the ``(term, book)`` index. Exact matches score double. Returns a
+    values queryset of ``{"book_id", "score"}`` ordered by descending score.
+    """
+    tokens = tokenize(query)[:MAX_QUERY_TERMS]
+    if not tokens:
+        return BookSearchTerm.objects.none().values("book_id")
+
+    last = tokens[-1]
+    conditions = [Q(term=token) for token in tokens[:-1]]
+    conditions.append(Q(term__gte=last, term__lt=last + PREFIX_END))
+    any_token = Q()
+    for condition in conditions:
+        any_token |= condition
+
+    matched_token = Case(
+        *[When(condition, then=Value(i)) for i, condition in enumerate(conditions)],
+        output_field=IntegerField(),
+    )
+    score = Case(
+        When(term__in=tokens, then=F("weight") * 2),
+        default=F("weight"),
+        output_field=IntegerField(),
+    )
+    return (
+        BookSearchTerm.objects.filter(any_token)
+        .values("book_id")
+        .annotate(matched=Count(matched_token, distinct=True), score=Sum(score))
+        .filter(matched=len(tokens))
+        .order_by("-score", "book_id")
+    )
@@ -1,7 +1,8 @@
 from django.utils import timezone
 from rest_framework import serializers
-from .models import (Library, Author, Book, Category, BookAuthor, Borrowing, Member, Review
+from .models import (Library, Author, Book, Category, BookAuthor, Borrowing, Member, Review, Hold
 )
+from . import holds
 
 class LibrarySerializer(serializers.ModelSerializer):
     contact_email = serializers.EmailField(allow_null=True, allow_blank=True, required=False)
@@ -40,41 +41,96 @@ class BookAuthorSerializer(serializers.ModelSerializer):
                 raise serializers.ValidationError("This book-author mapping already exists.")
             return attrs
 
+def clean_isbn(value):
+    v = (value or "").strip()
+    if len(v) != 13 or not v.isdigit():
+        raise serializers.ValidationError("ISBN must be exactly 13 digits.")
+    return v
+
+def clean_published_year(value):
+    if value is None:
+        return value
+    v = str(value).strip()
+    if not v.isdigit():
+        raise serializers.ValidationError("published_year must contain only digits")
+    year = int(v)
+    year_now = timezone.now().year
+    if year < 0 or year > year_now:
+        raise serializers.ValidationError(f"published_year must be between 0 and {year_now}.")
+    return v
+
+def check_copies(total, available):
+    if total is not None and total < 0:
+        raise serializers.ValidationError({"total_copies": "Must be >= 0."})
+    if available is not None and available < 0:
+        raise serializers.ValidationError({"available_copies": "Must be >= 0."})
+    if total is not None and available is not None and available > total:
+        raise serializers.ValidationError("Available copies cannot exceed total copies.")
+
+BOOK_EXPANSIONS = ("authors", "category", "library")
+
+def parse_expand(request):
+    """Return the set of ``?expand=`` names for books, rejecting unknown ones."""
+    raw = request.query_params.get("expand", "") if request is not None else ""
+    names = {name.strip() for name in raw.split(",") if name.strip()}
+    unknown = names.difference(BOOK_EXPANSIONS)
+    if unknown:
+        raise serializers.ValidationError(
+            {"expand": f"Unknown value(s): {', '.join(sorted(unknown))}. Allowed: {', '.join(BOOK_EXPANSIONS)}."}
+        )
+    return names
+
+class AuthorSummarySerializer(serializers.ModelSerializer):
+    class Meta:
+        model = Author
+        fields = ["author_id", "name"]
+
 class BookSerializer(serializers.ModelSerializer):
+    """
+    With ``?expand=authors`` the response gains an ``authors`` list; with
+    ``category`` / ``library`` those ids become ``{id, name}`` objects. The
+    view is expected to have prefetched / selected the related rows.
+    """
     published_year = serializers.CharField(allow_null=True, required=False)
 
     class Meta:
         model = Book
-        fields = ["book_id", "title", "isbn", "published_year", "total_copies", "available_copies", "category", "library"]
+        fields = ["book_id", "title", "isbn", "published_year", "total_copies", "available_copies", "category", "library",
+                  "rating_count", "rating_avg"]
+        read_only_fields = ["rating_count", "rating_avg"]
+
+    def update(self, instance, validated_data):
+        for attr, value in validated_data.items():
+            setattr(instance, attr, value)
+        # Only the submitted columns: the rating aggregates and copy counts are
+        # maintained with F() updates and must not be overwritten with stale values.
+        instance.save(update_fields=list(validated_data))
+        return instance
+
+    def to_representation(self, instance):
+        data = super().to_representation(instance)
+        expand = self.context.get("expand") or ()
+        if "authors" in expand:
+            data["authors"] = AuthorSummarySerializer(instance.authors.all(), many=True).data
+        if "category" in expand:
+            category = instance.category
+            data["category"] = category and {"category_id": category.category_id, "name": category.name}
+        if "library" in expand:
+            library = instance.library
+            data["library"] = library and {"library_id": library.library_id, "name": library.name}
+        return data
 
-        def validate_isbn(self, value):
-            v = (value or "").strip()
-            if len(v) != 13 or not v.isdigit():
-                raise serializers.ValidationError("ISBN must be exactly 13 digits.")
-            return v
+    def validate_isbn(self, value):
+        return clean_isbn(value)
 
-        def validate_published_year(self, value):
-            if value is None:
-                return value
-            v = str(value).strip()
-            if not v.isdigit():
-                raise serializers.ValidationError("published_year must contain only digits")
-            year = int(v)
-            year_now = timezone.now().year
-            if value < 0 or value > year_now:
-                raise serializers.ValidationError(f"published_year must be between 0 and {year_now}.")
-            return v
-        def validate(self, data):
-            total = data.get("total_copies", getattr(self.instance, "total_copies", None))
-            available = data.get("available_copies", getattr(self.instance, "available_copies", None))
-
-            if total is not None and total < 0:
-                raise serializers.ValidationError({"total_copies": "Must be >= 0."})
-            if available is not None and available < 0:
-                raise serializers.ValidationError({"available_copies": "Must be >= 0."})
-            if total is not None and available is not None and available > total:
-                raise serializers.ValidationError("Available copies cannot exceed total copies.")
-            return data
+    def validate_published_year(self, value):
+        return clean_published_year(value)
+
+    def validate(self, data):
+        total = data.get("total_copies", getattr(self.instance, "total_copies", None))
+        available = data.get("available_copies", getattr(self.instance, "available_copies", None))
+        check_copies(total, available)
+        return data
 
 class MemberSerializer(serializers.ModelSerializer):
     email = serializers.EmailField(allow_null=True,allow_blank=True,required=False)
@@ -97,19 +153,36 @@ class MemberSerializer(serializers.ModelSerializer):
             return value
 
 class BorrowingSerializer(serializers.ModelSerializer):
+    OPEN_LOAN_ERROR = "This member already borrowed this book and has not returned it."
+
     class Meta:
         model = Borrowing
-        fields = "__all__"
+        # active_loan only backs the one-open-loan constraint.
+        exclude = ["active_loan"]
+
+    def validate(self, data):
+        # uq_borrowing_active_loan enforces this too; check first for a 400.
+        instance = self.instance
+        book = data.get("book", instance.book if instance else None)
+        member = data.get("member", instance.member if instance else None)
+        return_date = data["return_date"] if "return_date" in data else getattr(instance, "return_date", None)
+        if book is not None and member is not None and return_date is None:
+            open_loans = Borrowing.objects.filter(book=book, member=member, return_date__isnull=True)
+            if instance is not None:
+                open_loans = open_loans.exclude(pk=instance.pk)
+            if open_loans.exists():
+                raise serializers.ValidationError(self.OPEN_LOAN_ERROR)
+        return data
 
 class ReviewSerializer(serializers.ModelSerializer):
     class Meta:
         model = Review
         fields = "__all__"
 
-        def validate_rating(self, value):
-            if not (1 <= value <= 5):
-                raise serializers.ValidationError("Rating must be between 1 and 5.")
-            return value
+    def validate_rating(self, value):
+        if value is not None and not (1 <= value <= 5):
+            raise serializers.ValidationError("Rating must be between 1 and 5.")
+        return value
 
 class BorrowRequestSerializer(serializers.Serializer):
     book_id = serializers.IntegerField(min_value=1)
@@ -128,11 +201,30 @@ class ReturnRequestSerializer(serializers.Serializer):
             raise serializers.ValidationError("Borrowing ID must be positive.")
         return value
 
+class BulkLoanRequestSerializer(serializers.Serializer):
+    MAX_ITEMS = 200
 
+    items = serializers.ListField(child=serializers.DictField(), allow_empty=False, max_length=MAX_ITEMS)
 
+    def validate_items(self, value):
+        pairs, errors = [], {}
+        for index, item in enumerate(value):
+            req = BorrowRequestSerializer(data=item)
+            if req.is_valid():
+                pairs.append((req.validated_data["book_id"], req.validated_data["member_id"]))
+            else:
+                errors[index] = req.errors
+        if errors:
+            raise serializers.ValidationError(errors)
+        return pairs
 
+class HoldSerializer(serializers.ModelSerializer):
+    queue_position = serializers.SerializerMethodField()
 
+    class Meta:
+        model = Hold
+        fields = ["hold_id", "book", "member", "status", "queue_position", "created_at", "ready_at"]
 
-
-
-
+    def get_queue_position(self, obj):
+        position = getattr(obj, "queue_position", None)
+        return holds.queue_position(obj) if position is None else position
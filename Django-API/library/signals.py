@@ -0,0 +1,107 @@
+from django.db.models.signals import m2m_changed, post_delete, post_save
+from django.dispatch import receiver
+
+from . import availability, search, stats, versions
+from .models import Author, Book, BookAuthor, Borrowing, Category, Library, Member, Review
+
+
+# save(update_fields=...) accepts both the field name and the attname of a foreign key.
+INDEXED_BOOK_FIELDS = {"title", "isbn", "category", "category_id"}
+
+
+@receiver(post_save, sender=Book)
+def index_book(sender, instance, raw=False, update_fields=None, **kwargs):
+    # Borrow/return save only available_copies; nothing searchable changed.
+    if not raw and (update_fields is None or INDEXED_BOOK_FIELDS & set(update_fields)):
+        search.reindex_books([instance.pk])
+
+
+@receiver(post_save, sender=Author)
+def index_author_books(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        search.reindex_author(instance.pk)
+
+
+@receiver(post_save, sender=Category)
+def index_category_books(sender, instance, raw=False, created=False, **kwargs):
+    if not raw and not created:
+        search.reindex_category(instance.pk)
+
+
+@receiver(post_save, sender=BookAuthor)
+@receiver(post_delete, sender=BookAuthor)
+def index_book_author(sender, instance, raw=False, **kwargs):
+    if not raw:
+        search.reindex_books([instance.book_id])
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def index_book_authors_changed(sender, instance, action, reverse, pk_set, **kwargs):
+    if action == "pre_clear" and reverse:
+        # author.books.clear() does not report which books lost the author.
+        instance._search_cleared_books = list(
+            BookAuthor.objects.filter(author_id=instance.pk).values_list("book_id", flat=True)
+        )
+    elif action in ("post_add", "post_remove", "post_clear"):
+        if not reverse:
+            search.reindex_books([instance.pk])
+        elif action == "post_clear":
+            search.reindex_books(getattr(instance, "_search_cleared_books", []))
+        else:
+            search.reindex_books(pk_set or [])
+
+
+@receiver(post_save, sender=Book)
+def count_book(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(instance.library_id, total_books=1)
+
+
+@receiver(post_delete, sender=Book)
+def uncount_book(sender, instance, **kwargs):
+    stats.adjust(instance.library_id, total_books=-1)
+
+
+@receiver(post_save, sender=Member)
+def count_member(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.adjust(total_members=1)
+
+
+@receiver(post_delete, sender=Member)
+def uncount_member(sender, instance, **kwargs):
+    stats.adjust(total_members=-1)
+
+
+@receiver(post_save, sender=Borrowing)
+def count_borrowing(sender, instance, created, raw=False, **kwargs):
+    if created and not raw:
+        stats.record_borrowings([stats.borrowing_state(instance)])
+
+
+@receiver(post_delete, sender=Borrowing)
+def uncount_borrowing(sender, instance, **kwargs):
+    stats.record_borrowings([stats.borrowing_state(instance)], sign=-1)
+
+
+@receiver(post_save, sender=Book)
+@receiver(post_delete, sender=Book)
+def invalidate_availability(sender, instance, raw=False, **kwargs):
+    if not raw:
+        availability.invalidate([instance.pk])
+
+
+def bump_table_version(sender, raw=False, **kwargs):
+    if not raw:
+        versions.bump(sender._meta.db_table)
+
+
+for model in (Author, Book, BookAuthor, Borrowing, Category, Library, Member, Review):
+    post_save.connect(bump_table_version, sender=model, dispatch_uid=f"bump-{model._meta.db_table}-save")
+    post_delete.connect(bump_table_version, sender=model, dispatch_uid=f"bump-{model._meta.db_table}-delete")
+
+
+@receiver(m2m_changed, sender=Book.authors.through)
+def bump_book_author_version(sender, action, **kwargs):
+    if action in ("post_add", "post_remove", "post_clear"):
+        versions.bump(BookAuthor._meta.db_table)
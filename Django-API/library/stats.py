@@ -0,0 +1,229 @@
+"""
+Incrementally maintained counters behind StatisticsView.
+
+Every write that changes a counted row adjusts the global counters and, where
+the row belongs to a library, that library's counters, inside the caller's
+transaction. Members are not attached to a library, so ``total_members`` is
+global only. ``reconcile`` recomputes everything from the base tables and
+repairs drift.
+
+Each scope's counters are spread over ``LIBRARY_STATS_SLOTS`` rows (``all``,
+``all#1``, ... ``all#15``) and read as their sum. A thread always writes the
+same slot, picked at random, so concurrent loans in different requests
+rarely queue on the same row lock until commit, while the writes of one
+transaction still land on one row per scope in a fixed order.
+"""
+import random
+import threading
+from collections import defaultdict
+
+from django.conf import settings
+from django.db import IntegrityError, transaction
+from django.db.models import Count, F, Q, Sum
+
+from .models import Book, Borrowing, LibraryStatistics, Member
+
+GLOBAL_SCOPE = "all"
+COUNTERS = (
+    "total_books",
+    "total_members",
+    "total_borrowings",
+    "currently_borrowed",
+    "late_returns",
+)
+
+
+_local = threading.local()
+
+
+def scope_for(library_id=None):
+    return GLOBAL_SCOPE if library_id is None else f"library:{library_id}"
+
+
+def slots():
+    return max(1, getattr(settings, "LIBRARY_STATS_SLOTS", 16))
+
+
+def slot_keys(scope):
+    """Primary keys of the rows holding ``scope``'s counters; slot 0 is the scope itself."""
+    return [scope] + [f"{scope}#{slot}" for slot in range(1, slots())]
+
+
+def scope_of(key):
+    return key.split("#", 1)[0]
+
+
+def _slot_key(scope):
+    slot = getattr(_local, "slot", None)
+    if slot is None or slot >= slots():
+        slot = _local.slot = random.randrange(slots())
+    return scope if slot == 0 else f"{scope}#{slot}"
+
+
+def _upsert(scope, deltas):
+    key = _slot_key(scope)
+    updated = LibraryStatistics.objects.filter(pk=key).update(
+        **{name: F(name) + delta for name, delta in deltas.items()}
+    )
+    if updated:
+        return
+    try:
+        with transaction.atomic():
+            LibraryStatistics.objects.create(scope=key, **deltas)
+    except IntegrityError:
+        # Another transaction created the row first.
+        LibraryStatistics.objects.filter(pk=key).update(
+            **{name: F(name) + delta for name, delta in deltas.items()}
+        )
+
+
+def apply_deltas(per_library):
+    """
+    Apply ``{library_id: {counter: delta}}`` in one update per touched row.
+    ``None`` keys only feed the global row. Rows are always written in the same
+    order (libraries by id, then global) so concurrent writers cannot deadlock.
+    """
+    totals = defaultdict(int)
+    ordered = sorted(per_library.items(), key=lambda item: (item[0] is None, item[0] or 0))
+    for library_id, deltas in ordered:
+        for name, delta in deltas.items():
+            totals[name] += delta
+        library_deltas = {
+            name: delta for name, delta in deltas.items()
+            if delta and name != "total_members"
+        }
+        if library_id is not None and library_deltas:
+            _upsert(scope_for(library_id), library_deltas)
+    totals = {name: delta for name, delta in totals.items() if delta}
+    if totals:
+        _upsert(GLOBAL_SCOPE, totals)
+
+
+def adjust(library_id=None, **deltas):
+    """Add ``deltas`` to the global counters and to ``library_id``'s counters."""
+    apply_deltas({library_id: deltas})
+
+
+def is_late(borrowing):
+    return bool(
+        borrowing.return_date and borrowing.due_date
+        and borrowing.return_date > borrowing.due_date
+    )
+
+
+def borrowing_state(borrowing, library_id=None):
+    """Snapshot of what one loan contributes to the counters."""
+    if library_id is None and borrowing.book_id is not None:
+        try:
+            library_id = borrowing.book.library_id
+        except Book.DoesNotExist:
+            pass
+    return library_id, borrowing.return_date is None, is_late(borrowing)
+
+
+def _add_state(per_library, state, sign):
+    library_id, active, late = state
+    per_library[library_id]["total_borrowings"] += sign
+    per_library[library_id]["currently_borrowed"] += sign * active
+    per_library[library_id]["late_returns"] += sign * late
+
+
+def record_borrowings(states, sign=1):
+    """Count (or with ``sign=-1`` uncount) loans given as ``borrowing_state`` tuples."""
+    per_library = defaultdict(lambda: defaultdict(int))
+    for state in states:
+        _add_state(per_library, state, sign)
+    apply_deltas(per_library)
+
+
+def record_borrowing_changes(changes):
+    """Apply a batch of ``(before, after)`` ``borrowing_state`` pairs."""
+    per_library = defaultdict(lambda: defaultdict(int))
+    for before, after in changes:
+        if before != after:
+            _add_state(per_library, before, -1)
+            _add_state(per_library, after, 1)
+    apply_deltas(per_library)
+
+
+def record_borrowing_change(before, after):
+    record_borrowing_changes([(before, after)])
+
+
+def _totals(row):
+    return {name: row[name] or 0 for name in COUNTERS}
+
+
+def get_counters(library_id=None):
+    """One primary-key range read summing the scope's slots. Nothing counted yet reads as zero."""
+    return _totals(
+        LibraryStatistics.objects.filter(pk__in=slot_keys(scope_for(library_id)))
+        .aggregate(**{name: Sum(name) for name in COUNTERS})
+    )
+
+
+async def aget_counters(library_id=None):
+    """``get_counters`` for async views."""
+    return _totals(
+        await LibraryStatistics.objects.filter(pk__in=slot_keys(scope_for(library_id)))
+        .aaggregate(**{name: Sum(name) for name in COUNTERS})
+    )
+
+
+def compute_counters():
+    """Recompute every counter row from the base tables."""
+    counters = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    counters[GLOBAL_SCOPE]["total_members"] = Member.objects.count()
+
+    for library_id, books in (
+        Book.objects.order_by().values_list("library_id").annotate(n=Count("pk"))
+    ):
+        for scope in {GLOBAL_SCOPE, scope_for(library_id)}:
+            counters[scope]["total_books"] += books
+
+    for library_id, total, active, late in (
+        Borrowing.objects.order_by()
+        .values_list("book__library_id")
+        .annotate(
+            total=Count("pk"),
+            active=Count("pk", filter=Q(return_date__isnull=True)),
+            late=Count("pk", filter=Q(return_date__gt=F("due_date"))),
+        )
+    ):
+        for scope in {GLOBAL_SCOPE, scope_for(library_id)}:
+            counters[scope]["total_borrowings"] += total
+            counters[scope]["currently_borrowed"] += active
+            counters[scope]["late_returns"] += late
+    return counters
+
+
+@transaction.atomic
+def reconcile(fix=True):
+    """
+    Compare stored counters with freshly computed ones.
+
+    Returns a list of ``(scope, counter, stored, actual)`` for every mismatch and,
+    when ``fix`` is true, rewrites the scope: the computed values in slot 0 and
+    zeros in the others. The counter rows are locked before the base tables are
+    read, so a loan committed in between cannot be overwritten: writers that
+    have not updated their slot yet wait for this transaction, and their
+    increments land on top of the repaired values.
+    """
+    stored = defaultdict(lambda: dict.fromkeys(COUNTERS, 0))
+    for row in LibraryStatistics.objects.select_for_update().order_by("scope").values("scope", *COUNTERS):
+        scope = scope_of(row.pop("scope"))
+        for name, value in row.items():
+            stored[scope][name] += value
+    actual = compute_counters()
+    drift = []
+    for scope in sorted(set(actual) | set(stored)):
+        expected = actual.get(scope, dict.fromkeys(COUNTERS, 0))
+        current = stored.get(scope, dict.fromkeys(COUNTERS, 0))
+        mismatched = [name for name in COUNTERS if current[name] != expected[name]]
+        drift.extend((scope, name, current[name], expected[name]) for name in mismatched)
+        if fix and (mismatched or scope not in stored):
+            LibraryStatistics.objects.filter(pk__in=slot_keys(scope)[1:]).update(
+                **dict.fromkeys(COUNTERS, 0)
+            )
+            LibraryStatistics.objects.update_or_create(scope=scope, defaults=expected)
+    return drift
@@ -0,0 +1,1363 @@
+import csv
+import gzip
+import io
+import json
+import os
+import random
+import tempfile
+import unittest
+from datetime import timedelta
+from decimal import Decimal
+from unittest import mock
+
+from asgiref.sync import sync_to_async
+from django.core.cache import cache
+from django.core.management import call_command
+from django.db import connection, transaction
+from django.db.models import F, Q
+from django.http import HttpResponse
+from django.test import RequestFactory, SimpleTestCase, TestCase, override_settings
+from django.test.utils import CaptureQueriesContext
+from django.utils import timezone
+from rest_framework.renderers import JSONRenderer
+
+from . import (
+    availability, benchmarks, exports, holds, idempotency, importer, metrics, overdue, ratings, recommendations,
+    renderers, rollups, search, stats, versions,
+)
+from .models import (
+    Author, Book, BookAuthor, BookSearchTerm, Borrowing, Category, Hold, IdempotencyRecord, Library,
+    LibraryStatistics, Member, OverdueSummary, Review,
+)
+from .routers import STICKY_COOKIE, ReplicaRouter, ReplicaRoutingMiddleware
+from .serializers import BookSerializer
+
+
+SEEK, INDEX_SCAN, TABLE_SCAN = "seek", "index scan", "table scan"
+MYSQL_SEEKS = {"system", "const", "eq_ref", "ref", "ref_or_null", "range", "index_merge"}
+
+
+def query_plan(sql, params=None):
+    """
+    ``({table: (access, index)}, sorted)`` for ``sql``. ``access`` is SEEK for
+    an index lookup or range, INDEX_SCAN for a walk of a whole index (cheap only
+    when it is ordered and limited, or covering) and TABLE_SCAN for a read of
+    every row; ``index`` is None for a table scan and "PRIMARY" for the primary
+    key. ``sorted`` is True if the rows are sorted after being read.
+    """
+    paths = {}
+    with connection.cursor() as cursor:
+        if connection.vendor == "sqlite":
+            cursor.execute(f"EXPLAIN QUERY PLAN {sql}", params)
+            details = [row[-1] for row in cursor.fetchall()]
+            for detail in details:
+                words = detail.split()
+                if words[0] not in ("SEARCH", "SCAN"):
+                    continue
+                if "PRIMARY" in words:
+                    index = "PRIMARY"
+                elif "INDEX" in words:
+                    index = words[words.index("INDEX") + 1]
+                else:
+                    index = None
+                access = SEEK if words[0] == "SEARCH" else INDEX_SCAN if index else TABLE_SCAN
+                paths[words[1]] = (access, index)
+            return paths, any(detail.startswith("USE TEMP B-TREE FOR ORDER BY") for detail in details)
+        if connection.vendor == "mysql":
+            cursor.execute(f"EXPLAIN FORMAT=JSON {sql}", params)
+            plan = json.loads(cursor.fetchone()[0])
+            sorts = []
+
+            def walk(node):
+                if isinstance(node, dict):
+                    if "table_name" in node and "access_type" in node:
+                        access = node["access_type"]
+                        access = SEEK if access in MYSQL_SEEKS else INDEX_SCAN if access == "index" else TABLE_SCAN
+                        paths[node["table_name"]] = (access, node.get("key"))
+                    if node.get("using_filesort"):
+                        sorts.append(node)
+                    for value in node.values():
+                        walk(value)
+                elif isinstance(node, list):
+                    for value in node:
+                        walk(value)
+
+            walk(plan)
+            return paths, bool(sorts)
+    raise unittest.SkipTest(f"No plan parser for {connection.vendor}")
+
+
+def count_queries(func, *args, **kwargs):
+    """``(result, statements run on the default database)`` for ``func(*args, **kwargs)``."""
+    statements = []
+
+    def count(execute, sql, params, many, context):
+        statements.append(sql)
+        return execute(sql, params, many, context)
+
+    with connection.execute_wrapper(count):
+        result = func(*args, **kwargs)
+    return result, len(statements)
+
+
+class QueryPlanTests(TestCase):
+    """
+    Captures the plan of each hot borrowing/review query and fails if the
+    database would answer it with a full table scan.
+    """
+
+    @classmethod
+    def setUpTestData(cls):
+        benchmarks.seed_catalog(300, members=100, seed=7)
+        rng = random.Random(7)
+        books = list(Book.objects.all())
+        members = list(Member.objects.all())
+        today = timezone.localdate()
+        loans, reviews, open_loans = [], [], set()
+        for i in range(3000):
+            borrow_date = today - timedelta(days=rng.randint(0, 365))
+            due_date = borrow_date + timedelta(days=14)
+            book, member = rng.choice(books), rng.choice(members)
+            # At most one open loan per (book, member): uq_borrowing_active_loan.
+            returned = rng.random() < 0.9 or (book.pk, member.pk) in open_loans
+            if not returned:
+                open_loans.add((book.pk, member.pk))
+            loans.append(Borrowing(
+                book=book, member=member,
+                borrow_date=borrow_date, due_date=due_date,
+                return_date=borrow_date + timedelta(days=rng.randint(1, 30)) if returned else None,
+            ))
+            reviews.append(Review(
+                book=rng.choice(books), member=rng.choice(members), rating=rng.randint(1, 5),
+                review_date=timezone.now() - timedelta(minutes=rng.randint(0, 10 ** 6)),
+            ))
+        Borrowing.objects.bulk_create(loans, batch_size=1000)
+        Review.objects.bulk_create(reviews, batch_size=1000)
+        with connection.cursor() as cursor:
+            if connection.vendor == "mysql":
+                cursor.execute("ANALYZE TABLE borrowing, review")
+            else:
+                cursor.execute("ANALYZE")
+        cls.book = books[0]
+        cls.member = members[0]
+
+    def assertPlan(self, queryset_or_sql, table, index, access=SEEK):
+        """``table`` is read through ``index`` with ``access``, and the rows come out in order."""
+        if isinstance(queryset_or_sql, str):
+            sql, params = queryset_or_sql, None
+        else:
+            sql, params = queryset_or_sql.query.sql_with_params()
+        paths, sorted_ = query_plan(sql, params)
+        self.assertEqual(paths.get(table), (access, index), msg=f"{sql}\n{paths}")
+        self.assertFalse(sorted_, msg=f"{sql} sorts its rows")
+
+    def test_member_history(self):
+        self.assertPlan(
+            Borrowing.objects.select_related("book", "member")
+            .filter(member_id=self.member.pk)
+            .order_by("-borrow_date", "-borrowing_id")[:50],
+            "borrowing", "ix_borrowing_member_date",
+        )
+
+    def test_active_loan_check(self):
+        self.assertPlan(
+            Borrowing.objects.filter(book=self.book, member=self.member, return_date__isnull=True)[:1],
+            "borrowing", "ix_borrowing_active_loan",
+        )
+
+    def test_currently_borrowed(self):
+        self.assertPlan(
+            Borrowing.objects.filter(return_date__isnull=True).values("pk"), "borrowing", "ix_borrowing_return_due"
+        )
+
+    def test_late_returns(self):
+        # Comparing two columns cannot seek: the best plan reads the whole
+        # (return_date, due_date) index and never the table.
+        self.assertPlan(
+            Borrowing.objects.filter(return_date__gt=F("due_date")).values("pk"),
+            "borrowing", "ix_borrowing_return_due", access=INDEX_SCAN,
+        )
+
+    def test_overdue_loans(self):
+        self.assertPlan(
+            Borrowing.objects.filter(return_date__isnull=True, due_date__lt=timezone.localdate()).values("pk"),
+            "borrowing", "ix_borrowing_return_due",
+        )
+
+    def test_overdue_pages(self):
+        last_due = timezone.localdate() - timedelta(days=60)
+        self.assertPlan(
+            Borrowing.objects.filter(return_date__isnull=True, due_date__lt=timezone.localdate())
+            .filter(Q(due_date__gt=last_due) | Q(due_date=last_due, borrowing_id__gt=100))
+            .order_by("due_date", "borrowing_id").values_list("due_date", "borrowing_id", "member_id")[:2000],
+            "borrowing", "ix_borrowing_return_due",
+        )
+
+    def test_top_rated_by_category(self):
+        self.assertPlan(
+            Book.objects.filter(category_id=self.book.category_id, rating_count__gte=1)
+            .order_by("-rating_avg", "-rating_count", "-book_id")[:10],
+            "book", "ix_book_category_rating",
+        )
+
+    def test_review_list_newest_first(self):
+        with CaptureQueriesContext(connection) as queries:
+            self.assertEqual(self.client.get("/reviews/", {"ordering": "-review_date"}).status_code, 200)
+        [sql] = [q["sql"] for q in queries if '"review"' in q["sql"] or "`review`" in q["sql"]]
+        # Newest first is an ordered walk of the index that stops after one page.
+        self.assertPlan(sql, "review", "ix_review_date", access=INDEX_SCAN)
+
+
+class SearchTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.fiction = Category.objects.create(name="Fiction")
+        cls.ocean = Author.objects.create(name="Ocean Vuong")
+        cls.exact = Book.objects.create(title="Sea", isbn="9780000000001", category=cls.fiction)
+        cls.prefix = Book.objects.create(title="Seashore", isbn="9780000000002", category=cls.fiction)
+        cls.by_author = Book.objects.create(title="Night Sky", isbn="9780000000003")
+        BookAuthor.objects.create(book=cls.by_author, author=cls.ocean)
+
+    def ranked(self, query):
+        return [row["book_id"] for row in search.search_books(query)]
+
+    def test_exact_matches_outrank_prefixes(self):
+        scores = {row["book_id"]: row["score"] for row in search.search_books("sea")}
+        self.assertEqual(scores, {self.exact.pk: 2 * search.FIELD_WEIGHTS["title"],
+                                  self.prefix.pk: search.FIELD_WEIGHTS["title"]})
+        self.assertEqual(self.ranked("sea"), [self.exact.pk, self.prefix.pk])
+
+    def test_field_weights(self):
+        titled = Book.objects.create(title="Ocean", isbn="9780000000004")
+        scores = {row["book_id"]: row["score"] for row in search.search_books("ocean")}
+        self.assertEqual(scores, {titled.pk: 2 * search.FIELD_WEIGHTS["title"],
+                                  self.by_author.pk: 2 * search.FIELD_WEIGHTS["author"]})
+        self.assertEqual(self.ranked("9780000000001 fiction"), [self.exact.pk])
+
+    def test_every_token_must_match(self):
+        self.assertEqual(self.ranked("fiction sea"), [self.exact.pk, self.prefix.pk])
+        self.assertEqual(self.ranked("fiction night"), [])
+        self.assertEqual(self.ranked("   "), [])
+
+    def test_only_the_last_token_matches_by_prefix(self):
+        self.assertEqual(self.ranked("fiction seash"), [self.prefix.pk])
+        self.assertEqual(self.ranked("fict sea"), [])
+        self.assertEqual(self.ranked("97800000000"), [self.exact.pk, self.prefix.pk, self.by_author.pk])
+
+    def test_view_returns_scored_books(self):
+        response = self.client.get("/api/books/search/", {"q": "sea"})
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual([(row["book_id"], row["score"]) for row in response.json()["results"]],
+                         [(self.exact.pk, 6), (self.prefix.pk, 3)])
+
+    def test_author_changes_reindex_their_books(self):
+        self.ocean.name = "Tide Writer"
+        self.ocean.save()
+        self.assertEqual(self.ranked("ocean"), [])
+        self.assertEqual(self.ranked("tide"), [self.by_author.pk])
+
+    def test_category_changes_reindex_their_books(self):
+        self.fiction.name = "Novels"
+        self.fiction.save()
+        self.assertEqual(self.ranked("fiction"), [])
+        self.assertEqual(self.ranked("novels"), [self.exact.pk, self.prefix.pk])
+
+    def test_book_author_links_reindex_the_book(self):
+        link = BookAuthor.objects.create(book=self.exact, author=self.ocean)
+        self.assertEqual(self.ranked("vuong"), [self.exact.pk, self.by_author.pk])
+        link.delete()
+        self.assertEqual(self.ranked("vuong"), [self.by_author.pk])
+        self.prefix.authors.add(self.ocean)
+        self.assertEqual(self.ranked("vuong"), [self.prefix.pk, self.by_author.pk])
+
+    def test_rebuild_command(self):
+        BookSearchTerm.objects.filter(book=self.prefix).delete()
+        BookSearchTerm.objects.filter(book=self.exact).update(weight=99)
+        expected = set(BookSearchTerm.objects.exclude(book=self.exact).values_list("book_id", "term", "weight"))
+
+        out = io.StringIO()
+        call_command("rebuild_search_index", "--batch-size", "2", stdout=out)
+        terms = BookSearchTerm.objects.count()
+        self.assertIn(f"Indexed 3 books ({terms} terms).", out.getvalue())
+        self.assertEqual(self.ranked("sea"), [self.exact.pk, self.prefix.pk])
+        self.assertFalse(BookSearchTerm.objects.filter(weight=99).exists())
+        self.assertLessEqual(expected, set(BookSearchTerm.objects.values_list("book_id", "term", "weight")))
+
+    def test_rebuild_keeps_other_books_searchable(self):
+        seen = []
+        reindex_books = search.reindex_books
+
+        def reindex_batch(ids):
+            # Books outside the batch being rebuilt must stay in the index.
+            seen.append(self.ranked("night"))
+            return reindex_books(ids)
+
+        with mock.patch.object(search, "reindex_books", reindex_batch):
+            search.rebuild_index(batch_size=1)
+        self.assertEqual(seen, [[self.by_author.pk]] * 3)
+
+
+class KeysetPaginationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"97803064{i:05d}", total_copies=i % 3,
+                                available_copies=0, published_year=str(2000 + i % 4))
+            for i in range(12)
+        ]
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(9)]
+        today = timezone.localdate()
+        for i, member in enumerate(cls.members):
+            # Three open loans (NULL return_date) and pairs of equal dates.
+            returned = None if i % 3 == 0 else today - timedelta(days=i // 2)
+            Borrowing.objects.create(book=cls.books[0], member=member, borrow_date=today - timedelta(days=30),
+                                     due_date=today, return_date=returned)
+
+    def assertWalks(self, path, expected, **params):
+        key = "borrowing_id" if path.startswith("/borrowings/") else "book_id"
+        forward, responses, url = [], [], path
+        while url:
+            response = self.client.get(url, params if url == path else None).json()
+            responses.append(response)
+            forward.extend(row[key] for row in response["results"])
+            url = response["next"]
+        self.assertEqual(forward, expected)
+        self.assertIsNone(responses[0]["previous"])
+
+        # Back from the last page to the first, page by page.
+        backward, url = [], responses[-1]["previous"]
+        while url:
+            response = self.client.get(url).json()
+            backward[:0] = [row[key] for row in response["results"]]
+            url = response["previous"]
+        self.assertEqual(backward + [row[key] for row in responses[-1]["results"]], expected)
+        return len(responses)
+
+    def test_walk_matches_the_unpaginated_order(self):
+        expected = [book.pk for book in self.books]
+        self.assertEqual(self.assertWalks("/books/", expected, page_size=5), 3)
+
+    def test_nullable_key(self):
+        loans = Borrowing.objects.all()
+        returned = sorted((b for b in loans if b.return_date), key=lambda b: (b.return_date, b.pk), reverse=True)
+        open_loans = sorted((b for b in loans if not b.return_date), key=lambda b: b.pk, reverse=True)
+        expected = [b.pk for b in returned + open_loans]
+        self.assertWalks("/borrowings/", expected, ordering="-return_date", page_size=2)
+        self.assertWalks("/borrowings/", expected[::-1], ordering="return_date", page_size=2)
+
+    def test_several_keys_with_ties(self):
+        expected = [
+            book.pk for book in sorted(self.books, key=lambda b: (-b.total_copies, b.published_year, -b.pk))
+        ]
+        self.assertWalks("/books/", expected, ordering="-total_copies,published_year", page_size=4)
+
+    def test_page_size_is_clamped(self):
+        sizes = [len(self.client.get("/books/", {"page_size": size}).json()["results"]) for size in (0, 3, 10 ** 6)]
+        self.assertEqual(sizes, [1, 3, 12])
+        self.assertEqual(len(self.client.get("/books/", {"page_size": "many"}).json()["results"]), 12)
+
+    def test_malformed_cursor_is_not_found(self):
+        for cursor in ("garbage", "eyJ2IjpbMV19", "eyJ2IjpbImEiXSwiciI6MH0"):
+            self.assertEqual(self.client.get("/books/", {"cursor": cursor}).status_code, 404, cursor)
+
+    def test_deep_pages_do_not_use_offset(self):
+        url = self.client.get("/books/", {"page_size": 2}).json()["next"]
+        for _ in range(3):
+            url = self.client.get(url).json()["next"]
+        statements = []
+        with connection.execute_wrapper(lambda execute, sql, *args: statements.append(sql) or execute(sql, *args)):
+            response = self.client.get(url).json()
+        self.assertEqual([row["book_id"] for row in response["results"]], [self.books[8].pk, self.books[9].pk])
+        [page] = [sql for sql in statements if 'FROM "book"' in sql]
+        self.assertIn("LIMIT", page)
+        self.assertNotIn("OFFSET", page)
+
+
+class BookExpandTests(TestCase):
+    """``?expand=`` must cost the same number of queries for any page size."""
+
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Main")
+        category = Category.objects.create(name="Fiction")
+        Author.objects.bulk_create([Author(name=f"Author {i}") for i in range(10)])
+        authors = list(Author.objects.order_by("author_id"))
+        Book.objects.bulk_create([
+            Book(title=f"Book {i}", isbn=f"{9780000000000 + i}", total_copies=1, available_copies=1,
+                 category=category, library=library)
+            for i in range(40)
+        ])
+        BookAuthor.objects.bulk_create([
+            BookAuthor(book=book, author=authors[(book.pk + offset) % len(authors)])
+            for book in Book.objects.all()
+            for offset in (0, 1)
+        ])
+        cls.book = Book.objects.order_by("book_id").first()
+
+    def list_books(self, page_size):
+        return self.client.get("/books/", {"expand": "authors,category,library", "page_size": page_size})
+
+    def test_list_query_count_is_independent_of_page_size(self):
+        # The table versions for the ETag, the page (category and library joined), the authors.
+        with self.assertNumQueries(3):
+            small = self.list_books(2)
+        with self.assertNumQueries(3):
+            large = self.list_books(40)
+        self.assertEqual(len(small.json()["results"]), 2)
+        self.assertEqual(len(large.json()["results"]), 40)
+
+    def test_expanded_payload(self):
+        with self.assertNumQueries(3):
+            response = self.client.get(f"/books/{self.book.pk}/", {"expand": "authors,category,library"})
+        data = response.json()
+        expected = list(self.book.authors.order_by("author_id").values("author_id", "name"))
+        self.assertEqual(data["authors"], expected)
+        self.assertEqual(data["category"], {"category_id": self.book.category_id, "name": "Fiction"})
+        self.assertEqual(data["library"], {"library_id": self.book.library_id, "name": "Main"})
+
+    def test_without_expand(self):
+        data = self.client.get(f"/books/{self.book.pk}/").json()
+        self.assertNotIn("authors", data)
+        self.assertEqual(data["category"], self.book.category_id)
+
+    def test_unknown_expand(self):
+        response = self.client.get("/books/", {"expand": "reviews"})
+        self.assertEqual(response.status_code, 400)
+
+
+class ConditionalGetTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Main")
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=1, available_copies=1,
+                                       library=library)
+
+    def test_not_modified_skips_the_queryset(self):
+        etag = self.client.get("/books/")["ETag"]
+        with self.assertNumQueries(1):
+            response = self.client.get("/books/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 304)
+
+    def test_write_changes_etag(self):
+        etag = self.client.get(f"/books/{self.book.pk}/")["ETag"]
+        with self.captureOnCommitCallbacks(execute=True):
+            self.client.patch(f"/books/{self.book.pk}/", {"title": "Renamed"}, content_type="application/json")
+        response = self.client.get(f"/books/{self.book.pk}/", HTTP_IF_NONE_MATCH=etag)
+        self.assertEqual(response.status_code, 200)
+        self.assertNotEqual(response["ETag"], etag)
+        self.assertEqual(response.json()["title"], "Renamed")
+
+
+class ValuesListTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Main")
+        category = Category.objects.create(name="Fiction")
+        Book.objects.create(title="Ünïcode", isbn="9780306406157", published_year=1999, total_copies=2,
+                            available_copies=1, category=category, library=library, rating_count=2,
+                            rating_sum=7, rating_avg="3.50")
+        Book.objects.create(title="Bare", isbn="9780306406158", total_copies=1, available_copies=1)
+
+    def test_list_matches_serializer(self):
+        response = self.client.get("/books/")
+        expected = BookSerializer(Book.objects.order_by("book_id"), many=True).data
+        self.assertEqual(response.content, JSONRenderer().render({"next": None, "previous": None, "results": expected}))
+
+
+class FastJSONRendererTests(SimpleTestCase):
+    def test_same_bytes_as_json_renderer(self):
+        if renderers.orjson is None:
+            self.skipTest("orjson is not installed")
+        now = timezone.now()
+        cases = [
+            {"title": "Line\u2028break\u2029", "price": Decimal("3.50"), "when": now, "day": now.date(),
+             "ids": [1, None]},
+            {"big": 2 ** 70, "nested": {1: "int key"}},
+            [],
+        ]
+        for data in cases:
+            with self.subTest(data=data):
+                self.assertEqual(renderers.FastJSONRenderer().render(data), JSONRenderer().render(data))
+
+
+class AsyncViewTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        library = Library.objects.create(name="Main")
+        Book.objects.bulk_create([
+            Book(title=f"River Stone {i}", isbn=f"{9780000000000 + i}", total_copies=1, available_copies=1,
+                 library=library)
+            for i in range(8)
+        ])
+        search.rebuild_index()
+
+    async def test_search_matches_sync_view(self):
+        cases = (("q=river&page_size=3&page=2", 3), ("q=river&page=last&page_size=3", 2), ("q=river&page=9", None))
+        for query, count in cases:
+            with self.subTest(query=query):
+                expected = await sync_to_async(self.client.get)(f"/api/books/search/?{query}")
+                response = await self.async_client.get(f"/api/async/books/search/?{query}")
+                self.assertEqual(response.status_code, expected.status_code)
+                self.assertEqual(response.content.replace(b"/api/async/", b"/api/"), expected.content)
+                if count is not None:
+                    self.assertEqual(len(json.loads(response.content)["results"]), count)
+
+    async def test_availability_batch_matches_sync_view(self):
+        book_ids = [pk async for pk in Book.objects.order_by("book_id").values_list("book_id", flat=True)]
+        too_many = ",".join(str(i) for i in range(1, availability.MAX_BATCH_IDS + 2))
+        cases = (f"{book_ids[1]},{book_ids[0]},{book_ids[1]},999999", "", "1,x", too_many)
+        for ids in cases:
+            with self.subTest(ids=ids[:20]):
+                expected = await sync_to_async(self.client.get)("/api/books/availability/", {"ids": ids})
+                response = await self.async_client.get("/api/async/books/availability/", {"ids": ids})
+                self.assertEqual((response.status_code, response.content), (expected.status_code, expected.content))
+        self.assertEqual(json.loads(response.content)["error"], f"At most {availability.MAX_BATCH_IDS} ids per request")
+        response = await self.async_client.get("/api/async/books/availability/", {"ids": cases[0]})
+        self.assertEqual(json.loads(response.content), {
+            "results": {str(pk): {"available": True, "available_copies": 1} for pk in (book_ids[1], book_ids[0])},
+            "missing": [999999],
+        })
+
+
+@override_settings(LIBRARY_REPLICAS=["replica"])
+class ReplicaRoutingTests(SimpleTestCase):
+    def request(self, method, **cookies):
+        seen = {}
+
+        def view(request):
+            seen["alias"] = ReplicaRouter().db_for_read(Book)
+            return HttpResponse()
+
+        request = getattr(RequestFactory(), method)("/books/")
+        request.COOKIES.update(cookies)
+        response = ReplicaRoutingMiddleware(view)(request)
+        return seen["alias"], response
+
+    def test_safe_requests_read_from_replica(self):
+        alias, response = self.request("get")
+        self.assertEqual(alias, "replica")
+        self.assertNotIn(STICKY_COOKIE, response.cookies)
+
+    def test_writes_stick_to_primary(self):
+        alias, response = self.request("post")
+        self.assertEqual(alias, "default")
+        self.assertIn(STICKY_COOKIE, response.cookies)
+        alias, _ = self.request("get", **{STICKY_COOKIE: "1"})
+        self.assertEqual(alias, "default")
+
+    def test_outside_requests_read_from_primary(self):
+        self.assertEqual(ReplicaRouter().db_for_read(Book), "default")
+        self.assertEqual(ReplicaRouter().db_for_write(Book), "default")
+
+
+@override_settings(LIBRARY_BORROW_STRATEGY="optimistic")
+class OptimisticLoanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=1, available_copies=1)
+        # Book and member ids must differ for BorrowRequestSerializer.
+        Member.objects.create(name="Filler", member_type="Student")
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(3)]
+
+    def borrow(self, member):
+        return self.client.post("/api/borrow/", {"book_id": self.book.pk, "member_id": member.pk},
+                                content_type="application/json")
+
+    def test_borrow_and_return(self):
+        response = self.borrow(self.members[0])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["available_copies"], 0)
+        self.assertEqual(self.borrow(self.members[1]).json(), {"error": "Book not available"})
+
+        borrowing_id = response.json()["borrowing"]["borrowing_id"]
+        response = self.client.post("/api/return/", {"borrowing_id": borrowing_id}, content_type="application/json")
+        self.assertEqual(response.json()["available_copies"], 1)
+        response = self.client.post("/api/return/", {"borrowing_id": borrowing_id}, content_type="application/json")
+        self.assertEqual(response.json(), {"error": "No active borrowing found"})
+
+    def test_second_open_loan_is_rejected_by_the_constraint(self):
+        Book.objects.filter(pk=self.book.pk).update(total_copies=2, available_copies=2)
+        self.assertEqual(self.borrow(self.members[0]).status_code, 201)
+        response = self.borrow(self.members[0])
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already borrowed", response.json()["error"])
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 1)
+        self.assertEqual(Borrowing.objects.filter(member=self.members[0]).count(), 1)
+
+    def test_borrowings_endpoint_rejects_a_second_open_loan(self):
+        body = {"book": self.book.pk, "member": self.members[0].pk, "borrow_date": "2026-01-01"}
+        self.assertEqual(self.client.post("/borrowings/", body, content_type="application/json").status_code, 201)
+        response = self.client.post("/borrowings/", body, content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertIn("already borrowed", str(response.json()))
+
+        returned = self.client.post("/borrowings/", {**body, "return_date": "2026-01-05"},
+                                    content_type="application/json")
+        self.assertEqual(returned.status_code, 201)
+        response = self.client.patch(f"/borrowings/{returned.json()['borrowing_id']}/", {"return_date": None},
+                                     content_type="application/json")
+        self.assertEqual(response.status_code, 400)
+        self.assertEqual(Borrowing.objects.filter(return_date__isnull=True).count(), 1)
+
+
+
+class HoldTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=1, available_copies=1)
+        Member.objects.create(name="Filler", member_type="Student")
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(3)]
+
+    def post(self, path, body):
+        return self.client.post(path, body, content_type="application/json")
+
+    def borrow(self, member):
+        return self.post("/api/borrow/", {"book_id": self.book.pk, "member_id": member.pk})
+
+    def hold(self, member):
+        return Hold.objects.get(pk=self.post("/api/holds/", {"book_id": self.book.pk, "member_id": member.pk})
+                                .json()["hold_id"])
+
+    def available(self):
+        return Book.objects.get(pk=self.book.pk).available_copies
+
+    def queue(self):
+        """Borrow the only copy for member 0 and queue members 1 and 2 behind it."""
+        borrowing_id = self.borrow(self.members[0]).json()["borrowing"]["borrowing_id"]
+        return borrowing_id, self.hold(self.members[1]), self.hold(self.members[2])
+
+    def assert_ready_hold_is_collected(self):
+        borrowing_id, first, second = self.queue()
+        response = self.post("/api/return/", {"borrowing_id": borrowing_id})
+        self.assertTrue(response.json()["reserved_for_hold"])
+        self.assertEqual(response.json()["available_copies"], 0)
+        self.assertEqual(Hold.objects.get(pk=first.pk).status, Hold.READY)
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, Hold.WAITING)
+
+        self.assertEqual(self.borrow(self.members[2]).json(), {"error": "Book not available"})
+        response = self.borrow(self.members[1])
+        self.assertEqual(response.status_code, 201)
+        self.assertEqual(response.json()["available_copies"], 0)
+        self.assertFalse(Hold.objects.filter(pk=first.pk).exists())
+        self.assertEqual(self.available(), 0)
+
+    def test_returned_copy_goes_to_the_earliest_hold(self):
+        self.assert_ready_hold_is_collected()
+
+    @override_settings(LIBRARY_BORROW_STRATEGY="optimistic")
+    def test_returned_copy_goes_to_the_earliest_hold_optimistic(self):
+        self.assert_ready_hold_is_collected()
+
+    def test_bulk_borrow_collects_a_ready_hold(self):
+        borrowing_id, first, _ = self.queue()
+        self.post("/api/return/", {"borrowing_id": borrowing_id})
+        items = [{"book_id": self.book.pk, "member_id": member.pk} for member in self.members[1:]]
+        results = self.post("/api/borrow/bulk/", {"items": items}).json()["results"]
+        self.assertEqual([r["ok"] for r in results], [True, False])
+        self.assertEqual(results[1]["error"], "Book not available")
+        self.assertFalse(Hold.objects.filter(pk=first.pk).exists())
+        self.assertEqual(self.available(), 0)
+
+    def test_cancelling_a_ready_hold_passes_the_copy_on(self):
+        borrowing_id, first, second = self.queue()
+        self.post("/api/return/", {"borrowing_id": borrowing_id})
+        self.assertEqual(self.client.delete(f"/api/holds/{first.pk}/").status_code, 204)
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, Hold.READY)
+        self.assertEqual(self.available(), 0)
+        self.client.delete(f"/api/holds/{second.pk}/")
+        self.assertEqual(self.available(), 1)
+
+    def test_expire_ready_holds(self):
+        borrowing_id, first, second = self.queue()
+        self.post("/api/return/", {"borrowing_id": borrowing_id})
+        self.assertEqual(holds.expire_ready_holds(), 0)
+        later = timezone.now() + holds.PICKUP_PERIOD + timedelta(hours=1)
+        self.assertEqual(holds.expire_ready_holds(now=later), 1)
+        self.assertFalse(Hold.objects.filter(pk=first.pk).exists())
+        self.assertEqual(Hold.objects.get(pk=second.pk).status, Hold.READY)
+        self.assertEqual(self.available(), 0)
+
+    def test_queue_positions(self):
+        _, first, second = self.queue()
+        with self.assertNumQueries(1):
+            self.assertEqual(holds.queue_position(second), 2)
+        with self.assertNumQueries(1):
+            self.assertEqual(self.client.get(f"/api/members/{self.members[2].pk}/holds/").json()[0]["queue_position"], 2)
+        with self.assertNumQueries(1):
+            positions = [hold.queue_position for hold in holds.member_holds(self.members[1].pk)]
+        self.assertEqual(positions, [1])
+
+class BulkLoanTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"97803064{i:05d}", total_copies=1, available_copies=1)
+            for i in range(20)
+        ]
+        # Bulk items reject a member id equal to the book id.
+        last_book = max(book.pk for book in cls.books)
+        cls.members = []
+        while len(cls.members) < 3:
+            member = Member.objects.create(name="Member", member_type="Student")
+            if member.pk > last_book:
+                cls.members.append(member)
+
+    def post(self, path, pairs):
+        items = [{"book_id": book.pk, "member_id": member.pk} for book, member in pairs]
+        return self.client.post(path, {"items": items}, content_type="application/json")
+
+    def bulk_return_with_holds(self, size):
+        books = self.books[:size]
+        self.post("/api/borrow/bulk/", [(book, self.members[0]) for book in books])
+        for book in Book.objects.filter(pk__in=[book.pk for book in books]):
+            holds.place_hold(book, self.members[1])
+            holds.place_hold(book, self.members[2])
+        response, queries = count_queries(
+            self.post, "/api/return/bulk/", [(book, self.members[0]) for book in books]
+        )
+        self.assertEqual(response.status_code, 200)
+        self.assertEqual(
+            Hold.objects.filter(book__in=books, status=Hold.READY).count(), size
+        )
+        self.assertFalse(Hold.objects.filter(book__in=books, member=self.members[1], status=Hold.WAITING).exists())
+        self.assertEqual(Book.objects.filter(pk__in=[b.pk for b in books], available_copies=0).count(), size)
+        return queries
+
+    def available(self, book):
+        return Book.objects.values_list("available_copies", flat=True).get(pk=book.pk)
+
+    def test_bulk_borrow_reports_each_item(self):
+        book, other = self.books[0], self.books[1]
+        Book.objects.filter(pk=other.pk).update(total_copies=3, available_copies=3)
+        before = stats.get_counters()
+        response = self.post("/api/borrow/bulk/", [
+            (book, self.members[0]),
+            (book, self.members[1]),
+            (Book(pk=999999), self.members[0]),
+            (other, Member(pk=999998)),
+            (other, self.members[0]),
+            (other, self.members[0]),
+        ])
+        self.assertEqual(response.status_code, 207)
+        results = response.json()["results"]
+        self.assertEqual([r["index"] for r in results], list(range(6)))
+        self.assertEqual([r["ok"] for r in results], [True, False, False, False, True, False])
+        self.assertEqual(
+            [r.get("error") for r in results],
+            [None, "Book not available", "Book not found", "Member not found", None,
+             "This member already borrowed this book and has not returned it."],
+        )
+        self.assertEqual((results[0]["available_copies"], results[4]["available_copies"]), (0, 2))
+        self.assertEqual(results[4]["borrowing"]["due_date"],
+                         (timezone.localdate() + timedelta(days=14)).isoformat())
+        self.assertEqual((self.available(book), self.available(other)), (0, 2))
+        after = stats.get_counters()
+        self.assertEqual(after["total_borrowings"] - before["total_borrowings"], 2)
+        self.assertEqual(after["currently_borrowed"] - before["currently_borrowed"], 2)
+        self.assertEqual(stats.reconcile(fix=False), [])
+
+        # A loan already open before the batch is a duplicate too.
+        response = self.post("/api/borrow/bulk/", [(other, self.members[0]), (other, self.members[1])])
+        self.assertEqual([r["ok"] for r in response.json()["results"]], [False, True])
+
+    def test_bulk_return(self):
+        book = self.books[0]
+        self.post("/api/borrow/bulk/", [(book, self.members[0])])
+        Borrowing.objects.filter(book=book).update(due_date=timezone.localdate() - timedelta(days=3))
+        before = stats.get_counters()
+        response = self.post("/api/return/bulk/", [(book, self.members[0]), (book, self.members[1])])
+        self.assertEqual(response.status_code, 207)
+        returned, missing = response.json()["results"]
+        self.assertEqual((returned["ok"], returned["late_days"], returned["available_copies"]), (True, 3, 1))
+        self.assertEqual(returned["borrowing"]["return_date"], timezone.localdate().isoformat())
+        self.assertEqual(missing["error"], "No active borrowing found")
+        self.assertEqual(self.available(book), 1)
+        after = stats.get_counters()
+        self.assertEqual(after["currently_borrowed"] - before["currently_borrowed"], -1)
+        self.assertEqual(after["late_returns"] - before["late_returns"], 1)
+        self.assertEqual(stats.reconcile(fix=False), [])
+
+        response = self.post("/api/return/bulk/", [(book, self.members[0])])
+        self.assertEqual(response.json()["results"][0]["error"], "No active borrowing found")
+
+    def bulk_queries(self, size):
+        pairs = [(book, self.members[0]) for book in self.books[:size]]
+        borrowed, borrow_queries = count_queries(self.post, "/api/borrow/bulk/", pairs)
+        returned, return_queries = count_queries(self.post, "/api/return/bulk/", pairs)
+        self.assertEqual((borrowed.status_code, returned.status_code), (200, 200))
+        return borrow_queries, return_queries
+
+    def test_batches_cost_a_fixed_number_of_queries(self):
+        with transaction.atomic():
+            small = self.bulk_queries(2)
+            transaction.set_rollback(True)
+        self.assertEqual(self.bulk_queries(20), small)
+
+    def test_bulk_return_hands_copies_to_holds_in_constant_queries(self):
+        with transaction.atomic():
+            small = self.bulk_return_with_holds(2)
+            transaction.set_rollback(True)
+        self.assertEqual(self.bulk_return_with_holds(20), small)
+
+
+class IdempotencyTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=2, available_copies=2)
+        Member.objects.create(name="Filler", member_type="Student")
+        cls.member = Member.objects.create(name="Member", member_type="Student")
+
+    def borrow(self, key, member_id=None):
+        return self.client.post(
+            "/api/borrow/", {"book_id": self.book.pk, "member_id": member_id or self.member.pk},
+            content_type="application/json", headers={"Idempotency-Key": key},
+        )
+
+    def test_retry_replays_the_first_response(self):
+        first = self.borrow("kiosk-1")
+        self.assertEqual(first.status_code, 201)
+        with self.assertNumQueries(1):
+            retry = self.borrow("kiosk-1")
+        self.assertEqual(retry.status_code, 201)
+        self.assertEqual(retry.json(), first.json())
+        self.assertEqual(retry["Idempotent-Replayed"], "true")
+        self.assertEqual(Borrowing.objects.count(), 1)
+        self.assertEqual(Book.objects.get(pk=self.book.pk).available_copies, 1)
+
+    def test_key_reused_for_another_request(self):
+        self.borrow("kiosk-1")
+        other = Member.objects.create(name="Other", member_type="Student")
+        response = self.borrow("kiosk-1", member_id=other.pk)
+        self.assertEqual(response.status_code, 422)
+        self.assertEqual(Borrowing.objects.count(), 1)
+
+    @override_settings(LIBRARY_IDEMPOTENCY_WAIT=0)
+    def test_duplicate_of_a_running_request(self):
+        now = timezone.now()
+        IdempotencyRecord.objects.create(
+            key="kiosk-1", path="/api/borrow/", created_at=now, expires_at=now + timedelta(days=1),
+            request_hash=idempotency.request_hash("POST", {"book_id": self.book.pk, "member_id": self.member.pk}),
+        )
+        self.assertEqual(self.borrow("kiosk-1").status_code, 409)
+        self.assertFalse(Borrowing.objects.exists())
+
+    def test_raised_client_errors_are_stored(self):
+        missing_book = {"book_id": 10 ** 6, "member_id": self.member.pk}
+        for key, data, code in (("kiosk-1", {}, 400), ("kiosk-2", missing_book, 404)):
+            with self.subTest(code=code):
+                first = self.client.post("/api/borrow/", data, content_type="application/json",
+                                         headers={"Idempotency-Key": key})
+                self.assertEqual(first.status_code, code)
+                self.assertEqual(IdempotencyRecord.objects.get(key=key).status_code, code)
+                retry = self.client.post("/api/borrow/", data, content_type="application/json",
+                                         headers={"Idempotency-Key": key})
+                self.assertEqual((retry.status_code, retry.json()), (code, first.json()))
+                self.assertEqual(retry["Idempotent-Replayed"], "true")
+
+    def test_unexpected_exception_releases_the_key(self):
+        with mock.patch.object(holds, "ready_hold", side_effect=RuntimeError), self.assertRaises(RuntimeError):
+            self.borrow("kiosk-1")
+        self.assertFalse(IdempotencyRecord.objects.exists())
+
+    def test_expired_record_is_not_replayed(self):
+        self.borrow("kiosk-1")
+        IdempotencyRecord.objects.update(expires_at=timezone.now() - timedelta(seconds=1))
+        Borrowing.objects.update(return_date=timezone.localdate())
+        response = self.borrow("kiosk-1")
+        self.assertEqual(response.status_code, 201)
+        self.assertFalse(response.has_header("Idempotent-Replayed"))
+        self.assertEqual(Borrowing.objects.count(), 2)
+        record = IdempotencyRecord.objects.get()
+        self.assertGreater(record.expires_at, timezone.now())
+        self.assertEqual(json.loads(record.response_body), response.json())
+
+    def test_purge_expired(self):
+        self.borrow("kiosk-1")
+        self.borrow("kiosk-2")
+        IdempotencyRecord.objects.filter(key="kiosk-1").update(expires_at=timezone.now() - timedelta(seconds=1))
+        self.assertEqual(idempotency.purge_expired(), 1)
+        self.assertEqual(list(IdempotencyRecord.objects.values_list("key", flat=True)), ["kiosk-2"])
+
+
+class RollupTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.libraries = [Library.objects.create(name=f"Library {i}") for i in range(2)]
+        cls.category = Category.objects.create(name="Fiction")
+        cls.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"97803064061{i:02d}", total_copies=5, available_copies=5,
+                                library=library, category=cls.category)
+            for i, library in enumerate(cls.libraries)
+        ]
+        cls.member = Member.objects.create(name="Member", member_type="Student")
+        cls.today = timezone.localdate()
+        cls.monday = cls.today - timedelta(days=cls.today.weekday() + 7)
+        for offset, book, returned_after in [(0, 0, 3), (0, 1, 20), (1, 0, None), (8, 1, None)]:
+            borrow_date = cls.monday + timedelta(days=offset)
+            Borrowing.objects.create(
+                book=cls.books[book], member=cls.member, borrow_date=borrow_date,
+                due_date=borrow_date + timedelta(days=14),
+                return_date=borrow_date + timedelta(days=returned_after) if returned_after else None,
+            )
+
+    def get(self, **params):
+        return self.client.get("/api/analytics/borrowings/", params)
+
+    def test_series_from_the_rollup(self):
+        rollups.catch_up()
+        monday = self.monday.isoformat()
+        response = self.get(start=monday, end=self.today.isoformat(), interval="week")
+        self.assertEqual(response.status_code, 200)
+        weeks = response.json()["results"]
+        self.assertEqual(weeks[0], {"period": monday, "borrowed": 3, "returned": 1, "late_returns": 0})
+        self.assertEqual(sum(week["borrowed"] for week in weeks), 4)
+
+        response = self.get(start=monday, end=monday, group_by="library")
+        self.assertEqual(
+            [(row["library"], row["borrowed"]) for row in response.json()["results"]],
+            [(self.libraries[0].pk, 1), (self.libraries[1].pk, 1)],
+        )
+        response = self.get(start=monday, end=self.today.isoformat(), library=self.libraries[1].pk)
+        self.assertEqual(sum(row["borrowed"] for row in response.json()["results"]), 2)
+
+    def test_catch_up_from_the_watermark(self):
+        rollups.catch_up()
+        loan = Borrowing.objects.get(borrow_date=self.monday + timedelta(days=1))
+        loan.due_date, loan.return_date = self.today - timedelta(days=1), self.today
+        loan.save()
+        result = rollups.catch_up(lookback_days=1)
+        self.assertEqual(result["start"], self.today - timedelta(days=1))
+        today = self.get(start=self.today.isoformat(), end=self.today.isoformat()).json()["results"]
+        self.assertEqual(today, [{"period": self.today.isoformat(), "borrowed": 0, "returned": 1, "late_returns": 1}])
+
+    def test_cost_does_not_depend_on_loans(self):
+        rollups.catch_up()
+        with self.assertNumQueries(2):  # watermark, series
+            self.get(start=(self.today - timedelta(days=365)).isoformat())
+
+    def test_bad_parameters(self):
+        self.assertEqual(self.get(start="2026-02-30").status_code, 400)
+        self.assertEqual(self.get(interval="month").status_code, 400)
+        self.assertEqual(self.get(start="2020-01-01", end="2026-01-01").status_code, 400)
+
+
+class RecommendationTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"97803064061{i:02d}", total_copies=9, available_copies=9)
+            for i in range(4)
+        ]
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(5)]
+        # Books 0 and 1 share three borrowers, 0 and 2 two, 0 and 3 one.
+        cls.loan([0, 1, 2], [0, 1, 2], [0, 1], [0, 3], [3])
+
+    @classmethod
+    def loan(cls, *histories, members=None):
+        today = timezone.localdate()
+        for member, books in zip(members or cls.members, histories):
+            for book in books:
+                Borrowing.objects.create(book=cls.books[book], member=member, borrow_date=today,
+                                         due_date=today, return_date=today)
+
+    def recommended(self, book):
+        response = self.client.get(f"/api/books/{self.books[book].pk}/recommendations/")
+        self.assertEqual(response.status_code, 200)
+        return [(row["book"]["book_id"], row["co_borrowers"]) for row in response.json()["results"]]
+
+    def test_full_build(self):
+        recommendations.build(full=True)
+        self.assertEqual(self.recommended(0), [(self.books[1].pk, 3), (self.books[2].pk, 2)])
+        self.assertEqual(self.recommended(3), [])
+        with self.assertNumQueries(1):
+            self.recommended(1)
+
+    def test_dict_and_sparse_counts_agree(self):
+        if recommendations.sparse is None:
+            self.skipTest("scipy is not installed")
+        histories = recommendations.load_histories(Borrowing.objects.all())
+        targets = {book.pk for book in self.books}
+        self.assertEqual(
+            {book: dict(counts) for book, counts in recommendations._co_counts_dict(histories, targets)},
+            dict(recommendations._co_counts_sparse(histories, targets)),
+        )
+
+    def test_incremental_refresh(self):
+        recommendations.build(full=True)
+        self.loan([2, 3], [2, 3], members=self.members[3:])
+        result = recommendations.build(full=False)
+        self.assertEqual(result["members"], 2)
+        self.assertEqual(self.recommended(3), [(self.books[2].pk, 2)])
+        rebuilt = recommendations.build(full=True)
+        self.assertEqual(self.recommended(3), [(self.books[2].pk, 2)])
+        self.assertLessEqual(result["books"], rebuilt["books"])
+
+
+class StatisticsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.library = Library.objects.create(name="Library")
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=3, available_copies=3,
+                                       library=cls.library)
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(3)]
+
+    def loan(self, member, slot):
+        stats._local.slot = slot
+        today = timezone.localdate()
+        return Borrowing.objects.create(book=self.book, member=member, borrow_date=today, due_date=today)
+
+    def tearDown(self):
+        stats._local.__dict__.clear()
+
+    def test_counters_are_summed_over_slots(self):
+        self.loan(self.members[1], 0)
+        self.loan(self.members[2], 5)
+        keys = set(LibraryStatistics.objects.values_list("scope", flat=True))
+        self.assertLessEqual({"all#5", f"library:{self.library.pk}#5"}, keys)
+        with self.assertNumQueries(1):
+            counters = stats.get_counters(self.library.pk)
+        self.assertEqual((counters["total_borrowings"], counters["currently_borrowed"]), (2, 2))
+        response = self.client.get("/api/stats/")
+        self.assertEqual((response.json()["total_borrowings"], response.json()["total_members"]), (2, 3))
+
+    def test_reconcile_rewrites_every_slot(self):
+        self.loan(self.members[1], 3)
+        LibraryStatistics.objects.filter(pk="all#3").update(total_borrowings=F("total_borrowings") + 7)
+        drift = stats.reconcile(fix=True)
+        self.assertIn(("all", "total_borrowings", 8, 1), drift)
+        self.assertEqual(stats.get_counters()["total_borrowings"], 1)
+        self.assertEqual(LibraryStatistics.objects.get(pk="all#3").total_borrowings, 0)
+        self.assertEqual(stats.reconcile(fix=False), [])
+
+
+class AvailabilityCacheTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.book = Book.objects.create(title="Book", isbn="9780306406157", total_copies=2, available_copies=2)
+
+    def setUp(self):
+        cache.clear()
+
+    def test_stale_write_after_invalidation_is_not_served(self):
+        self.assertEqual(availability.get_available_copies([self.book.pk]), {self.book.pk: 2})
+        cache.clear()
+        # A reader misses and reads 2; a borrow commits before it writes back.
+        generation = availability._generations([self.book.pk])[self.book.pk]
+        with self.captureOnCommitCallbacks(execute=True):
+            Book.objects.filter(pk=self.book.pk).update(available_copies=1)
+            availability.invalidate([self.book.pk])
+        cache.set(availability._key(self.book.pk, generation), 2)
+        self.assertEqual(availability.get_available_copies([self.book.pk]), {self.book.pk: 1})
+        self.assertEqual(availability.get_available_copies([self.book.pk]), {self.book.pk: 1})
+
+    def test_rolled_back_write_keeps_the_cached_count(self):
+        availability.get_available_copies([self.book.pk])
+        with self.captureOnCommitCallbacks(execute=False) as callbacks:
+            availability.invalidate([self.book.pk])
+        self.assertEqual(len(callbacks), 1)
+        hits = availability.counters()["hits"]
+        availability.get_available_copies([self.book.pk])
+        self.assertEqual(availability.counters()["hits"], hits + 1)
+
+    def test_category_id_update_reindexes(self):
+        category = Category.objects.create(name="Astronomy")
+        self.book.category_id = category.pk
+        self.book.save(update_fields=["category_id"])
+        self.assertEqual([row["book_id"] for row in search.search_books("astronomy")], [self.book.pk])
+
+
+@override_settings(LIBRARY_LATE_FEE_PER_DAY="0.25", LIBRARY_LATE_FEE_CAP="5.00")
+class OverdueTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.libraries = [Library.objects.create(name=f"Library {i}") for i in range(2)]
+        cls.books = [
+            Book.objects.create(title=f"Book {i}", isbn=f"978030640615{i}", total_copies=5, available_copies=5,
+                                library=cls.libraries[i % 2])
+            for i in range(3)
+        ]
+        cls.members = [Member.objects.create(name=f"Member {i}", member_type="Student") for i in range(2)]
+        cls.as_of = timezone.localdate()
+
+        def loan(book, member, late_days, returned=False):
+            due_date = cls.as_of - timedelta(days=late_days)
+            Borrowing.objects.create(book=book, member=member, borrow_date=due_date - timedelta(days=14),
+                                     due_date=due_date, return_date=cls.as_of if returned else None)
+
+        # Interleaved by member, so pages cut across members.
+        loan(cls.books[0], cls.members[0], 10)
+        loan(cls.books[0], cls.members[1], 3)
+        loan(cls.books[1], cls.members[0], 40)
+        loan(cls.books[2], cls.members[0], 4)
+        loan(cls.books[1], cls.members[1], 0)
+        loan(cls.books[2], cls.members[1], 30, returned=True)
+
+    def test_late_fee_is_capped_per_loan(self):
+        self.assertEqual(overdue.late_fee(10), Decimal("2.50"))
+        self.assertEqual(overdue.late_fee(20), Decimal("5.00"))
+        self.assertEqual(overdue.late_fee(40), Decimal("5.00"))
+        self.assertEqual(overdue.late_days(self.as_of, self.as_of), 0)
+
+    def test_summaries_per_member_and_library(self):
+        totals = overdue.compute_overdue(self.as_of, chunk_size=1)
+        self.assertEqual((totals["loans"], totals["rows"], totals["fees"]), (4, 3, Decimal("9.25")))
+        rows = {
+            (row.member_id, row.library_id): (row.overdue_loans, row.late_days, row.max_late_days, row.accrued_fee)
+            for row in OverdueSummary.objects.filter(as_of=self.as_of)
+        }
+        self.assertEqual(rows, {
+            (self.members[0].pk, self.libraries[0].pk): (2, 14, 10, Decimal("3.50")),
+            (self.members[0].pk, self.libraries[1].pk): (1, 40, 40, Decimal("5.00")),
+            (self.members[1].pk, self.libraries[0].pk): (1, 3, 3, Decimal("0.75")),
+        })
+        overdue.compute_overdue(self.as_of)
+        self.assertEqual(OverdueSummary.objects.filter(as_of=self.as_of).count(), 3)
+
+
+class MetricsTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [Book.objects.create(title=f"Book {i}", isbn=f"978030640615{i}") for i in range(4)]
+
+    def setUp(self):
+        metrics.REGISTRY.reset()
+
+    def scrape(self):
+        """``{"name{labels}": value}`` from ``/api/metrics/``."""
+        response = self.client.get("/api/metrics/")
+        self.assertEqual(response["Content-Type"], metrics.CONTENT_TYPE)
+        samples = {}
+        for line in response.content.decode().splitlines():
+            if not line.startswith("#"):
+                name, _, value = line.rpartition(" ")
+                samples[name] = float(value)
+        return samples
+
+    def test_requests_and_queries_are_counted_per_route(self):
+        queries = []
+        with connection.execute_wrapper(lambda execute, sql, *args: queries.append(sql) or execute(sql, *args)):
+            self.client.get("/books/")
+        self.client.get("/books/")
+        self.client.get("/books/999999/")
+        samples = self.scrape()
+        self.assertEqual(samples['library_http_requests_total{route="^books/$",method="GET",status="200"}'], 2)
+        self.assertEqual(
+            samples['library_http_requests_total{route="^books/(?P<pk>[^/.]+)/$",method="GET",status="404"}'], 1
+        )
+        self.assertEqual(
+            samples['library_sql_queries_total{route="^books/$",method="GET",alias="default"}'], 2 * len(queries)
+        )
+        self.assertEqual(
+            samples['library_http_request_duration_seconds_count{route="^books/$",method="GET"}'], 2
+        )
+
+    def test_latency_buckets_are_cumulative(self):
+        for seconds in (0.003, 0.03, 0.04, 20.0):
+            metrics.REGISTRY.observe("r", "GET", 200, seconds, [], 10)
+        samples = self.scrape()
+        bucket = 'library_http_request_duration_seconds_bucket{{route="r",method="GET",le="{}"}}'
+        self.assertEqual(samples[bucket.format(0.005)], 1)
+        self.assertEqual(samples[bucket.format(0.025)], 1)
+        self.assertEqual(samples[bucket.format(0.05)], 3)
+        self.assertEqual(samples[bucket.format(10.0)], 3)
+        self.assertEqual(samples[bucket.format("+Inf")], 4)
+        self.assertAlmostEqual(samples['library_http_request_duration_seconds_sum{route="r",method="GET"}'], 20.073)
+
+    @override_settings(LIBRARY_N_PLUS_ONE_THRESHOLD=3)
+    def test_repeated_sql_shape_is_reported_once_per_route(self):
+        def n_plus_one(request, size):
+            for n in range(2, 2 + size):
+                list(Book.objects.filter(pk__in=[book.pk for book in self.books[:n]]))
+            return HttpResponse()
+
+        request = RequestFactory().get("/")
+        with self.assertLogs("library.metrics", "WARNING") as logs:
+            metrics.MetricsMiddleware(lambda r: n_plus_one(r, 3))(request)
+            metrics.MetricsMiddleware(lambda r: n_plus_one(r, 3))(request)
+            metrics.MetricsMiddleware(lambda r: n_plus_one(r, 2))(request)
+        self.assertEqual(len(logs.records), 1)
+        self.assertIn("3 x", logs.output[0])
+        self.assertEqual(self.scrape()['library_n_plus_one_requests_total{route="<unmatched>"}'], 2)
+
+    def test_sql_shape_collapses_placeholder_lists(self):
+        self.assertEqual(
+            metrics.sql_shape('SELECT * FROM "book" WHERE "book_id" IN (%s, %s, %s)'),
+            'SELECT * FROM "book" WHERE "book_id" IN (%s, ...)',
+        )
+        self.assertEqual(
+            metrics.sql_shape('INSERT INTO "hold" ("a", "b") VALUES (%s, %s), (%s, %s), (%s, %s)'),
+            'INSERT INTO "hold" ("a", "b") VALUES (%s, ...), ...',
+        )
+        self.assertEqual(metrics.sql_shape('SELECT 1 WHERE "a" IN (%s)'), 'SELECT 1 WHERE "a" IN (%s)')
+
+
+class ExportTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.category = Category.objects.create(name="Poetry")
+        cls.books = [
+            Book.objects.create(title=f'Book "{i}", vol. {i}', isbn=f"978030640615{i}", total_copies=i,
+                                available_copies=i, category=cls.category if i % 2 else None)
+            for i in range(5)
+        ]
+
+    def export(self, **params):
+        response = self.client.get("/books/export/", params)
+        self.assertEqual(response.status_code, 200)
+        self.assertTrue(response.streaming)
+        return response, b"".join(response.streaming_content)
+
+    def test_csv_has_a_header_and_every_row_in_key_order(self):
+        response, body = self.export()
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="book.csv"')
+        rows = list(csv.DictReader(io.StringIO(body.decode())))
+        self.assertEqual([int(row["book_id"]) for row in rows], [book.pk for book in self.books])
+        self.assertEqual(rows[1]["title"], 'Book "1", vol. 1')
+        self.assertEqual((rows[0]["category"], rows[1]["category"]), ("", str(self.category.pk)))
+
+    def test_ndjson_applies_the_list_filters(self):
+        response, body = self.export(type="ndjson", category=self.category.pk, ordering="-book_id")
+        self.assertEqual(response["Content-Type"], exports.FORMATS["ndjson"])
+        rows = [json.loads(line) for line in body.decode().splitlines()]
+        self.assertEqual([row["book_id"] for row in rows], [self.books[1].pk, self.books[3].pk])
+        self.assertEqual(rows[0]["total_copies"], 1)
+
+    def test_gzip(self):
+        response, body = self.export(type="ndjson", gzip="true")
+        self.assertEqual(response["Content-Disposition"], 'attachment; filename="book.ndjson.gz"')
+        self.assertEqual(len(gzip.decompress(body).decode().splitlines()), 5)
+
+    def test_unknown_type_is_rejected(self):
+        self.assertEqual(self.client.get("/books/export/", {"type": "xml"}).status_code, 400)
+
+    def test_rows_are_read_in_key_pages(self):
+        queryset = Book.objects.filter(total_copies__gte=1)
+        with self.assertNumQueries(3):
+            rows = list(exports.iter_rows(queryset, ["isbn"], chunk_size=2))
+        self.assertEqual(rows, [(book.isbn,) for book in self.books[1:]])
+
+
+class ImporterTests(TestCase):
+    def rows(self, *rows):
+        catalog = importer.CatalogImporter(batch_size=2)
+        with self.captureOnCommitCallbacks(execute=True):
+            for line, row in enumerate(rows, 1):
+                catalog.add(line, row)
+            catalog.finish()
+        return catalog
+
+    def test_invalid_rows_are_reported_and_skipped(self):
+        next_year = str(timezone.localdate().year + 1)
+        catalog = self.rows(
+            {"title": "Good", "isbn": "9780306406157", "total_copies": "2"},
+            {"title": "", "isbn": "9780306406158"},
+            {"title": "Short ISBN", "isbn": "12345"},
+            {"title": "Future", "isbn": "9780306406159", "published_year": next_year},
+            {"title": "Too many", "isbn": "9780306406160", "total_copies": 1, "available_copies": 2},
+            {"title": "Negative", "isbn": "9780306406161", "total_copies": -1},
+            {"title": "Not a number", "isbn": "9780306406162", "total_copies": "two"},
+            {"title": "Long name", "isbn": "9780306406163", "category": "x" * 101},
+            {"title": "Again", "isbn": "9780306406157"},
+            None,
+        )
+        self.assertEqual((catalog.counts["rows"], catalog.counts["skipped"], catalog.counts["books_created"]),
+                         (10, 9, 1))
+        reasons = dict(catalog.errors)
+        self.assertIn("title", reasons[2])
+        self.assertIn("13 digits", reasons[3])
+        self.assertIn("published_year", reasons[4])
+        self.assertIn("cannot exceed", reasons[5])
+        self.assertIn("total_copies", reasons[6])
+        self.assertIn("integer", reasons[7])
+        self.assertIn("category", reasons[8])
+        self.assertIn("appears earlier", reasons[9])
+        self.assertIn("JSON object", reasons[10])
+        self.assertEqual(Book.objects.get().available_copies, 2)
+
+    def test_search_stats_and_versions_are_kept_up(self):
+        before = versions.current(["book"]).get("book", (0, None))[0]
+        self.rows(
+            {"title": "Quiet Rivers", "isbn": "9780306406157", "authors": ["Ada Lovelace"],
+             "category": "Travel", "library": "Main", "total_copies": 1},
+            {"title": "Loud Seas", "isbn": "9780306406158", "authors": ["Ada Lovelace", "Alan Turing"],
+             "library": "Main", "total_copies": 1},
+            {"title": "Stone", "isbn": "9780306406159", "library": "Annex"},
+        )
+        main = Library.objects.get(name="Main")
+        self.assertEqual(stats.get_counters(main.pk)["total_books"], 2)
+        self.assertEqual(stats.get_counters()["total_books"], 3)
+        self.assertEqual(stats.reconcile(fix=False), [])
+        found = [row["book_id"] for row in search.search_books("lovelace")]
+        self.assertEqual(sorted(found), sorted(Book.objects.filter(library=main).values_list("pk", flat=True)))
+        self.assertEqual(len(search.search_books("travel")), 1)
+        self.assertGreater(versions.current(["book"])["book"][0], before)
+
+    def test_existing_books_only_gain_author_links(self):
+        book = Book.objects.create(title="Kept", isbn="9780306406157", total_copies=1, available_copies=1)
+        catalog = self.rows({"title": "Replaced?", "isbn": "9780306406157", "authors": "Grace Hopper; Alan Kay"})
+        self.assertEqual((catalog.counts["books_existing"], catalog.counts["author_links_created"]), (1, 2))
+        self.assertEqual(Book.objects.get(pk=book.pk).title, "Kept")
+        self.assertEqual([row["book_id"] for row in search.search_books("hopper")], [book.pk])
+
+    def test_command_reads_csv_and_dry_run_writes_nothing(self):
+        with tempfile.NamedTemporaryFile("w", suffix=".csv", delete=False) as f:
+            f.write("title,isbn,authors,total_copies\nDune,9780306406157,Frank Herbert;Brian Herbert,3\n")
+        self.addCleanup(os.remove, f.name)
+        call_command("import_catalog", f.name, "--dry-run", stdout=io.StringIO(), stderr=io.StringIO())
+        self.assertFalse(Book.objects.exists())
+        self.assertFalse(Author.objects.exists())
+        call_command("import_catalog", f.name, stdout=io.StringIO(), stderr=io.StringIO())
+        book = Book.objects.get()
+        self.assertEqual((book.title, book.available_copies), ("Dune", 3))
+        self.assertEqual(sorted(book.authors.values_list("name", flat=True)), ["Brian Herbert", "Frank Herbert"])
+
+
+class RatingTests(TestCase):
+    @classmethod
+    def setUpTestData(cls):
+        cls.books = [Book.objects.create(title=f"Book {i}", isbn=f"978030640615{i}") for i in range(2)]
+        cls.member = Member.objects.create(name="Member", member_type="Student")
+
+    def review(self, book, rating):
+        response = self.client.post("/reviews/", {"book": book.pk, "member": self.member.pk, "rating": rating},
+                                    content_type="application/json")
+        self.assertEqual(response.status_code, 201)
+        return response.json()["review_id"]
+
+    def aggregates(self, book):
+        return Book.objects.values_list("rating_count", "rating_sum", "rating_avg").get(pk=book.pk)
+
+    def test_aggregates_follow_review_writes(self):
+        first = self.review(self.books[0], 5)
+        self.review(self.books[0], 2)
+        self.assertEqual(self.aggregates(self.books[0]), (2, 7, Decimal("3.50")))
+
+        self.client.patch(f"/reviews/{first}/", {"rating": 4}, content_type="application/json")
+        self.assertEqual(self.aggregates(self.books[0]), (2, 6, Decimal("3.00")))
+
+        self.client.patch(f"/reviews/{first}/", {"book": self.books[1].pk}, content_type="application/json")
+        self.assertEqual(self.aggregates(self.books[0]), (1, 2, Decimal("2.00")))
+        self.assertEqual(self.aggregates(self.books[1]), (1, 4, Decimal("4.00")))
+
+        self.client.patch(f"/reviews/{first}/", {"rating": None}, content_type="application/json")
+        self.assertEqual(self.aggregates(self.books[1]), (0, 0, None))
+
+        self.client.delete(f"/reviews/{first}/")
+        self.assertEqual(self.aggregates(self.books[1]), (0, 0, None))
+        self.assertEqual(self.client.post("/reviews/", {"book": self.books[0].pk, "rating": 6},
+                                          content_type="application/json").status_code, 400)
+        self.assertEqual(self.aggregates(self.books[0]), (1, 2, Decimal("2.00")))
+
+        stored = [self.aggregates(book) for book in self.books]
+        Book.objects.update(rating_count=0, rating_sum=0, rating_avg=None)
+        self.assertEqual(ratings.rebuild(), (2, 1))
+        self.assertEqual([self.aggregates(book) for book in self.books], stored)
+
+    def test_top_rated(self):
+        self.review(self.books[0], 3)
+        self.review(self.books[1], 5)
+        response = self.client.get("/api/books/top-rated/")
+        self.assertEqual([book["book_id"] for book in response.json()], [self.books[1].pk, self.books[0].pk])
+        response = self.client.get("/api/books/top-rated/", {"min_ratings": 2})
+        self.assertEqual(response.json(), [])
+        self.assertEqual(self.client.get("/api/books/top-rated/", {"limit": "-1"}).status_code, 400)
@@ -1,8 +1,13 @@
 from django.urls import path
 from rest_framework.routers import DefaultRouter
+from library import async_views
+from library.metrics import metrics_view
 from library.views import(
 LibraryViewSet, BookViewSet, AuthorViewSet, CategoryViewSet, MemberViewSet, BorrowingViewSet, ReviewViewSet,
 BookSearchView, BookAvailabilityView, MemberBorrowingHistoryView, BorrowBookView, ReturnBookView, StatisticsView,
+BorrowingAnalyticsView, BookRecommendationsView,
+BulkBorrowView, BulkReturnView, BookAvailabilityBatchView, AvailabilityCacheStatsView, TopRatedBooksView,
+HoldCreateView, HoldDetailView, MemberHoldsView,
 )
 
 router = DefaultRouter()
@@ -17,12 +22,29 @@ router.register(r"reviews", ReviewViewSet)
 urlpatterns = router.urls + [
 
     path("api/books/search/", BookSearchView.as_view()),
+    path("api/books/top-rated/", TopRatedBooksView.as_view()),
     path("api/books/<int:book_id>/availability/", BookAvailabilityView.as_view()),
+    path("api/books/<int:book_id>/recommendations/", BookRecommendationsView.as_view()),
+    path("api/books/availability/", BookAvailabilityBatchView.as_view()),
+    path("api/books/availability/cache-stats/", AvailabilityCacheStatsView.as_view()),
     path("api/members/<int:member_id>/borrowings/", MemberBorrowingHistoryView.as_view()),
+    path("api/members/<int:member_id>/holds/", MemberHoldsView.as_view()),
+    path("api/holds/", HoldCreateView.as_view()),
+    path("api/holds/<int:hold_id>/", HoldDetailView.as_view()),
     path("api/borrow/", BorrowBookView.as_view()),
     path("api/return/", ReturnBookView.as_view()),
     path("api/stats/", StatisticsView.as_view()),
+    path("api/analytics/borrowings/", BorrowingAnalyticsView.as_view()),
+    path("api/metrics/", metrics_view),
     path("api/borrow/", BorrowBookView.as_view()),
     path("api/return/", ReturnBookView.as_view()),
+    path("api/borrow/bulk/", BulkBorrowView.as_view()),
+    path("api/return/bulk/", BulkReturnView.as_view()),
+
+    path("api/async/books/search/", async_views.book_search),
+    path("api/async/books/<int:book_id>/availability/", async_views.book_availability),
+    path("api/async/books/availability/", async_views.book_availability_batch),
+    path("api/async/members/<int:member_id>/borrowings/", async_views.member_borrowing_history),
+    path("api/async/stats/", async_views.statistics),
 ]
 
@@ -0,0 +1,115 @@
+"""
+Per-table version counters for conditional GETs.
+
+Every committed write to a versioned table bumps its ``table_version`` row:
+model saves and deletes through the receivers in ``signals.py``, queryset
+``update()`` / ``bulk_create()`` paths through explicit ``bump()`` calls next
+to their ``availability.invalidate()`` calls. The bump runs after commit, so
+the counter row is never locked for the length of a borrow or return.
+
+``conditional(*tables)`` wraps a read view with Django's ``condition()`` (and
+``versioned(*tables)`` does so for a viewset's list/retrieve): the
+weak ETag and Last-Modified come from one primary-key read of the table
+versions, and a matching ``If-None-Match`` / ``If-Modified-Since`` gets a 304
+before the view runs its queryset.
+"""
+import zlib
+
+from django.db import IntegrityError, transaction
+from django.db.models import F
+from django.utils import timezone
+from django.utils.decorators import method_decorator
+from django.views.decorators.http import condition
+
+from .models import TableVersion
+
+VERSIONED_TABLES = (
+    "author", "book", "book_author", "borrowing", "category", "library", "member", "review",
+)
+
+
+class _PendingBump:
+    """The on-commit callback of one transaction; later bumps join it."""
+
+    def __init__(self, tables):
+        self.tables = set(tables)
+
+    def __call__(self):
+        tables = sorted(self.tables)
+        now = timezone.now()
+        updated = TableVersion.objects.filter(pk__in=tables).update(version=F("version") + 1, updated_at=now)
+        if updated == len(tables):
+            return
+        existing = set(TableVersion.objects.filter(pk__in=tables).values_list("pk", flat=True))
+        for table in set(tables) - existing:
+            try:
+                with transaction.atomic():
+                    TableVersion.objects.create(table=table, version=1, updated_at=now)
+            except IntegrityError:
+                TableVersion.objects.filter(pk=table).update(version=F("version") + 1, updated_at=now)
+
+
+def bump(*tables):
+    """
+    Bump ``tables`` once the current transaction commits (immediately outside
+    one). Bumps within one transaction share one UPDATE.
+    """
+    connection = transaction.get_connection()
+    if connection.in_atomic_block:
+        # Join a callback from the same savepoint, so a rollback drops both.
+        savepoints = set(connection.savepoint_ids)
+        for callback_savepoints, callback, _ in connection.run_on_commit:
+            if isinstance(callback, _PendingBump) and callback_savepoints == savepoints:
+                callback.tables.update(tables)
+                return
+    transaction.on_commit(_PendingBump(tables))
+
+
+def current(tables):
+    """``{table: (version, updated_at)}`` for ``tables``; missing rows are left out."""
+    return {
+        table: (version, updated_at)
+        for table, version, updated_at in TableVersion.objects.filter(pk__in=tables).values_list(
+            "table", "version", "updated_at"
+        )
+    }
+
+
+def _state(request, tables):
+    # etag_func and last_modified_func are called in turn; read the versions once.
+    key = "_table_versions_" + ",".join(tables)
+    state = getattr(request, key, None)
+    if state is None:
+        state = current(tables)
+        setattr(request, key, state)
+    return state
+
+
+def conditional(*tables):
+    """``condition()`` decorator for a GET view whose response depends only on ``tables``."""
+    tables = tuple(sorted(tables))
+
+    def etag(request, *args, **kwargs):
+        state = _state(request, tables)
+        versions = "-".join(str(state.get(table, (0, None))[0]) for table in tables)
+        # The same URL can be rendered as JSON or as the browsable API.
+        accept = zlib.crc32(request.META.get("HTTP_ACCEPT", "").encode())
+        return f'W/"{versions}-{accept:x}"'
+
+    def last_modified(request, *args, **kwargs):
+        stamps = [updated_at for _, updated_at in _state(request, tables).values() if updated_at]
+        return max(stamps) if stamps else None
+
+    return condition(etag_func=etag, last_modified_func=last_modified)
+
+
+def versioned(*tables, actions=("list", "retrieve")):
+    """Class decorator making a viewset's read actions conditional on ``tables``."""
+    decorator = conditional(*tables)
+
+    def wrap(cls):
+        for name in actions:
+            cls = method_decorator(decorator, name=name)(cls)
+        return cls
+
+    return wrap
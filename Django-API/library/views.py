@@ -1,11 +1,14 @@
 from datetime import date, timedelta
-from django.db.models import Q, Count, F
-from django.db import transaction
+from django.db.models import Q, Count, F, Prefetch
+from django.conf import settings
+from django.db import IntegrityError, transaction
 from django.shortcuts import get_object_or_404
 from django.utils import timezone
+from django.utils.decorators import method_decorator
 from rest_framework import viewsets, generics, filters, status
 from rest_framework.response import Response
 from rest_framework.decorators import action
+from rest_framework.exceptions import NotFound, ValidationError
 from rest_framework.views import APIView
 from django_filters.rest_framework import DjangoFilterBackend
 
@@ -13,14 +16,20 @@ from drf_spectacular.utils import(
 extend_schema, extend_schema_view, OpenApiParameter, OpenApiTypes, OpenApiExample
 )
 
+from . import availability, holds, idempotency, loans, ratings, rollups, search, stats, versions
+from .exports import ExportMixin
+from .fastlist import ValuesListMixin
 from .models import(
-Library, Book, Author, Category, BookAuthor, Member, Borrowing, Review
+Library, Book, Author, Category, BookAuthor, Member, Borrowing, Review, Hold, BookRecommendation
 )
+from .pagination import SearchPagination
 from .serializers import(
 LibrarySerializer, BookSerializer, AuthorSerializer, CategorySerializer, BookAuthorSerializer, MemberSerializer, BorrowingSerializer, ReviewSerializer, BorrowRequestSerializer, ReturnRequestSerializer,
+BulkLoanRequestSerializer, HoldSerializer, parse_expand,
 )
 
-class LibraryViewSet(viewsets.ModelViewSet):
+@versions.versioned("library")
+class LibraryViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Library.objects.all().order_by("library_id")
     serializer_class = LibrarySerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -29,7 +38,17 @@ class LibraryViewSet(viewsets.ModelViewSet):
     ordering_fields = ["library_id", "name", "campus_location"]
     ordering = ["library_id"]
 
-class BookViewSet(viewsets.ModelViewSet):
+EXPAND_PARAMETER = OpenApiParameter(
+    "expand", OpenApiTypes.STR, OpenApiParameter.QUERY,
+    description="Comma-separated related data to embed: authors, category, library",
+)
+
+@versions.versioned("author", "book", "book_author", "category", "library")
+@extend_schema_view(
+    list=extend_schema(parameters=[EXPAND_PARAMETER]),
+    retrieve=extend_schema(parameters=[EXPAND_PARAMETER]),
+)
+class BookViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Book.objects.select_related("category", "library").all().order_by("book_id")
     serializer_class = BookSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -37,7 +56,39 @@ class BookViewSet(viewsets.ModelViewSet):
     ordering_fields = ["book_id", "title", "published_year", "total_copies", "available_copies"]
     ordering = ["book_id"]
 
-class AuthorViewSet(viewsets.ModelViewSet):
+    def get_expand(self):
+        if self.action not in ("list", "retrieve"):
+            return set()
+        return parse_expand(self.request)
+
+    def use_values_list(self):
+        # Expansions need the related objects; plain rows are enough otherwise.
+        return not self.get_expand()
+
+    def get_queryset(self):
+        queryset = super().get_queryset()
+        if "authors" in self.get_expand():
+            # One extra query per page, however many books it holds.
+            queryset = queryset.prefetch_related(
+                Prefetch("authors", queryset=Author.objects.only("author_id", "name").order_by("author_id"))
+            )
+        return queryset
+
+    def get_serializer_context(self):
+        context = super().get_serializer_context()
+        context["expand"] = self.get_expand()
+        return context
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        old_library_id = serializer.instance.library_id
+        book = serializer.save()
+        if book.library_id != old_library_id:
+            stats.adjust(old_library_id, total_books=-1)
+            stats.adjust(book.library_id, total_books=1)
+
+@versions.versioned("author")
+class AuthorViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Author.objects.all().order_by("author_id")
     serializer_class = AuthorSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -46,7 +97,8 @@ class AuthorViewSet(viewsets.ModelViewSet):
     ordering_fields = ["author_id", "name"]
     ordering = ["author_id"]
 
-class CategoryViewSet(viewsets.ModelViewSet):
+@versions.versioned("category")
+class CategoryViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Category.objects.all().order_by("category_id")
     serializer_class = CategorySerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -55,7 +107,8 @@ class CategoryViewSet(viewsets.ModelViewSet):
     ordering_fields = ["category_id", "name"]
     ordering = ["name"]
 
-class MemberViewSet(viewsets.ModelViewSet):
+@versions.versioned("member")
+class MemberViewSet(ValuesListMixin, viewsets.ModelViewSet):
     queryset = Member.objects.all().order_by("member_id")
     serializer_class = MemberSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -64,7 +117,8 @@ class MemberViewSet(viewsets.ModelViewSet):
     ordering_fields = ["member_id", "name", "member_type"]
     ordering = ["member_id"]
 
-class BorrowingViewSet(viewsets.ModelViewSet):
+@versions.versioned("borrowing")
+class BorrowingViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Borrowing.objects.select_related("book", "member").all().order_by("borrowing_id")
     serializer_class = BorrowingSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -73,7 +127,25 @@ class BorrowingViewSet(viewsets.ModelViewSet):
     ordering_fields = ["borrowing_id", "borrow_date", "due_date", "return_date"]
     ordering = ["borrowing_id"]
 
-class ReviewViewSet(viewsets.ModelViewSet):
+    def perform_create(self, serializer):
+        try:
+            with transaction.atomic():
+                serializer.save()
+        except IntegrityError:
+            # A concurrent request opened the same loan after validate() ran.
+            raise ValidationError(BorrowingSerializer.OPEN_LOAN_ERROR)
+
+    def perform_update(self, serializer):
+        try:
+            with transaction.atomic():
+                before = stats.borrowing_state(serializer.instance)
+                borrowing = serializer.save()
+                stats.record_borrowing_change(before, stats.borrowing_state(borrowing))
+        except IntegrityError:
+            raise ValidationError(BorrowingSerializer.OPEN_LOAN_ERROR)
+
+@versions.versioned("review")
+class ReviewViewSet(ExportMixin, ValuesListMixin, viewsets.ModelViewSet):
     queryset = Review.objects.select_related("book", "member").all().order_by("review_id")
     serializer_class = ReviewSerializer
     filter_backends = [DjangoFilterBackend, filters.SearchFilter, filters.OrderingFilter]
@@ -82,18 +154,37 @@ class ReviewViewSet(viewsets.ModelViewSet):
     ordering_fields = ["review_id", "rating", "review_date"]
     ordering = ["-review_date"]
 
+    @transaction.atomic
+    def perform_create(self, serializer):
+        review = serializer.save()
+        ratings.record_review_change(None, ratings.review_state(review))
+
+    @transaction.atomic
+    def perform_update(self, serializer):
+        before = ratings.review_state(serializer.instance)
+        review = serializer.save()
+        ratings.record_review_change(before, ratings.review_state(review))
+
+    @transaction.atomic
+    def perform_destroy(self, instance):
+        before = ratings.review_state(instance)
+        instance.delete()
+        ratings.record_review_change(before, None)
+
 
 class BookSearchView(generics.ListAPIView):
     serializer_class = BookSerializer
-    @swagger_auto_schema(
-        operation_summary="Search books",
-        operation_description="Search by title, ISBN, author name, or category name.",
+    pagination_class = SearchPagination
+
+    @extend_schema(
+        summary="Search books",
+        description="Ranked search by title, ISBN, author name, or category name. "
+                    "Every word must match; the last word may be a prefix.",
         tags=["Books"],
-        manual_parameters=[
-            openapi.Parameter(
-                "q", openapi.IN_QUERY,
-                description="Search text (title/ISBN/author/category",
-                type=openapi.TYPE_STRING,
+        parameters=[
+            OpenApiParameter(
+                "q", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                description="Search text (title/ISBN/author/category)",
                 required=False,
             )
         ],
@@ -104,33 +195,31 @@ class BookSearchView(generics.ListAPIView):
 
     def get_queryset(self):
         query = (self.request.query_params.get("q") or "").strip()
-        if not query:
-            return Book.objects.none()
-        return(
-            Book.objects.select_related("category", "library")
-            .filter(
-                Q(title_icontains=query)
-                | Q(isbn_icontains=query)
-                | Q(bookauthor_author_name_icontains=query)
-                | Q(category_name=query)
-            )
-            .distinct()
-            .order_by("book_id")
+        return search.search_books(query)
+
+    def list(self, request, *args, **kwargs):
+        page = self.paginate_queryset(self.get_queryset())
+        books = Book.objects.select_related("category", "library").in_bulk(
+            [row["book_id"] for row in page]
         )
+        results = []
+        for row in page:
+            book = books.get(row["book_id"])
+            if book is None:
+                continue
+            data = self.get_serializer(book).data
+            data["score"] = row["score"]
+            results.append(data)
+        return self.get_paginated_response(results)
 
 class MemberBorrowingHistoryView(generics.ListAPIView):
     serializer_class = BorrowingSerializer
-    @swagger_auto_schema(
-        operation_summary="Member borrowing history",
-        operation_description="Return borrow/return history for the given number.",
+    @extend_schema(
+        summary="Member borrowing history",
+        description="Return borrow/return history for the given member.",
         tags=["Borrowings"],
-        manual_parameters=[
-            openapi.Parameter(
-                "member_id", openapi.IN_PATH,
-                description="Member ID",
-                type=openapi.TYPE_INTEGER,
-                required=True,
-            )
+        parameters=[
+            OpenApiParameter("member_id", OpenApiTypes.INT, OpenApiParameter.PATH, description="Member ID"),
         ],
         responses={200: BorrowingSerializer(many=True)},
     )
@@ -139,7 +228,7 @@ class MemberBorrowingHistoryView(generics.ListAPIView):
 
 
     def get_queryset(self):
-        member_id = self.Kwargs["member_id"]
+        member_id = self.kwargs["member_id"]
         return(
             Borrowing.objects.select_related("book", "member")
             .filter(member_id=member_id)
@@ -147,234 +236,265 @@ class MemberBorrowingHistoryView(generics.ListAPIView):
         )
 
 class BookAvailabilityView(APIView):
-    @swagger_auto_schema(
-        operation_summary="Check book availability",
-        operation_description="Returns whether the book is available and how many copies are available.",
+    @extend_schema(
+        summary="Check book availability",
+        description="Returns whether the book is available and how many copies are available.",
         tags=["Books"],
-        manual_parameters=[
-            openapi.Parameter(
-                "book_id", openapi.IN_PATH,
-                description="Book ID",
-                type=openapi.TYPE_INTEGER,
-                required=True,
+        parameters=[
+            OpenApiParameter("book_id", OpenApiTypes.INT, OpenApiParameter.PATH, description="Book ID")
+        ],
+        responses={200: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+        examples=[
+            OpenApiExample(
+                "Availability info",
+                value={"available": True, "available_copies": 2},
+                response_only=True,
             )
         ],
-        responses={
-            200: openapi.Response(
-                description="Availability info",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        "available": openapi.Schema(type=openapi.TYPE_BOOLEAN, example=True),
-                        "available_copies": openapi.Schema(type=openapi.TYPE_INTEGER, example=2),
-                    },
-                ),
-            ),
-            404: "Not found",
-        },
     )
+    @method_decorator(versions.conditional("book"))
     def get(self, request, book_id):
-        book = get_object_or_404(Book, pk=book_id)
-        available_copies = max(book.available_copies or 0, 0)
+        available_copies = availability.get_available_copies([book_id]).get(book_id)
+        if available_copies is None:
+            raise NotFound("No Book matches the given query.")
         return Response(
             {"available": available_copies > 0, "available_copies": available_copies},
             status=status.HTTP_200_OK,
         )
 
-class BorrowBookView(APIView):
-    @swagger_auto_schema(
-        operation_summary="Borrow a book",
-        operation_description="Creates a borrowing record for the given member and book.",
-        tags=["borrowings"],
-        request_body=openapi.Schema(
-            type=openapi.TYPE_INTEGER,
-            required=["book_id", "member_id"],
-            properties={
-                "book_id": openapi.Schema(type=openapi.TYPE_INTEGER, description="Book ID", example=10),
-                "member_id": openapi.Schema(type=openapi.TYPE_INTEGER, description="Member ID", example=5),
-            },
-        ),
-        responses={
-            200: openapi.Responses(
-                description="Borrow Success",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_INTEGER,
-                    properties={
-                        "message": openapi.Schema(type=openapi.TYPE_STRING, example="Book borrowed successfully"),
-                        "borrow_date": openapi.Schema(type=openapi.TYPE_STRING, example="2025-08-21"),
-                        "due_date": openapi.Schema(type=openapi.TYPE_STRING, example="2025-09-04"),
-                        "available_copies": openapi.Schema(type=openapi.TYPE_INTEGER, example=4),
-                    },
-                ),
-            ),
-            400: "Missing fields or book not available",
-            409: "Member already has this book borrowed",
-        },
-
+class BookAvailabilityBatchView(APIView):
+    @extend_schema(
+        summary="Check availability of many books",
+        description=f"Availability for up to {availability.MAX_BATCH_IDS} comma-separated book IDs, served from "
+                    "the cache with at most one query for the misses. Unknown IDs are listed under missing.",
+        tags=["Books"],
+        parameters=[
+            OpenApiParameter("ids", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description="Comma-separated book IDs", required=True)
+        ],
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
     )
-    def post(self, request):
-        book_id = request.data.get("book_id")
-        member_id = request.data.get("member_id")
-
-        if not book_id or not member_id:
-            return Response(
-                {"error": "Missing book_id or member_id"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        book = get_object_or_404(Book, pk=book_id)
-        member = get_object_or_404(Member, pk=member_id)
-
-        if (book.available_copies or 0) <= 0:
-            return Response(
-                {"error": "Book not available"},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        if Borrowing.objects.filter(
-            book=book, member=member, return_date_isnull=True
-        ).exists():
-            return Response(
-                {"error": "This member already borrowed this book and has not returned it."},
-                status=status.HTTP_400_BAD_REQUEST,
-            )
-
-        borrow_date = timezone.localdate()
-        due_date = borrow_date + timedelta(days=14)
-
-        Borrowing.objects.create(
-            book=book, member=member, borrow_date=borrow_date, due_date=due_date
+    def get(self, request):
+        try:
+            book_ids = availability.parse_batch_ids(request.query_params.get("ids"))
+        except availability.BatchError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        copies = availability.get_available_copies(book_ids)
+        return Response(availability.batch_result(book_ids, copies), status=status.HTTP_200_OK)
+
+class TopRatedBooksView(APIView):
+    MAX_LIMIT = 100
+
+    @extend_schema(
+        summary="Top-rated books",
+        description="Books ordered by average rating, then by number of ratings. Reads the stored "
+                    "per-book aggregates through the rating indexes.",
+        tags=["Books"],
+        parameters=[
+            OpenApiParameter("category", OpenApiTypes.INT, OpenApiParameter.QUERY, description="Category ID"),
+            OpenApiParameter("library", OpenApiTypes.INT, OpenApiParameter.QUERY, description="Library ID"),
+            OpenApiParameter("min_ratings", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                             description="Only books with at least this many ratings (default 1)"),
+            OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                             description="Number of books (default 10, max 100)"),
+        ],
+        responses={200: BookSerializer(many=True), 400: OpenApiTypes.OBJECT},
+    )
+    def get(self, request):
+        params = {}
+        for name, default in (("category", None), ("library", None), ("min_ratings", 1), ("limit", 10)):
+            raw = request.query_params.get(name)
+            if raw in (None, ""):
+                params[name] = default
+            elif raw.isdigit():
+                params[name] = int(raw)
+            else:
+                return Response({"error": f"{name} must be a non-negative integer"},
+                                status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(params["limit"], 1), self.MAX_LIMIT)
+
+        books = Book.objects.filter(rating_count__gte=max(params["min_ratings"], 1))
+        if params["category"] is not None:
+            books = books.filter(category_id=params["category"])
+        if params["library"] is not None:
+            books = books.filter(library_id=params["library"])
+        # All keys descending so the index is walked backwards without a sort.
+        books = books.order_by("-rating_avg", "-rating_count", "-book_id")[:limit]
+        return Response(BookSerializer(books, many=True).data, status=status.HTTP_200_OK)
+
+class BookRecommendationsView(APIView):
+    MAX_LIMIT = 50
+
+    @extend_schema(
+        summary="Members who borrowed this also borrowed",
+        description="Books most often borrowed by the members who borrowed this one, from the "
+                    "book_recommendation table built offline by build_recommendations. An unknown "
+                    "book, or one without recommendations yet, gives an empty list.",
+        tags=["Books"],
+        parameters=[
+            OpenApiParameter("limit", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                             description="Number of books (default 10, max 50)"),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    )
+    def get(self, request, book_id):
+        raw = request.query_params.get("limit") or "10"
+        if not raw.isdigit():
+            return Response({"error": "limit must be a non-negative integer"}, status=status.HTTP_400_BAD_REQUEST)
+        limit = min(max(int(raw), 1), self.MAX_LIMIT)
+
+        # One query: the (book, rank) unique index, joined to the recommended books.
+        recommendations = (
+            BookRecommendation.objects.filter(book_id=book_id)
+            .select_related("recommended")
+            .order_by("rank")[:limit]
         )
-
-        book.available_copies = (book.available_copies or 0) -1
-        if book.available_copies < 0:
-            book.available_copies = 0
-        book.save(update_fields=["available_copies"])
-
         return Response(
             {
-                "message": "Book borrowed Successfully",
-                "borrow_date": str(borrow_date),
-                "due_date": str(due_date),
-                "available_copies": book.available_copies,
+                "book_id": book_id,
+                "results": [
+                    {
+                        "rank": recommendation.rank,
+                        "co_borrowers": recommendation.co_borrowers,
+                        "score": round(recommendation.score, 4),
+                        "book": BookSerializer(recommendation.recommended).data,
+                    }
+                    for recommendation in recommendations
+                ],
             },
             status=status.HTTP_200_OK,
         )
 
-class ReturnBookView(APIView):
-    @swagger_auto_schema(
-        operation_summary="Return a book",
-        operation_description="Marks an active borrowing as returned.",
-        tags=["Borrowings"],
-        request_body=openapi.Schema(
-            type=openapi.TYPE_INTEGER,
-            required=["book_id", "member_id"],
-            properties={
-                "book_id": openapi.Schema(type=openapi.TYPE_INTEGER, description="Book_ID", example=10),
-                "member_id": openapi.Schema(type=openapi.TYPE_INTEGER, description="Book_ID", example=5),
-            },
-        ),
-        responses={
-            200: openapi.Response(
-                description="Return Success",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        "message": openapi.Schema(type=openapi.TYPE_INTEGER, example="Book returned successfully"),
-                        "return_date": openapi.Schema(type=openapi.TYPE_INTEGER, example="2025-08-25"),
-                        "late_days": openapi.Schema(type=openapi.TYPE_INTEGER, example="0"),
-                        "available_copies": openapi.Schema(type=openapi.TYPE_INTEGER, example="5"),
-                    },
-                ),
-            ),
-            400: "Validation error or no active borrowing found",
-        },
+class AvailabilityCacheStatsView(APIView):
+    @extend_schema(
+        summary="Availability cache counters",
+        description="Hit and miss counts of the availability cache for this server process.",
+        tags=["Books"],
+        responses={200: OpenApiTypes.OBJECT},
     )
-    def post(self, request):
-        book_id = request.data.get("book_id")
-        member_id = request.data.get("member_id")
+    def get(self, request):
+        return Response(availability.counters(), status=status.HTTP_200_OK)
 
-        if not book_id or not member_id:
-            return Response(
-                {"error": "Missing book_id or member_id"},
-                status=status.HTTP_400_BAD_REQUEST,
+class StatisticsView(APIView):
+    @extend_schema(
+        summary="Library statistics",
+        description="Aggregated metrics: total books, members, borrowings, currently borrowed, and late returns. "
+                    "Served from incrementally maintained counters; pass library for one library's breakdown.",
+        tags=["Analytics"],
+        parameters=[
+            OpenApiParameter(
+                "library", OpenApiTypes.INT, OpenApiParameter.QUERY,
+                description="Library ID (members are only counted system-wide)",
+                required=False,
             )
-        borrowing (
-            Borrowing.objects.select_related("book")
-            .filter(book_id=book_id, member_id=member_id, return_date_isnull=True)
-            .first()
-        )
-        if not borrowing:
-            return Response(
-                {"error": "No active borrowing found"},
-                status=status.HTTP_400_BAD_REQUEST
+        ],
+        responses={200: OpenApiTypes.OBJECT},
+        examples=[
+            OpenApiExample(
+                "Statistics payload",
+                value={
+                    "total_books": 1200,
+                    "total_members": 300,
+                    "total_borrowings": 540,
+                    "currently_borrowed": 440,
+                    "late_returns": 5,
+                },
+                response_only=True,
             )
-        borrowing.return_date = timezone.localdate()
-        borrowing.save(update_fields=["return_date"])
+        ],
+    )
+    def get(self, request):
+        library_id = request.query_params.get("library")
+        if library_id is not None and not library_id.isdigit():
+            return Response({"error": "library must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
 
-        book = borrowing.book
-        book.available_copies = (book.available_copies or 0) + 1
+        counters = stats.get_counters(int(library_id) if library_id else None)
+        return Response(counters, status=status.HTTP_200_OK)
 
-        if book.total_copies is not None and book.available_copies > (book.total_copies or 0):
-            book.available_copies = book.total_copies
-        book.save(update_fields=["available_copies"])
 
-        late_days = 0
-        if borrowing.return_date and borrowing.due_date and borrowing.return_date > borrowing.due_date:
-            late_date = (borrowing.return_date - borrowing.due_date).days
+class BorrowingAnalyticsView(APIView):
+    MAX_DAYS = 5 * 366
 
-        return Response(
-            {
-                "message": "Book returned successfully",
-                "return_date": str(borrowing.return_date),
-                "late_days": late_days,
-                "available_copies": book.available_copies,
-            },
-            status=status.HTTP_200_OK,
-        )
-
-class StatisticsView(APIView):
-    @swagger_auto_schema(
-        operation_summary="Library statistics",
-        operation_description="Aggregated metrics: total books, members, borrowings, currently borrowed, and late returns.",
+    @extend_schema(
+        summary="Borrowings over time",
+        description="Loans started, returned and returned late per day or ISO week, from the daily rollup "
+                    "maintained by the rollup_borrowings command. fresh_as_of is when it last ran.",
         tags=["Analytics"],
-        responses={
-            200: openapi.Response(
-                description="Statistics payload",
-                schema=openapi.Schema(
-                    type=openapi.TYPE_OBJECT,
-                    properties={
-                        "total_books": openapi.schema(type=openapi.TYPE_INTEGER, example=1200),
-                        "total_members": openapi.schema(type=openapi.TYPE_INTEGER, example=300),
-                        "total_borrowings": openapi.schema(type=openapi.TYPE_INTEGER, example=540),
-                        "currently_borrowed": openapi.schema(type=openapi.TYPE_INTEGER, example=440),
-                        "late_returns": openapi.schema(type=openapi.TYPE_INTEGER, example=5),
-                    }
-                )
+        parameters=[
+            OpenApiParameter("start", OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                             description="First day (default: 29 days before end)", required=False),
+            OpenApiParameter("end", OpenApiTypes.DATE, OpenApiParameter.QUERY,
+                             description="Last day (default: today)", required=False),
+            OpenApiParameter("interval", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description="day or week (weeks are labelled with their Monday)",
+                             required=False, enum=["day", "week"]),
+            OpenApiParameter("library", OpenApiTypes.INT, OpenApiParameter.QUERY, required=False),
+            OpenApiParameter("category", OpenApiTypes.INT, OpenApiParameter.QUERY, required=False),
+            OpenApiParameter("group_by", OpenApiTypes.STR, OpenApiParameter.QUERY,
+                             description="Split each period by library or category",
+                             required=False, enum=["library", "category"]),
+        ],
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+        examples=[
+            OpenApiExample(
+                "Weekly series",
+                value={
+                    "start": "2026-09-01", "end": "2026-09-30", "interval": "week",
+                    "fresh_as_of": "2026-09-30T12:00:00Z",
+                    "results": [{"period": "2026-08-31", "borrowed": 42, "returned": 37, "late_returns": 3}],
+                },
+                response_only=True,
             )
-        }
+        ],
     )
     def get(self, request):
-        total_books = Book.objects.count()
-        total_members = Member.objects.count()
-        total_borrowings = Borrowing.objects.count()
-        currently_borrowed = Borrowing.objects.filter(return_date_isnull=True).count()
-        late_returns = Borrowing.objects.filter(return_date_gt=F("due_date").count())
-
+        params = request.query_params
+        try:
+            end = date.fromisoformat(params["end"]) if params.get("end") else timezone.localdate()
+            start = date.fromisoformat(params["start"]) if params.get("start") else end - timedelta(days=29)
+        except ValueError:
+            return Response({"error": "start and end must be YYYY-MM-DD"}, status=status.HTTP_400_BAD_REQUEST)
+        if start > end:
+            return Response({"error": "start must not be after end"}, status=status.HTTP_400_BAD_REQUEST)
+        if (end - start).days >= self.MAX_DAYS:
+            return Response({"error": f"At most {self.MAX_DAYS} days per request"},
+                            status=status.HTTP_400_BAD_REQUEST)
+
+        interval = params.get("interval", "day")
+        group_by = params.get("group_by") or None
+        if interval not in ("day", "week") or group_by not in (None, *rollups.GROUP_FIELDS):
+            return Response({"error": "interval must be day or week; group_by library or category"},
+                            status=status.HTTP_400_BAD_REQUEST)
+        filters = {}
+        for name in ("library", "category"):
+            value = params.get(name)
+            if value is not None and not value.isdigit():
+                return Response({"error": f"{name} must be an integer"}, status=status.HTTP_400_BAD_REQUEST)
+            filters[f"{name}_id"] = int(value) if value else None
+
+        mark = rollups.watermark()
         return Response(
             {
-                "total_books": total_books,
-                "total_members": total_members,
-                "total_borrowings": total_borrowings,
-                "currently_borrowed": currently_borrowed,
-                "late_returns": late_returns,
+                "start": start.isoformat(),
+                "end": end.isoformat(),
+                "interval": interval,
+                "fresh_as_of": mark.updated_at if mark else None,
+                "results": rollups.series(start, end, interval, group_by=group_by, **filters),
             },
-            status=status.HTTP_200_OK
+            status=status.HTTP_200_OK,
         )
 
 
 class BorrowBookView(APIView):
-    @transaction.atomic
+    @extend_schema(
+        summary="Borrow a book",
+        description="Creates a borrowing for the member and takes one copy of the book. Send an "
+                    "Idempotency-Key header to make retries safe.",
+        tags=["Borrowings"],
+        request=BorrowRequestSerializer,
+        responses={201: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+    )
+    @method_decorator(idempotency.idempotent)
     def post(self, request):
         req = BorrowRequestSerializer(data= request.data)
         req.is_valid(raise_exception=True)
@@ -382,10 +502,35 @@ class BorrowBookView(APIView):
         book_id = req.validated_data["book_id"]
         member_id = req.validated_data["member_id"]
 
+        if settings.LIBRARY_BORROW_STRATEGY == "optimistic":
+            book = get_object_or_404(Book.objects.only("book_id", "library_id"), pk=book_id)
+            get_object_or_404(Member.objects.only("member_id"), pk=member_id)
+            try:
+                result = loans.borrow_optimistic(book, member_id)
+            except loans.LoanError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            if result is not None:
+                return self.borrowed(*result)
+        return self.borrow_locking(book_id, member_id)
+
+    def borrowed(self, borrowing, available_copies):
+        return Response(
+            {
+                "message": "Book borrowed successfully",
+                "borrowing": BorrowingSerializer(borrowing).data,
+                "available_copies": available_copies,
+            },
+            status=status.HTTP_201_CREATED,
+        )
+
+    @transaction.atomic
+    def borrow_locking(self, book_id, member_id):
         book = get_object_or_404(Book.objects.select_for_update(), pk=book_id)
         member = get_object_or_404(Member, pk=member_id)
 
-        if (book.available_copies or 0) <= 0:
+        # A copy set aside for this member's hold is theirs even at 0 available.
+        hold = holds.ready_hold(book, member)
+        if hold is None and (book.available_copies or 0) <= 0:
             return Response({"error": "Book not available"}, status=status.HTTP_400_BAD_REQUEST)
 
         if Borrowing.objects.filter(book=book, member=member, return_date__isnull=True).exists():
@@ -401,44 +546,40 @@ class BorrowBookView(APIView):
             book=book, member=member, borrow_date=borrow_date, due_date=due_date
         )
 
-        book.available_copies = F("available_copies") - 1
-        book.save(update_fields=["available_copies"])
-        book.refresh_from_db(fields=["available_copies"])
+        if hold is not None:
+            hold.delete()
+        else:
+            book.available_copies = F("available_copies") - 1
+            book.save(update_fields=["available_copies"])
+            book.refresh_from_db(fields=["available_copies"])
 
-        return Response(
-            {
-                "message": "Book borrowed successfully",
-                "borrowing": BorrowingSerializer(borrowing).data,
-                "available_copies": book.available_copies,
-            },
-            status=status.HTTP_201_CREATED,
-        )
+        return self.borrowed(borrowing, book.available_copies)
 
 class ReturnBookView(APIView):
-    @transaction.atomic
+    @extend_schema(
+        summary="Return a book",
+        description="Closes the borrowing and puts the copy back on the shelf, or sets it aside for the "
+                    "next hold. Send an Idempotency-Key header to make retries safe.",
+        tags=["Borrowings"],
+        request=ReturnRequestSerializer,
+        responses={200: OpenApiTypes.OBJECT, 400: OpenApiTypes.OBJECT},
+    )
+    @method_decorator(idempotency.idempotent)
     def post(self, request):
         req = ReturnRequestSerializer(data=request.data)
-        req.is_valid=(raise_exception==True)
+        req.is_valid(raise_exception=True)
 
         borrowing_id = req.validated_data["borrowing_id"]
 
-        borrowing = (
-            Borrowing.objects.select_for_update()
-            .select_related("book")
-            .filter(pk=borrowing_id, return_date__isnull=True)
-            .first()
-        )
-        if not borrowing:
-            return Response({"error": "No active borrowing found"}, status=status.HTTP_400_BAD_REQUEST)
-
-        borrowing.return_date = timezone.localdate()
-        borrowing.save(update_fields=["return_date"])
-
-        book = borrowing.book
-        book.available_copies = F("available_copies") + 1
-        book.save(update_fields=["available_copies"])
-        book.refresh_from_db(fields=["available_copies"])
+        if settings.LIBRARY_BORROW_STRATEGY == "optimistic":
+            try:
+                result = loans.return_optimistic(borrowing_id)
+            except loans.LoanError as e:
+                return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+            return self.returned(*result)
+        return self.return_locking(borrowing_id)
 
+    def returned(self, borrowing, available_copies, reserved):
         late_days = 0
         if borrowing.return_date and borrowing.due_date and borrowing.return_date > borrowing.due_date:
             late_days = (borrowing.return_date - borrowing.due_date).days
@@ -448,20 +589,142 @@ class ReturnBookView(APIView):
                 "message": "Book returned successfully",
                 "borrowing": BorrowingSerializer(borrowing).data,
                 "late_days": late_days,
-                "available_copies": book.available_copies,
+                "available_copies": available_copies,
+                "reserved_for_hold": reserved,
             },
             status=status.HTTP_200_OK
         )
 
+    @transaction.atomic
+    def return_locking(self, borrowing_id):
+        borrowing = (
+            Borrowing.objects.select_for_update()
+            .select_related("book")
+            .filter(pk=borrowing_id, return_date__isnull=True)
+            .first()
+        )
+        if not borrowing:
+            return Response({"error": "No active borrowing found"}, status=status.HTTP_400_BAD_REQUEST)
+
+        before = stats.borrowing_state(borrowing)
+        borrowing.return_date = timezone.localdate()
+        borrowing.save(update_fields=["return_date"])
+        stats.record_borrowing_change(before, stats.borrowing_state(borrowing))
 
+        # The Book row is locked with the borrowing; hand the copy to the next
+        # hold if anyone is waiting, otherwise put it back on the shelf.
+        book = borrowing.book
+        reserved = not holds.assign_copies({book.pk: 1})[book.pk]
+        if not reserved:
+            book.available_copies = F("available_copies") + 1
+            book.save(update_fields=["available_copies"])
+            book.refresh_from_db(fields=["available_copies"])
 
+        return self.returned(borrowing, book.available_copies, reserved)
 
 
+class BulkBorrowView(APIView):
+    @extend_schema(
+        summary="Borrow books in bulk",
+        description="Borrows every (book_id, member_id) pair in one transaction with a constant number "
+                    "of queries. Each item succeeds or fails on its own; results keep the input order.",
+        tags=["Borrowings"],
+        request=BulkLoanRequestSerializer,
+        responses={200: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT},
+    )
+    @method_decorator(idempotency.idempotent)
+    def post(self, request):
+        req = BulkLoanRequestSerializer(data=request.data)
+        req.is_valid(raise_exception=True)
 
+        results = loans.bulk_borrow(req.validated_data["items"])
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if all(r["ok"] for r in results) else status.HTTP_207_MULTI_STATUS,
+        )
 
+class BulkReturnView(APIView):
+    @extend_schema(
+        summary="Return books in bulk",
+        description="Returns the active loan for every (book_id, member_id) pair in one transaction.",
+        tags=["Borrowings"],
+        request=BulkLoanRequestSerializer,
+        responses={200: OpenApiTypes.OBJECT, 207: OpenApiTypes.OBJECT},
+    )
+    @method_decorator(idempotency.idempotent)
+    def post(self, request):
+        req = BulkLoanRequestSerializer(data=request.data)
+        req.is_valid(raise_exception=True)
 
+        results = loans.bulk_return(req.validated_data["items"])
+        return Response(
+            {"results": results},
+            status=status.HTTP_200_OK if all(r["ok"] for r in results) else status.HTTP_207_MULTI_STATUS,
+        )
 
 
+class HoldCreateView(APIView):
+    @extend_schema(
+        summary="Place a hold",
+        description="Queue the member for a book with no copies left. When a copy is returned it is "
+                    "reserved for the first member in the queue, who can then borrow it.",
+        tags=["Holds"],
+        request=BorrowRequestSerializer,
+        responses={201: HoldSerializer, 400: OpenApiTypes.OBJECT, 404: OpenApiTypes.OBJECT},
+    )
+    @transaction.atomic
+    def post(self, request):
+        req = BorrowRequestSerializer(data=request.data)
+        req.is_valid(raise_exception=True)
 
+        book = get_object_or_404(Book.objects.select_for_update(), pk=req.validated_data["book_id"])
+        member = get_object_or_404(Member, pk=req.validated_data["member_id"])
+        try:
+            hold = holds.place_hold(book, member)
+        except holds.HoldError as e:
+            return Response({"error": str(e)}, status=status.HTTP_400_BAD_REQUEST)
+        return Response(HoldSerializer(hold).data, status=status.HTTP_201_CREATED)
+
+class HoldDetailView(APIView):
+    @extend_schema(
+        summary="Queue position of a hold",
+        tags=["Holds"],
+        parameters=[OpenApiParameter("hold_id", OpenApiTypes.INT, OpenApiParameter.PATH)],
+        responses={200: HoldSerializer, 404: OpenApiTypes.OBJECT},
+    )
+    def get(self, request, hold_id):
+        hold = get_object_or_404(Hold, pk=hold_id)
+        return Response(HoldSerializer(hold).data, status=status.HTTP_200_OK)
+
+    @extend_schema(
+        summary="Cancel a hold",
+        description="A copy already reserved for this hold passes to the next member in the queue.",
+        tags=["Holds"],
+        parameters=[OpenApiParameter("hold_id", OpenApiTypes.INT, OpenApiParameter.PATH)],
+        responses={204: None, 404: OpenApiTypes.OBJECT},
+    )
+    @transaction.atomic
+    def delete(self, request, hold_id):
+        book_id = get_object_or_404(Hold.objects.values_list("book_id", flat=True), pk=hold_id)
+        list(Book.objects.select_for_update().filter(pk=book_id).values_list("pk"))
+        hold = get_object_or_404(Hold, pk=hold_id)
+        holds.cancel_hold(hold)
+        return Response(status=status.HTTP_204_NO_CONTENT)
+
+class MemberHoldsView(generics.ListAPIView):
+    serializer_class = HoldSerializer
+    pagination_class = None
+
+    @extend_schema(
+        summary="Member holds",
+        description="The member's holds with their queue positions (0 = ready for pickup).",
+        tags=["Holds"],
+        parameters=[OpenApiParameter("member_id", OpenApiTypes.INT, OpenApiParameter.PATH)],
+        responses={200: HoldSerializer(many=True)},
+    )
+    def get(self, request, *args, **kwargs):
+        return super().get(request, *args, **kwargs)
 
+    def get_queryset(self):
+        return holds.member_holds(self.kwargs["member_id"])
 
@@ -1,30 +1,52 @@
 import time
 import requests
 
+from http_cache import HttpCache
+
 BASE_URL = "https://openlibrary.org"
 
 class OpenLibraryClient:
-    def __init__(self):
+    def __init__(self, base_url=BASE_URL, cache=None):
+        self.base_url = base_url.rstrip("/")
         self.session = requests.session()
+        self.cache = cache
 
-    def _requests(self, url, params=None):
+    def _request(self, url, params=None):
+        entry = None
+        if self.cache:
+            entry, fresh = self.cache.get(url, params)
+            if self.cache.offline:
+                if entry is None:
+                    print(f"Request failed: {url} is not in the replay cache")
+                return entry and entry["body"]
+            if fresh:
+                return entry["body"]
         try:
-            response = self.session.get(url, params=params, timeout=10)
+            response = self.session.get(
+                url, params=params, headers=HttpCache.conditional_headers(entry), timeout=10
+            )
+            if response.status_code == 304 and entry:
+                time.sleep(1)
+                return self.cache.revalidated(url, params, entry)
             response.raise_for_status()
             time.sleep(1)
-            return response.json()
-        except requests.exceptions.RequestsException as e:
+            body = response.json()
+        except requests.exceptions.RequestException as e:
             print(f"Request failed: {e}")
             return None
+        if self.cache:
+            self.cache.store(url, params, body, response.headers)
+        return body
 
     def search_author(self, author_name):
-        url = f"{BASE_URL}/search/authors.json"
+        url = f"{self.base_url}/search/authors.json"
         return self._request(url, params={"q": author_name})
 
     def get_author_works(self, author_key, limit):
-        url = f"{BASE_URL}/authors/{author_key}/works.json"
+        url = f"{self.base_url}/authors/{author_key}/works.json"
         return self._request(url, params={"limit": limit})
 
-    def get_book_details(selfself, work_key):
-        url = f"{BASE_URL}/works/{work_key}.json"
-        return self._request(url)
\ No newline at end of file
+    def get_book_details(self, work_key):
+        # Works listings return keys as "/works/OL123W".
+        url = f"{self.base_url}/works/{work_key.rsplit('/', 1)[-1]}.json"
+        return self._request(url)
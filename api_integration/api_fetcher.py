@@ -1,8 +1,11 @@
 import argparse
+import asyncio
 import json
 from sqlalchemy import create_engine
 from sqlalchemy.orm import sessionmaker
-from api_client import OpenLibraryClient
+from api_client import BASE_URL, OpenLibraryClient
+from book_writer import BatchedBookWriter
+from http_cache import MODES as CACHE_MODES, HttpCache
 from Data_Ingestion.schemas import Book
 from Data_Ingestion.models import Book as BookModel, Base
 
@@ -17,16 +20,56 @@ def map_api_book_to_db(api_data):
         print(f"Validation failed: {e}")
         return None
 
-def save_to_database(session, book: Book):
-    exists = session.query(BookModel).filter_by(title=book.title).first()
-    if not exists:
-        book_model = BookModel(
-            title=book.title,
-            description=book.description,
-            isbn=book.isbn
+def make_cache(args):
+    if not args.cache_dir:
+        return None
+    return HttpCache(
+        args.cache_dir, ttl=args.cache_ttl, max_bytes=args.cache_max_mb * 1024 * 1024, mode=args.cache_mode
+    )
+
+def fetch_sync(args):
+    client = OpenLibraryClient(args.base_url, cache=make_cache(args))
+
+    author_search = client.search_author(args.author)
+    if not author_search or not author_search["docs"]:
+        print("Author not found.")
+        return []
+
+    author_key = author_search["docs"][0]["key"]
+    works = client.get_author_works(author_key, args.limit)
+
+    raw_data = []
+    for work in works.get("entries", []):
+        work_key = work["key"]
+        book_data = client.get_book_details(work_key)
+        if book_data:
+            raw_data.append(book_data)
+    return raw_data
+
+async def fetch_async(args):
+    from async_client import AsyncOpenLibraryClient
+
+    async with AsyncOpenLibraryClient(
+        args.base_url, concurrency=args.concurrency, rate=args.rate, burst=args.burst,
+        cache=make_cache(args),
+    ) as client:
+        author_search = await client.search_author(args.author)
+        if not author_search or not author_search["docs"]:
+            print("Author not found.")
+            return []
+
+        author_key = author_search["docs"][0]["key"]
+        works = await client.get_author_works(author_key, args.limit) or {}
+        details = await client.get_many_book_details(
+            [work["key"] for work in works.get("entries", [])]
         )
-        session.add(book_model)
-        session.commit()
+        report = client.report()
+    print(
+        f"{report['requests']} requests in {report['elapsed_s']}s "
+        f"({report['requests_per_s']} req/s), {report['retries']} retries, "
+        f"{report['failures']} failures, {report['limiter_wait_s']}s waiting on the rate limiter"
+    )
+    return [book_data for book_data in details if book_data]
 
 def main():
     parser = argparse.ArgumentParser()
@@ -34,6 +77,18 @@ def main():
     parser.add_argument("--limit", type=int, default=10)
     parser.add_argument("--db", "--database-url", required=True)
     parser.add_argument("--output", help="Optional JSON output file")
+    parser.add_argument("--base-url", default=BASE_URL, help="API root, e.g. a local stub_server.py")
+    parser.add_argument("--async", dest="use_async", action="store_true",
+                        help="Fetch work details concurrently")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--rate", type=float, default=5.0, help="Requests per second (async mode)")
+    parser.add_argument("--burst", type=int, default=None, help="Token bucket size (async mode)")
+    parser.add_argument("--chunk-size", type=int, default=500, help="Books written per commit")
+    parser.add_argument("--cache-dir", help="Directory for the on-disk HTTP cache")
+    parser.add_argument("--cache-mode", choices=CACHE_MODES, default="cache",
+                        help="record: always fetch and store; replay: run offline from --cache-dir")
+    parser.add_argument("--cache-ttl", type=int, default=24 * 3600, help="Seconds before revalidating")
+    parser.add_argument("--cache-max-mb", type=int, default=256)
     args = parser.parse_args()
 
     engine = create_engine(args.db)
@@ -41,29 +96,19 @@ def main():
     session = Session()
     Base.metadata.create_all(engine)
 
-    client = OpenLibraryClient()
-
-    author_search = client.search_author(args.author)
-    if not author_search or not author_search["docs"]:
-        print("Author not found.")
-        return
-
-    author_key = author_search["docs"][0]["key"]
-    works = client.get_author_works(author_key, args.limit)
+    raw_data = asyncio.run(fetch_async(args)) if args.use_async else fetch_sync(args)
 
-    raw_data = []
-    for work in works.get("entries", []):
-        work_key = work["key"]
-        book_data = client.get_book_details(work_key)
-        if book_data:
-            raw_data.append(book_data)
+    with BatchedBookWriter(session, BookModel, chunk_size=args.chunk_size) as writer:
+        for book_data in raw_data:
             book = map_api_book_to_db(book_data)
             if book:
-                save_to_database(session, book)
+                writer.add(book)
+    counts = writer.counts
+    print(f"Books: {counts['inserted']} inserted, {counts['updated']} updated, {counts['skipped']} skipped")
 
     if args.output:
         with open(args.output, "w") as f:
             json.dump(raw_data, f, indent=2)
 
 if __name__ == "__main__":
-    main()
\ No newline at end of file
+    main()
@@ -0,0 +1,167 @@
+import asyncio
+import random
+import time
+from email.utils import parsedate_to_datetime
+
+import aiohttp
+
+from api_client import BASE_URL
+from http_cache import HttpCache
+
+RETRY_STATUSES = {429, 500, 502, 503, 504}
+
+
+class TokenBucket:
+    """Shared rate limiter: ``rate`` requests per second with bursts of ``capacity``."""
+
+    def __init__(self, rate, capacity=None):
+        self.rate = rate
+        self.capacity = capacity or max(1, int(rate))
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+        self.waited = 0.0
+        self._lock = asyncio.Lock()
+
+    def pause(self, seconds):
+        """Stop handing out tokens for ``seconds`` (e.g. after a Retry-After)."""
+        self.paused_until = max(self.paused_until, time.monotonic() + seconds)
+
+    async def acquire(self):
+        # Waiting for the lock is waiting for the rate limit too: count it.
+        started = time.monotonic()
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                if now < self.paused_until:
+                    await asyncio.sleep(self.paused_until - now)
+                    continue
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    break
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+            self.waited += time.monotonic() - started
+
+
+def retry_after_seconds(value):
+    """Parse a Retry-After header given either as seconds or as an HTTP date."""
+    if not value:
+        return None
+    try:
+        return max(0.0, float(value))
+    except ValueError:
+        pass
+    try:
+        return max(0.0, parsedate_to_datetime(value).timestamp() - time.time())
+    except (TypeError, ValueError):
+        return None
+
+
+class AsyncOpenLibraryClient:
+    """
+    Concurrent OpenLibrary client.
+
+    At most ``concurrency`` requests are in flight, all of them drawing from one
+    token bucket, over a connection pool that keeps per-host connections alive.
+    Failed requests (connection errors, 429 and 5xx) are retried with jittered
+    exponential backoff; a Retry-After header pauses the whole bucket.
+    An optional ``HttpCache`` is consulted first, as in ``OpenLibraryClient``;
+    its disk reads and writes run in worker threads, off the event loop.
+    Use as ``async with AsyncOpenLibraryClient() as client: ...``.
+    """
+
+    def __init__(self, base_url=BASE_URL, concurrency=8, rate=5.0, burst=None,
+                 max_retries=4, backoff=0.5, timeout=10, cache=None):
+        self.base_url = base_url.rstrip("/")
+        self.concurrency = concurrency
+        self.limiter = TokenBucket(rate, burst)
+        self.max_retries = max_retries
+        self.backoff = backoff
+        self.timeout = aiohttp.ClientTimeout(total=timeout)
+        self.cache = cache
+        self.session = None
+        self._slots = asyncio.Semaphore(concurrency)
+        self.stats = {"requests": 0, "retries": 0, "failures": 0}
+        self._started = None
+
+    async def __aenter__(self):
+        connector = aiohttp.TCPConnector(
+            limit=self.concurrency, limit_per_host=self.concurrency, keepalive_timeout=30
+        )
+        self.session = aiohttp.ClientSession(connector=connector, timeout=self.timeout)
+        self._started = time.monotonic()
+        return self
+
+    async def __aexit__(self, *exc_info):
+        await self.session.close()
+
+    async def _request(self, path, params=None):
+        url = f"{self.base_url}{path}"
+        entry = None
+        if self.cache:
+            entry, fresh = await asyncio.to_thread(self.cache.get, url, params)
+            if self.cache.offline:
+                if entry is None:
+                    print(f"Request failed: {url} is not in the replay cache")
+                    self.stats["failures"] += 1
+                return entry and entry["body"]
+            if fresh:
+                return entry["body"]
+        async with self._slots:
+            for attempt in range(self.max_retries + 1):
+                await self.limiter.acquire()
+                self.stats["requests"] += 1
+                delay = None
+                try:
+                    headers = HttpCache.conditional_headers(entry)
+                    async with self.session.get(url, params=params, headers=headers) as response:
+                        if response.status == 304 and entry:
+                            return await asyncio.to_thread(self.cache.revalidated, url, params, entry)
+                        if response.status not in RETRY_STATUSES:
+                            response.raise_for_status()
+                            body = await response.json(content_type=None)
+                            if self.cache:
+                                await asyncio.to_thread(self.cache.store, url, params, body, response.headers)
+                            return body
+                        delay = retry_after_seconds(response.headers.get("Retry-After"))
+                        if delay is not None:
+                            self.limiter.pause(delay)
+                        error = f"HTTP {response.status}"
+                except (aiohttp.ClientError, asyncio.TimeoutError) as e:
+                    if isinstance(e, aiohttp.ClientResponseError) and e.status not in RETRY_STATUSES:
+                        print(f"Request failed: {e}")
+                        break
+                    error = e
+                if attempt == self.max_retries:
+                    print(f"Request failed: {url}: {error}")
+                    break
+                self.stats["retries"] += 1
+                # Full jitter: spread retries so concurrent callers do not stampede.
+                await asyncio.sleep(delay if delay is not None else random.uniform(0, self.backoff * 2 ** attempt))
+        self.stats["failures"] += 1
+        return None
+
+    async def search_author(self, author_name):
+        return await self._request("/search/authors.json", params={"q": author_name})
+
+    async def get_author_works(self, author_key, limit):
+        return await self._request(f"/authors/{author_key}/works.json", params={"limit": limit})
+
+    async def get_book_details(self, work_key):
+        # Works listings return keys as "/works/OL123W".
+        return await self._request(f"/works/{work_key.rsplit('/', 1)[-1]}.json")
+
+    async def get_many_book_details(self, work_keys):
+        """Fetch all works concurrently; results keep the order of ``work_keys``."""
+        return await asyncio.gather(*(self.get_book_details(key) for key in work_keys))
+
+    def report(self):
+        elapsed = time.monotonic() - self._started if self._started else 0.0
+        return {
+            **self.stats,
+            "elapsed_s": round(elapsed, 3),
+            "requests_per_s": round(self.stats["requests"] / elapsed, 2) if elapsed else 0.0,
+            "limiter_wait_s": round(self.limiter.waited, 3),
+        }
@@ -0,0 +1,73 @@
+from sqlalchemy import inspect, select
+
+FIELDS = ("title", "description", "isbn")
+
+
+class BatchedBookWriter:
+    """
+    Collects mapped ``Book`` schemas and upserts them by ISBN in chunks.
+
+    Each chunk costs one ``SELECT ... WHERE isbn IN (...)``, one bulk INSERT,
+    one bulk UPDATE and one commit. Books without an ISBN, repeats of an ISBN
+    already seen, and rows whose stored values are unchanged are skipped.
+    Use as a context manager, or call ``flush()`` when done.
+    """
+
+    def __init__(self, session, model, chunk_size=500):
+        self.session = session
+        self.model = model
+        self.chunk_size = chunk_size
+        mapper = inspect(model)
+        self.pk_name = mapper.get_property_by_column(mapper.primary_key[0]).key
+        self.pending = {}
+        self.seen = set()
+        self.counts = {"inserted": 0, "updated": 0, "skipped": 0}
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, exc_type, exc, tb):
+        if exc_type is None:
+            self.flush()
+        else:
+            self.session.rollback()
+
+    def add(self, book):
+        isbn = (book.isbn or "").strip()
+        if not isbn or isbn in self.seen:
+            self.counts["skipped"] += 1
+            return
+        self.seen.add(isbn)
+        self.pending[isbn] = {field: getattr(book, field) for field in FIELDS}
+        self.pending[isbn]["isbn"] = isbn
+        if len(self.pending) >= self.chunk_size:
+            self.flush()
+
+    def flush(self):
+        if not self.pending:
+            return
+        model = self.model
+        columns = [getattr(model, self.pk_name)] + [getattr(model, field) for field in FIELDS]
+        existing = {
+            row.isbn: row
+            for row in self.session.execute(select(*columns).where(model.isbn.in_(list(self.pending))))
+        }
+
+        inserts, updates = [], []
+        for isbn, values in self.pending.items():
+            row = existing.get(isbn)
+            if row is None:
+                inserts.append(values)
+            elif any(getattr(row, field) != values[field] for field in FIELDS):
+                updates.append({self.pk_name: getattr(row, self.pk_name), **values})
+            else:
+                self.counts["skipped"] += 1
+
+        if inserts:
+            self.session.bulk_insert_mappings(model, inserts)
+        if updates:
+            self.session.bulk_update_mappings(model, updates)
+        self.session.commit()
+        self.counts["inserted"] += len(inserts)
+        self.counts["updated"] += len(updates)
+        self.pending = {}
@@ -0,0 +1,146 @@
+"""
+Persistent on-disk cache for OpenLibrary responses.
+
+Entries are keyed by URL and query parameters and stored one JSON file each
+under ``directory``. Modes:
+
+* ``cache``  -- serve fresh entries, revalidate stale ones with
+  If-None-Match / If-Modified-Since, store new responses.
+* ``record`` -- always hit the network and store every response, to capture
+  a directory that can later be replayed.
+* ``replay`` -- never touch the network; a miss is a failed request.
+
+Disk use is bounded by ``max_bytes``: when exceeded, the least recently used
+entries (by file mtime, refreshed on every hit) are evicted. Methods may be
+called from several threads at once (``AsyncOpenLibraryClient`` runs them with
+``asyncio.to_thread``); the size and stats counters are kept under a lock.
+"""
+import hashlib
+import json
+import os
+import tempfile
+import threading
+import time
+from pathlib import Path
+
+MODES = ("cache", "record", "replay")
+
+
+class HttpCache:
+    def __init__(self, directory, ttl=24 * 3600, max_bytes=256 * 1024 * 1024, mode="cache"):
+        if mode not in MODES:
+            raise ValueError(f"mode must be one of {MODES}")
+        self.directory = Path(directory)
+        self.directory.mkdir(parents=True, exist_ok=True)
+        self.ttl = ttl
+        self.max_bytes = max_bytes
+        self.mode = mode
+        self.stats = {"hits": 0, "revalidated": 0, "misses": 0, "stored": 0, "evicted": 0}
+        self._lock = threading.Lock()
+        self._size = sum(path.stat().st_size for path in self._entries())
+
+    @property
+    def offline(self):
+        return self.mode == "replay"
+
+    @staticmethod
+    def key(url, params=None):
+        canonical = json.dumps([url, sorted((params or {}).items())], default=str)
+        return hashlib.sha256(canonical.encode()).hexdigest()
+
+    def _path(self, key):
+        return self.directory / key[:2] / f"{key}.json"
+
+    def _entries(self):
+        return self.directory.glob("*/*.json")
+
+    def get(self, url, params=None):
+        """
+        Return ``(entry, fresh)``, or ``(None, False)`` on a miss. In record mode
+        everything is a miss; in replay mode every stored entry is fresh.
+        """
+        if self.mode == "record":
+            return None, False
+        path = self._path(self.key(url, params))
+        try:
+            entry = json.loads(path.read_text())
+        except (OSError, ValueError):
+            self._count("misses")
+            return None, False
+        try:
+            os.utime(path)
+        except OSError:
+            pass  # evicted meanwhile; the entry just read is still good
+        fresh = self.mode == "replay" or time.time() - entry["stored_at"] < self.ttl
+        if fresh:
+            self._count("hits")
+        return entry, fresh
+
+    def _count(self, name):
+        with self._lock:
+            self.stats[name] += 1
+
+    @staticmethod
+    def conditional_headers(entry):
+        headers = {}
+        if entry and entry.get("etag"):
+            headers["If-None-Match"] = entry["etag"]
+        if entry and entry.get("last_modified"):
+            headers["If-Modified-Since"] = entry["last_modified"]
+        return headers
+
+    def revalidated(self, url, params, entry):
+        """The server answered 304: the entry is fresh again."""
+        self._count("revalidated")
+        self._write(url, params, entry["body"], entry.get("etag"), entry.get("last_modified"))
+        return entry["body"]
+
+    def store(self, url, params, body, headers):
+        self._write(url, params, body, headers.get("ETag"), headers.get("Last-Modified"))
+        self._count("stored")
+
+    def _write(self, url, params, body, etag, last_modified):
+        path = self._path(self.key(url, params))
+        path.parent.mkdir(exist_ok=True)
+        data = json.dumps({
+            "url": url,
+            "params": params or {},
+            "stored_at": time.time(),
+            "etag": etag,
+            "last_modified": last_modified,
+            "body": body,
+        }).encode()
+        fd, tmp = tempfile.mkstemp(dir=path.parent, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(data)
+        with self._lock:
+            try:
+                old_size = path.stat().st_size
+            except OSError:
+                old_size = 0
+            os.replace(tmp, path)
+            self._size += len(data) - old_size
+            if self._size > self.max_bytes:
+                self._evict()
+
+    def evict(self):
+        """Drop least recently used entries until usage is under 90% of ``max_bytes``."""
+        with self._lock:
+            self._evict()
+
+    def _evict(self):
+        target = self.max_bytes * 0.9
+        entries = sorted(
+            ((path.stat().st_mtime, path.stat().st_size, path) for path in self._entries()),
+            key=lambda item: item[0],
+        )
+        self._size = sum(size for _, size, _ in entries)
+        for _, size, path in entries:
+            if self._size <= target:
+                break
+            try:
+                path.unlink()
+            except OSError:
+                continue
+            self._size -= size
+            self.stats["evicted"] += 1
@@ -0,0 +1,110 @@
+"""
+Local stand-in for the OpenLibrary endpoints used by the fetchers.
+
+    python stub_server.py --port 8765 --works 500 --throttle-every 50
+
+then run ``api_fetcher.py --base-url http://127.0.0.1:8765 ...``. The server
+speaks HTTP/1.1 with keep-alive, can add latency, and can answer every Nth
+request with 429 + Retry-After to exercise the client's rate limiting.
+Responses carry an ETag and honour If-None-Match with 304.
+"""
+import argparse
+import hashlib
+import itertools
+import json
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlparse
+
+
+class StubHandler(BaseHTTPRequestHandler):
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args):
+        pass
+
+    def _send(self, status, payload, headers=None):
+        body = json.dumps(payload).encode()
+        headers = dict(headers or {})
+        if status == 200:
+            headers["ETag"] = f'"{hashlib.sha1(body).hexdigest()[:16]}"'
+            if self.headers.get("If-None-Match") == headers["ETag"]:
+                status, body = 304, b""
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for name, value in headers.items():
+            self.send_header(name, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def do_GET(self):
+        server = self.server
+        count = next(server.counter)
+        if server.latency:
+            time.sleep(server.latency)
+        if server.throttle_every and count % server.throttle_every == server.throttle_every - 1:
+            self._send(429, {"error": "slow down"}, {"Retry-After": str(server.retry_after)})
+            return
+
+        url = urlparse(self.path)
+        query = parse_qs(url.query)
+        parts = url.path.strip("/").split("/")
+        if url.path == "/search/authors.json":
+            name = query.get("q", ["Unknown"])[0]
+            self._send(200, {"numFound": 1, "docs": [{"key": "OL1A", "name": name}]})
+        elif len(parts) == 3 and parts[0] == "authors" and parts[2] == "works.json":
+            limit = int(query.get("limit", [server.works])[0])
+            entries = [{"key": f"/works/OL{i}W", "title": f"Work {i}"} for i in range(min(limit, server.works))]
+            self._send(200, {"size": len(entries), "entries": entries})
+        elif len(parts) == 2 and parts[0] == "works" and parts[1].endswith(".json"):
+            key = parts[1][:-len(".json")]
+            number = int("".join(c for c in key if c.isdigit()) or 0)
+            self._send(200, {
+                "key": f"/works/{key}",
+                "title": f"Work {number}",
+                "description": f"Stub description for {key}",
+                "isbn_13": [str(9780000000000 + number)],
+            })
+        else:
+            self._send(404, {"error": "not found"})
+
+
+def make_server(host="127.0.0.1", port=0, works=500, latency=0.0, throttle_every=0, retry_after=1):
+    """Create (but do not start) a stub server; ``port=0`` picks a free port."""
+    server = ThreadingHTTPServer((host, port), StubHandler)
+    server.daemon_threads = True
+    server.works = works
+    server.latency = latency
+    server.throttle_every = throttle_every
+    server.retry_after = retry_after
+    server.counter = itertools.count()
+    return server
+
+
+def start_in_thread(**kwargs):
+    """Start a stub server in a daemon thread and return (server, base_url)."""
+    server = make_server(**kwargs)
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+    host, port = server.server_address[:2]
+    return server, f"http://{host}:{port}"
+
+
+def main():
+    parser = argparse.ArgumentParser()
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8765)
+    parser.add_argument("--works", type=int, default=500)
+    parser.add_argument("--latency", type=float, default=0.05, help="Seconds added to every response")
+    parser.add_argument("--throttle-every", type=int, default=0, help="Answer every Nth request with 429")
+    parser.add_argument("--retry-after", type=int, default=1)
+    args = parser.parse_args()
+
+    server = make_server(args.host, args.port, args.works, args.latency, args.throttle_every, args.retry_after)
+    print(f"Serving stub OpenLibrary on http://{args.host}:{args.port}")
+    server.serve_forever()
+
+
+if __name__ == "__main__":
+    main()
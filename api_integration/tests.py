@@ -0,0 +1,190 @@
+"""
+Tests for the OpenLibrary clients, the HTTP cache and the batched writer.
+
+Run from this directory: ``python -m unittest tests``. Network tests talk to a
+``stub_server`` on a free local port.
+"""
+import asyncio
+import tempfile
+import time
+import unittest
+from email.utils import formatdate
+from types import SimpleNamespace
+
+from sqlalchemy import Column, Integer, String, create_engine, event
+from sqlalchemy.orm import Session, declarative_base
+
+from async_client import AsyncOpenLibraryClient, TokenBucket, retry_after_seconds
+from book_writer import BatchedBookWriter
+from http_cache import HttpCache
+from stub_server import start_in_thread
+
+
+class TokenBucketTests(unittest.IsolatedAsyncioTestCase):
+    async def test_waited_includes_time_queued_for_the_lock(self):
+        bucket = TokenBucket(rate=20, capacity=1)
+        started = time.monotonic()
+        await asyncio.gather(*(bucket.acquire() for _ in range(3)))
+        elapsed = time.monotonic() - started
+        self.assertGreaterEqual(elapsed, 0.09)
+        # 0 + 0.05 + 0.10 seconds: the third caller queues behind the second.
+        self.assertGreaterEqual(bucket.waited, 0.14)
+
+    async def test_pause_holds_every_caller(self):
+        bucket = TokenBucket(rate=1000, capacity=10)
+        bucket.pause(0.05)
+        started = time.monotonic()
+        await bucket.acquire()
+        self.assertGreaterEqual(time.monotonic() - started, 0.04)
+
+    def test_retry_after_seconds(self):
+        self.assertEqual(retry_after_seconds("3"), 3.0)
+        self.assertEqual(retry_after_seconds("-1"), 0.0)
+        self.assertAlmostEqual(retry_after_seconds(formatdate(time.time() + 30, usegmt=True)), 30, delta=2)
+        self.assertIsNone(retry_after_seconds("soon"))
+        self.assertIsNone(retry_after_seconds(None))
+
+
+class AsyncClientTests(unittest.IsolatedAsyncioTestCase):
+    def serve(self, **kwargs):
+        server, base_url = start_in_thread(**kwargs)
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return base_url
+
+    def cache(self, **kwargs):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        return HttpCache(directory.name, **kwargs)
+
+    async def test_details_keep_their_order_through_throttling(self):
+        base_url = self.serve(throttle_every=4, retry_after=0)
+        keys = [f"/works/OL{i}W" for i in range(10)]
+        async with AsyncOpenLibraryClient(base_url, concurrency=4, rate=1000, backoff=0.01) as client:
+            details = await client.get_many_book_details(keys)
+        self.assertEqual([d["key"] for d in details], keys)
+        report = client.report()
+        self.assertGreater(report["retries"], 0)
+        self.assertEqual(report["failures"], 0)
+        self.assertEqual(report["requests"], 10 + report["retries"])
+
+    async def test_client_errors_are_not_retried(self):
+        base_url = self.serve()
+        async with AsyncOpenLibraryClient(base_url, rate=1000) as client:
+            self.assertIsNone(await client._request("/nowhere.json"))
+        self.assertEqual((client.stats["requests"], client.stats["retries"], client.stats["failures"]), (1, 0, 1))
+
+    async def test_cache_serves_then_revalidates(self):
+        base_url = self.serve()
+        cache = self.cache()
+        async with AsyncOpenLibraryClient(base_url, rate=1000, cache=cache) as client:
+            first = await client.get_book_details("OL7W")
+            self.assertEqual(await client.get_book_details("OL7W"), first)
+            self.assertEqual(client.stats["requests"], 1)
+            cache.ttl = 0
+            self.assertEqual(await client.get_book_details("OL7W"), first)
+        self.assertEqual(client.stats["requests"], 2)
+        self.assertEqual((cache.stats["hits"], cache.stats["revalidated"], cache.stats["stored"]), (1, 1, 1))
+
+    async def test_replay_never_touches_the_network(self):
+        cache = self.cache(mode="replay")
+        async with AsyncOpenLibraryClient("http://127.0.0.1:9", rate=1000, cache=cache) as client:
+            self.assertIsNone(await client.get_book_details("OL1W"))
+        self.assertEqual((client.stats["requests"], client.stats["failures"]), (0, 1))
+
+
+class HttpCacheTests(unittest.TestCase):
+    def setUp(self):
+        directory = tempfile.TemporaryDirectory()
+        self.addCleanup(directory.cleanup)
+        self.directory = directory.name
+
+    def test_entries_expire_into_conditional_requests(self):
+        cache = HttpCache(self.directory, ttl=60)
+        cache.store("http://x/a", {"q": 1}, {"n": 1}, {"ETag": '"abc"', "Last-Modified": "yesterday"})
+        entry, fresh = cache.get("http://x/a", {"q": 1})
+        self.assertTrue(fresh)
+        self.assertEqual(entry["body"], {"n": 1})
+        self.assertEqual(cache.get("http://x/a", {"q": 2}), (None, False))
+
+        entry, fresh = HttpCache(self.directory, ttl=0).get("http://x/a", {"q": 1})
+        self.assertFalse(fresh)
+        self.assertEqual(
+            HttpCache.conditional_headers(entry), {"If-None-Match": '"abc"', "If-Modified-Since": "yesterday"}
+        )
+
+    def test_record_mode_always_misses(self):
+        cache = HttpCache(self.directory, mode="record")
+        cache.store("http://x/a", None, {"n": 1}, {})
+        self.assertEqual(cache.get("http://x/a"), (None, False))
+        self.assertEqual(HttpCache(self.directory, mode="replay").get("http://x/a")[0]["body"], {"n": 1})
+
+    def test_least_recently_used_entries_are_evicted(self):
+        cache = HttpCache(self.directory, max_bytes=1000)
+        for i in range(3):
+            cache.store(f"http://x/{i}", None, {"pad": "x" * 200}, {})
+            time.sleep(0.01)
+        cache.get("http://x/0")
+        for i in range(3, 5):
+            cache.store(f"http://x/{i}", None, {"pad": "x" * 200}, {})
+        self.assertGreater(cache.stats["evicted"], 0)
+        self.assertLessEqual(cache._size, 1000)
+        self.assertIsNotNone(cache.get("http://x/0")[0])
+        self.assertIsNone(cache.get("http://x/1")[0])
+
+
+Base = declarative_base()
+
+
+class BookRow(Base):
+    __tablename__ = "book"
+    book_id = Column(Integer, primary_key=True)
+    title = Column(String)
+    description = Column(String)
+    isbn = Column(String, unique=True)
+
+
+class BatchedBookWriterTests(unittest.TestCase):
+    def setUp(self):
+        self.engine = create_engine("sqlite://")
+        Base.metadata.create_all(self.engine)
+        self.statements = []
+        event.listen(self.engine, "before_cursor_execute",
+                     lambda conn, cursor, sql, *args: self.statements.append(sql.split()[0]))
+        self.session = Session(self.engine)
+        self.addCleanup(self.session.close)
+
+    @staticmethod
+    def book(isbn, title="Title", description=""):
+        return SimpleNamespace(isbn=isbn, title=title, description=description)
+
+    def test_upserts_by_isbn_in_chunks(self):
+        self.session.add(BookRow(title="Old", description="", isbn="1"))
+        self.session.add(BookRow(title="Same", description="", isbn="2"))
+        self.session.commit()
+        self.statements.clear()
+
+        with BatchedBookWriter(self.session, BookRow, chunk_size=3) as writer:
+            for book in [self.book("1", "New"), self.book("2", "Same"), self.book(" 3 "),
+                         self.book("3", "Repeat"), self.book(None), self.book("4")]:
+                writer.add(book)
+        self.assertEqual(writer.counts, {"inserted": 2, "updated": 1, "skipped": 3})
+        # Two chunks: one SELECT each, an INSERT in each, the UPDATE in the first.
+        self.assertEqual(
+            [self.statements.count(verb) for verb in ("SELECT", "INSERT", "UPDATE")], [2, 2, 1]
+        )
+        self.assertEqual(
+            {row.isbn: row.title for row in self.session.query(BookRow)},
+            {"1": "New", "2": "Same", "3": "Title", "4": "Title"},
+        )
+
+    def test_error_rolls_back_the_open_chunk(self):
+        with self.assertRaises(RuntimeError):
+            with BatchedBookWriter(self.session, BookRow) as writer:
+                writer.add(self.book("9"))
+                raise RuntimeError
+        self.assertEqual(self.session.query(BookRow).count(), 0)
+
+
+if __name__ == "__main__":
+    unittest.main()